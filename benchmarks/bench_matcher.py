@@ -0,0 +1,89 @@
+"""Микробенчмарк сопоставления ключей: автомат KeywordMatcher против перебора NaiveMatcher.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_matcher
+    python -m benchmarks.bench_matcher --keywords parsers/keywords.txt --titles 5000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from matcher import KeywordMatcher, NaiveMatcher  # noqa: E402
+
+SYLLABLES = ["ka", "re", "lč", "ap", "ek", "ví", "ťa", "mlo", "ky", "ha", "rr", "po", "tt", "ér",
+             "sv", "ět", "kni", "ha", "ro", "mán", "dě", "ti", "ší", "žá", "ře", "ný", "ou"]
+
+
+def make_word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def make_keywords(rnd: random.Random, count: int) -> list[str]:
+    keywords = []
+    for _ in range(count):
+        words = " ".join(make_word(rnd) for _ in range(rnd.randint(1, 3)))
+        keywords.append(f'"{words}"' if rnd.random() < 0.2 else words.capitalize())
+    return keywords
+
+
+def make_titles(rnd: random.Random, count: int, keywords: list[str]) -> list[str]:
+    titles = []
+    for _ in range(count):
+        words = [make_word(rnd) for _ in range(rnd.randint(4, 10))]
+        if keywords and rnd.random() < 0.3:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(keywords).strip('"').upper())
+        titles.append(" ".join(words) + " – " + str(rnd.randint(10, 999)) + " Kč")
+    return titles
+
+
+def timed(func, *args) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def bench(keywords: list[str], titles: list[str]):
+    build_ac, ac = timed(KeywordMatcher, keywords)
+    build_naive, naive = timed(NaiveMatcher, keywords)
+
+    t_ac, ac_hits = timed(lambda: [ac.match(t) for t in titles])
+    t_naive, naive_hits = timed(lambda: [naive.match(t) for t in titles])
+    assert ac_hits == naive_hits, "автомат и перебор разошлись"
+
+    # Инкрементальное обновление: один новый ключ и один удалённый
+    updated = keywords[1:] + ["nový klíč"]
+    t_update, _ = timed(ac.set_keywords, updated)
+
+    matched = sum(1 for hits in ac_hits if hits)
+    print(f"ключей {len(keywords):>6} | заголовков {len(titles)} (с совпадением {matched})")
+    print(f"  сборка:     автомат {build_ac * 1000:8.1f} мс | перебор {build_naive * 1000:8.1f} мс"
+          f" | обновление на 1 ключ {t_update * 1000:.1f} мс")
+    print(f"  на заголовок: автомат {t_ac / len(titles) * 1e6:8.1f} мкс | перебор {t_naive / len(titles) * 1e6:8.1f} мкс"
+          f" | ускорение ×{t_naive / t_ac:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", help="файл ключей (по умолчанию — синтетические)")
+    parser.add_argument("--sizes", default="100,1000,5000", help="сколько синтетических ключей перебрать")
+    parser.add_argument("--titles", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    if args.keywords:
+        with open(args.keywords, "r", encoding="utf-8") as f:
+            keyword_sets = [[line.strip() for line in f if line.strip()]]
+    else:
+        keyword_sets = [make_keywords(rnd, int(n)) for n in args.sizes.split(",")]
+
+    for keywords in keyword_sets:
+        bench(keywords, make_titles(rnd, args.titles, keywords))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Офлайн-бенчмарк парсеров против локального сервера фикстур.
+
+Для каждой пары (сайт, режим) запускается отдельный процесс, чтобы пиковая
+память одного прогона не смешивалась с другими. Режимы:
+    http    — поиск по ключу обычным путём парсера (Aukro — только браузер);
+    browser — браузерный путь поиска (нужен установленный Chromium);
+    feed    — страницы ленты новейших объявлений.
+
+Отчёт: ключей в секунду, p50/p95 задержки, пиковая RSS и трафик по данным
+сервера. Результаты пишутся в benchmarks/results/<время>.json и сравниваются
+с предыдущим прогоном.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parsers
+    python -m benchmarks.bench_parsers --sites bazos,vinted --modes http,feed --keywords 200 --latency 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(ROOT))
+
+SITES = ("bazos", "sbazar", "vinted", "aukro")
+MODES = ("http", "browser", "feed")
+# Aukro рендерится только в браузере: отдельного HTTP-пути у него нет
+SKIP = {("aukro", "http")}
+ENV_NAMES = {site: f"{site.upper()}_BASE_URL" for site in SITES}
+RESULT_PREFIX = "RESULT "
+CHILD_TIMEOUT = 30 * 60
+# Заметное изменение относительно прошлого прогона, в долях
+NOTABLE_DELTA = 0.10
+
+KEYWORDS = ["Čapek", "Harry Potter", "atlas", "Hrabal", "pohádky", "encyklopedie", "komiks", "Tolkien",
+            "učebnice", "detektivka", "válka s mloky", "kuchařka", "sci-fi", "básně", "historie"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss на Linux — в килобайтах; дочерние процессы — это Chromium
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round((own + children) / 1024, 1)
+
+
+# --- прогон в дочернем процессе ---
+
+def _make_call(site: str, mode: str):
+    """Функция одного измерения: принимает номер прогона, возвращает число ссылок."""
+    from parsers import aukro_cz, bazos_cz, sbazar_cz, vinted_cz
+    from browser_pool import proxy_key
+    from utils import get_random_user_agent
+
+    if site == "vinted" and mode != "browser":
+        # Куки сервер фикстур выдаёт всем: браузер для них не нужен
+        vinted_cz._sessions[proxy_key(None)] = {
+            "cookies": {vinted_cz.SESSION_COOKIE: "bench-token"},
+            "user_agent": get_random_user_agent(),
+            "expires": time.time() + 24 * 3600,
+        }
+
+    if mode == "feed":
+        fetch = {"bazos": bazos_cz.fetch_bazos_feed, "sbazar": sbazar_cz.fetch_sbazar_feed,
+                 "vinted": vinted_cz.fetch_vinted_feed, "aukro": aukro_cz.fetch_aukro_feed}[site]
+        return lambda keyword, i: fetch(i % 5 + 1)
+
+    if mode == "browser":
+        search = {"bazos": bazos_cz._search_bazos_browser, "sbazar": sbazar_cz._search_sbazar_browser}.get(site)
+        if search:
+            return lambda keyword, i: search(keyword, None, get_random_user_agent())
+        if site == "vinted":
+            # Каждый прогон заново получает куки через браузер
+            async def vinted_browser(keyword, i):
+                vinted_cz._sessions.clear()
+                return await vinted_cz.search_vinted(keyword)
+            return vinted_browser
+
+    search = {"bazos": bazos_cz.search_bazos, "sbazar": sbazar_cz.search_sbazar,
+              "vinted": vinted_cz.search_vinted, "aukro": aukro_cz.search_aukro}[site]
+    return lambda keyword, i: search(keyword)
+
+
+async def _close_clients():
+    from browser_pool import browser_pool
+    from http_client import close_sessions
+    await close_sessions()
+    await browser_pool.close()
+
+
+async def run_child(site: str, mode: str, count: int, concurrency: int) -> dict:
+    call = _make_call(site, mode)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, links = [], [], 0
+
+    async def one(i: int):
+        nonlocal links
+        keyword = KEYWORDS[i % len(KEYWORDS)] + (f" {i // len(KEYWORDS)}" if i >= len(KEYWORDS) else "")
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                links += len(await call(keyword, i) or [])
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else e}")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(count)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await _close_clients()
+
+    return {
+        "ok": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0][:300] if errors else None,
+        "links": links,
+        "seconds": round(elapsed, 3),
+        "per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# --- координация прогонов ---
+
+def start_server(latency_ms: float) -> tuple[subprocess.Popen, dict[str, str]]:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fixture_server", "--latency", str(latency_ms)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    line = server.stdout.readline()
+    if not line:
+        server.kill()
+        raise RuntimeError("сервер фикстур не запустился")
+    return server, json.loads(line)
+
+
+def server_stats(base_url: str, reset: bool = False) -> dict:
+    url = f"{base_url}/__stats" + ("?reset=1" if reset else "")
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def run_case(site: str, mode: str, urls: dict[str, str], args) -> dict:
+    server_stats(urls[site], reset=True)
+    env = {**os.environ, **{ENV_NAMES[s]: url for s, url in urls.items()}}
+    cmd = [sys.executable, "-m", "benchmarks.bench_parsers", "--child", site, mode,
+           "--keywords", str(args.keywords), "--concurrency", str(args.concurrency)]
+    if args.verbose:
+        cmd.append("--verbose")
+    try:
+        proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, timeout=CHILD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {"failed": f"нет ответа за {CHILD_TIMEOUT} с"}
+
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+    if result is None:
+        tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or [f"код {proc.returncode}"]
+        return {"failed": tail[0][:300]}
+
+    traffic = server_stats(urls[site])
+    result["requests"] = traffic["requests"]
+    result["kb_per_keyword"] = round(traffic["bytes"] / 1024 / max(1, args.keywords), 1)
+    return result
+
+
+def previous_results(params: dict) -> dict | None:
+    """Последний сохранённый прогон с теми же параметрами: иначе сравнение бессмысленно."""
+    for path in sorted(RESULTS_DIR.glob("*.json"), reverse=True):
+        with open(path, "r", encoding="utf-8") as f:
+            results = json.load(f)
+        if results.get("params") == params:
+            return results
+    return None
+
+
+def _delta(new: float, old: float | None, higher_is_better: bool) -> str:
+    if not old or not new:
+        return ""
+    change = (new - old) / old
+    mark = ""
+    if abs(change) >= NOTABLE_DELTA:
+        mark = " ✅" if (change > 0) == higher_is_better else " ⚠️"
+    return f" ({change:+.0%}{mark})"
+
+
+def print_report(results: dict, previous: dict | None):
+    old_cases = (previous or {}).get("cases", {})
+    print(f"{'сайт/режим':<16}{'ключ/с':>16}{'p50, мс':>10}{'p95, мс':>18}{'RSS, МБ':>10}{'КБ/ключ':>10}  ошибки")
+    for name, r in results["cases"].items():
+        if "failed" in r:
+            print(f"{name:<16}  не выполнен: {r['failed']}")
+            continue
+        old = old_cases.get(name, {})
+        per_sec = f"{r['per_sec']}{_delta(r['per_sec'], old.get('per_sec'), True)}"
+        p95 = f"{r['p95_ms']}{_delta(r['p95_ms'], old.get('p95_ms'), False)}"
+        errors = f"{r['errors']}" + (f" — {r['first_error']}" if r["first_error"] else "")
+        print(f"{name:<16}{per_sec:>16}{r['p50_ms']:>10}{p95:>18}{r['peak_rss_mb']:>10}{r['kb_per_keyword']:>10}  {errors}")
+    if previous:
+        print(f"Сравнение с прогоном {previous['started']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", default=",".join(SITES))
+    parser.add_argument("--modes", default="http,feed", help=f"из {', '.join(MODES)}")
+    parser.add_argument("--keywords", type=int, default=100, help="прогонов на пару (сайт, режим)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа сервера фикстур, мс")
+    parser.add_argument("--no-save", action="store_true", help="не сохранять результаты")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи парсеров")
+    parser.add_argument("--child", nargs=2, metavar=("SITE", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        result = asyncio.run(run_child(*args.child, args.keywords, args.concurrency))
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    cases = [(s, m) for m in args.modes.split(",") for s in args.sites.split(",") if (s, m) not in SKIP]
+    params = {"keywords": args.keywords, "concurrency": args.concurrency, "latency_ms": args.latency}
+    previous = previous_results(params)
+    results = {"started": datetime.now().isoformat(timespec="seconds"), "params": params, "cases": {}}
+
+    server, urls = start_server(args.latency)
+    try:
+        for site, mode in cases:
+            print(f"⏱️ {site}/{mode}...", flush=True)
+            results["cases"][f"{site}/{mode}"] = run_case(site, mode, urls, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_report(results, previous)
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 {path.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
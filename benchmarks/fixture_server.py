@@ -0,0 +1,313 @@
+"""Локальный сервер фикстур Bazos, Sbazar, Vinted и Aukro для офлайн-бенчмарков.
+
+Каждый сайт слушает свой порт и отвечает по тем же путям, что и настоящий,
+поэтому парсерам достаточно переопределить базовый адрес:
+BAZOS_BASE_URL, SBAZAR_BASE_URL, VINTED_BASE_URL, AUKRO_BASE_URL.
+
+Фикстуры синтетические: страницы собираются по упрощённым шаблонам разметки
+сайтов, записанных страниц в репозитории нет. Поэтому бенчмарк меряет скорость
+путей парсеров, но не проверяет их на настоящей вёрстке: разбор живого
+__NEXT_DATA__ Sbazar, баннер согласия и прочие особенности настоящих страниц
+здесь не встречаются. Чтобы прогнать настоящую разметку, положите свою запись
+в benchmarks/fixtures/ под именем из RECORDED (например, bazos_search.html) —
+она отдаётся вместо шаблона.
+
+    python -m benchmarks.fixture_server --latency 80
+"""
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import random
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+RECORDED = {
+    "bazos_search": "bazos_search.html",
+    "bazos_feed": "bazos_feed.html",
+    "sbazar_api": "sbazar_search.json",
+    "sbazar_html": "sbazar_search.html",
+    "vinted_catalog": "vinted_catalog.json",
+    "aukro_search": "aukro_search.html",
+}
+SITES = ("bazos", "sbazar", "vinted", "aukro")
+
+PAGE_SIZE = 20
+AUKRO_FIRST_CARDS = 12
+AUKRO_MAX_CARDS = 120
+# Новых объявлений в секунду в лентах категорий
+FEED_CHURN = 0.5
+# Балласт стилей и скриптов, чтобы вес страниц был похож на настоящий
+PAGE_PADDING = 40 * 1024
+
+WORDS = ["kniha", "román", "Čapek", "Hrabal", "pohádky", "atlas", "encyklopedie", "Harry", "Potter",
+         "detektivka", "sci-fi", "komiks", "učebnice", "básně", "historie", "válka", "mloky", "příroda",
+         "kuchařka", "dětská", "vázaná", "první", "vydání", "sbírka", "Tolkien", "Pán", "prstenů"]
+
+_started = time.time()
+
+
+def _recorded(name: str) -> str | None:
+    path = FIXTURES_DIR / RECORDED[name]
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+def _padding() -> str:
+    rnd = random.Random(0)
+    css = "".join(f".c{i}{{margin:{rnd.randint(0, 9)}px;color:#{rnd.randint(0, 0xffffff):06x}}}" for i in range(2000))
+    return f"<style>{css[:PAGE_PADDING]}</style>"
+
+
+PADDING = _padding()
+
+
+def _items(seed: str, count: int, first_id: int | None = None) -> list[dict]:
+    """Детерминированные объявления: одинаковый seed — одинаковая выдача."""
+    base = int(hashlib.md5(seed.encode()).hexdigest()[:8], 16) % 10_000_000 + 100_000_000
+    rnd = random.Random(seed)
+    items = []
+    for i in range(count):
+        item_id = first_id - i if first_id is not None else base + i
+        title = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 7)))
+        slug = "-".join(w.lower() for w in title.split())[:60]
+        items.append({"id": item_id, "title": title, "slug": slug, "price": rnd.randint(20, 2000)})
+    return items
+
+
+def _feed_top(site: str) -> int:
+    return 200_000_000 + hash(site) % 1000 + int((time.time() - _started) * FEED_CHURN)
+
+
+# --- Bazos ---
+
+def _bazos_page(items: list[dict]) -> str:
+    rows = "".join(
+        f'<div class="inzeraty inzeratyflex"><div class="inzeratynadpis">'
+        f'<a href="/inzerat/{it["id"]}/{it["slug"]}.php"><img src="/img/1t/{it["id"]}.jpg" class="obrazek"></a>'
+        f'<h2 class="nadpis"><a href="/inzerat/{it["id"]}/{it["slug"]}.php">{html.escape(it["title"])}</a></h2>'
+        f'<div class="popis">{html.escape(it["title"])} – zachovalé, osobní předání.</div></div>'
+        f'<div class="inzeratycena"><b>{it["price"]} Kč</b></div></div>'
+        for it in items
+    )
+    return (f'<html><head><title>Bazoš</title>{PADDING}</head><body>'
+            f'<form action="/inzeraty/" method="get"><input name="hledat"></form>{rows}</body></html>')
+
+
+async def bazos_search(request: web.Request) -> web.Response:
+    offset = int(request.match_info.get("offset") or 0)
+    items = _items(request.match_info["keyword"], offset + PAGE_SIZE)[offset:]
+    text = _recorded("bazos_search") or _bazos_page(items)
+    return web.Response(text=text, content_type="text/html")
+
+
+async def bazos_feed(request: web.Request) -> web.Response:
+    offset = int(request.match_info.get("offset") or 0)
+    text = _recorded("bazos_feed") or _bazos_page(_items("feed", PAGE_SIZE, _feed_top("bazos") - offset))
+    return web.Response(text=text, content_type="text/html")
+
+
+# --- Sbazar ---
+
+def _sbazar_results(seed: str, offset: int, limit: int, feed: bool) -> dict:
+    first = _feed_top("sbazar") - offset if feed else None
+    items = _items(seed, limit, first)
+    return {
+        "results": [
+            {"id": it["id"], "seo_name": it["slug"], "name": it["title"],
+             "price": it["price"], "locality": {"district": "Praha"}, "images": [{"url": f"/img/{it['id']}.jpg"}]}
+            for it in items
+        ],
+        "pagination": {"offset": offset, "limit": limit, "total": 10_000},
+    }
+
+
+async def sbazar_api(request: web.Request) -> web.Response:
+    recorded = _recorded("sbazar_api")
+    if recorded:
+        return web.Response(text=recorded, content_type="application/json")
+    phrase = request.query.get("phrase")
+    offset, limit = int(request.query.get("offset", 0)), int(request.query.get("limit", PAGE_SIZE))
+    return web.json_response(_sbazar_results(phrase or "feed", offset, limit, feed=not phrase))
+
+
+async def sbazar_html(request: web.Request) -> web.Response:
+    recorded = _recorded("sbazar_html")
+    if recorded:
+        return web.Response(text=recorded, content_type="text/html")
+    data = {"props": {"pageProps": _sbazar_results(request.match_info["keyword"], 0, PAGE_SIZE, feed=False)}}
+    links = "".join(
+        f'<a href="/inzerat/{it["id"]}-{it["seo_name"]}">{html.escape(it["name"])}</a>'
+        for it in data["props"]["pageProps"]["results"]
+    )
+    text = (f'<html><head><title>Sbazar</title>{PADDING}</head><body>{links}'
+            f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></body></html>')
+    return web.Response(text=text, content_type="text/html")
+
+
+# --- Vinted ---
+
+async def vinted_home(request: web.Request) -> web.Response:
+    response = web.Response(text=f"<html><head>{PADDING}</head><body>Vinted</body></html>", content_type="text/html")
+    response.set_cookie("access_token_web", "bench-token", max_age=3600)
+    return response
+
+
+async def vinted_catalog(request: web.Request) -> web.Response:
+    if "access_token_web" not in request.cookies:
+        return web.json_response({"code": 100, "message": "unauthorized"}, status=401)
+    recorded = _recorded("vinted_catalog")
+    if recorded:
+        return web.Response(text=recorded, content_type="application/json")
+
+    text = request.query.get("search_text", "")
+    per_page, page = int(request.query.get("per_page", PAGE_SIZE)), int(request.query.get("page", 1))
+    first = None if text else _feed_top("vinted") - (page - 1) * per_page
+    base = f"{request.scheme}://{request.host}"
+    items = _items(text or "feed", per_page, first)
+    return web.json_response({
+        "items": [
+            {"id": it["id"], "title": it["title"], "url": f"{base}/items/{it['id']}-{it['slug']}",
+             "price": {"amount": str(it["price"]), "currency_code": "CZK"},
+             "photo": {"url": f"{base}/img/{it['id']}.jpg"}}
+            for it in items
+        ],
+        "pagination": {"current_page": page, "per_page": per_page},
+    })
+
+
+# --- Aukro ---
+
+def _aukro_cards(items: list[dict]) -> list[dict]:
+    return [{"href": f"/{it['slug']}-{it['id']}", "title": it["title"], "price": it["price"]} for it in items]
+
+
+_AUKRO_SCRIPT = """
+<script>
+const cards = document.getElementById('cards');
+let offset = %(first)d, loading = false;
+function render(list) {
+  for (const c of list) {
+    const a = document.createElement('a');
+    a.className = 'item-card-main-container';
+    a.href = c.href;
+    a.innerHTML = '<h2>' + c.title + '</h2><span>' + c.price + ' Kč</span>';
+    cards.appendChild(a);
+  }
+}
+window.addEventListener('scroll', async () => {
+  if (loading || offset >= %(max)d) return;
+  if (window.innerHeight + window.scrollY < document.body.scrollHeight - 800) return;
+  loading = true;
+  const r = await fetch('/__more?seed=' + encodeURIComponent(%(seed)s) + '&offset=' + offset);
+  const list = await r.json();
+  offset += list.length;
+  render(list);
+  loading = false;
+});
+</script>
+"""
+
+
+async def aukro_search(request: web.Request) -> web.Response:
+    recorded = _recorded("aukro_search")
+    if recorded:
+        return web.Response(text=recorded, content_type="text/html")
+    seed = request.query.get("text") or "feed"
+    cards = _aukro_cards(_items(seed, AUKRO_FIRST_CARDS))
+    markup = "".join(
+        f'<a class="item-card-main-container" href="{c["href"]}" style="display:block;height:300px">'
+        f'<h2>{html.escape(c["title"])}</h2><span>{c["price"]} Kč</span></a>'
+        for c in cards
+    )
+    script = _AUKRO_SCRIPT % {"first": AUKRO_FIRST_CARDS, "max": AUKRO_MAX_CARDS, "seed": json.dumps(seed)}
+    popup = '<a href="#" onclick="this.remove()"><i class="material-icons cursor-pointer vertical-bottom">close</i></a>'
+    text = (f'<html><head><title>Aukro</title>{PADDING}<style>#cards a{{display:block;height:300px}}</style></head>'
+            f'<body>{popup}<div id="cards">{markup}</div>{script}</body></html>')
+    return web.Response(text=text, content_type="text/html")
+
+
+async def aukro_more(request: web.Request) -> web.Response:
+    seed, offset = request.query.get("seed", "feed"), int(request.query.get("offset", 0))
+    items = _items(seed, offset + AUKRO_FIRST_CARDS)[offset:]
+    return web.json_response(_aukro_cards(items))
+
+
+# --- сервер ---
+
+ROUTES = {
+    "bazos": [("/inzeraty/{keyword}/", bazos_search), ("/inzeraty/{keyword}/{offset:\\d+}/", bazos_search),
+              ("/", bazos_feed), ("/{offset:\\d+}/", bazos_feed)],
+    "sbazar": [("/api/v1/items/search", sbazar_api), ("/hledej/{keyword}/{slug}", sbazar_html)],
+    "vinted": [("/", vinted_home), ("/api/v2/catalog/items", vinted_catalog)],
+    "aukro": [("/vysledky-vyhledavani", aukro_search), ("/__more", aukro_more)],
+}
+
+
+def make_app(site: str, latency: float) -> web.Application:
+    stats = {"requests": 0, "bytes": 0}
+
+    @web.middleware
+    async def account(request: web.Request, handler):
+        if request.path.startswith("/__stats"):
+            return await handler(request)
+        if latency:
+            await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+        response = await handler(request)
+        stats["requests"] += 1
+        stats["bytes"] += len(response.body or b"")
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        snapshot = dict(stats)
+        if request.query.get("reset"):
+            stats.update(requests=0, bytes=0)
+        return web.json_response(snapshot)
+
+    app = web.Application(middlewares=[account])
+    app.router.add_get("/__stats", get_stats)
+    for path, handler in ROUTES[site]:
+        app.router.add_get(path, handler)
+    return app
+
+
+async def start(latency: float = 0.0, host: str = "127.0.0.1") -> tuple[dict[str, str], list[web.AppRunner]]:
+    """Поднимает по серверу на сайт; возвращает базовые адреса и раннеры для остановки."""
+    urls, runners = {}, []
+    for site in SITES:
+        runner = web.AppRunner(make_app(site, latency), access_log=None)
+        await runner.setup()
+        tcp = web.TCPSite(runner, host, 0)
+        await tcp.start()
+        port = tcp._server.sockets[0].getsockname()[1]
+        urls[site] = f"http://{host}:{port}"
+        runners.append(runner)
+    return urls, runners
+
+
+async def serve(latency: float):
+    urls, runners = await start(latency)
+    # Первая строка вывода — адреса сайтов, её читает bench_parsers
+    print(json.dumps(urls), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, мс")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.latency / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
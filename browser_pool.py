@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+
+from interception import install_interception
+from metrics import BROWSER_ACQUIRE_SECONDS, BROWSER_LAUNCH_SECONDS
+from state_cache import state_cache
+from tracing import span
+
+# Логи пула идут в обработчики логера main
+logger = logging.getLogger("main.browser_pool")
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+# Сколько контекстов одновременно держит один Chromium
+MAX_CONTEXTS_PER_BROWSER = 10
+# Сколько простаивающих страниц хранить на (прокси, сайт)
+MAX_IDLE_PAGES = 4
+# После стольких использований контекст пересоздаётся
+MAX_CONTEXT_USES = 50
+
+DIRECT = "direct"
+
+
+def proxy_key(proxy: dict | None) -> str:
+    return proxy["server"] if proxy else DIRECT
+
+
+class BrowserPool:
+    """Один долгоживущий Chromium на прокси, контексты и страницы выдаются парсерам."""
+
+    def __init__(self, max_contexts: int = MAX_CONTEXTS_PER_BROWSER, max_idle: int = MAX_IDLE_PAGES,
+                 intercept: bool = True):
+        self.max_contexts = max_contexts
+        self.max_idle = max_idle
+        # Резать картинки, шрифты и трекеры по профилю сайта (см. interception.py)
+        self.intercept = intercept
+
+        self._playwright = None
+        self._start_lock = asyncio.Lock()
+        self._browsers: dict[str, Browser] = {}
+        self._launch_locks: dict[str, asyncio.Lock] = {}
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._idle: dict[tuple[str, str], list[tuple[BrowserContext, Page]]] = {}
+        self._uses: dict[BrowserContext, int] = {}
+        # user-agent контекста — ключ его storage_state в state_cache
+        self._agents: dict[BrowserContext, str | None] = {}
+        self._closed = False
+
+        self.stats = {
+            "launches": 0,
+            "relaunches": 0,
+            "contexts_created": 0,
+            "context_reuses": 0,
+            "state_restores": 0,
+            "acquires": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    async def start(self, proxies: list[dict] | None = None):
+        async with self._start_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+                self._closed = False
+                logger.info("🧩 Пул браузеров запущен")
+
+        # Поднимаем по браузеру на каждый прокси сразу, а не на первом ключе
+        if proxies:
+            await asyncio.gather(*[self._get_browser(proxy) for proxy in proxies])
+
+    async def _get_browser(self, proxy: dict | None) -> Browser:
+        if self._playwright is None:
+            await self.start()
+
+        key = proxy_key(proxy)
+        lock = self._launch_locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            browser = self._browsers.get(key)
+            if browser and browser.is_connected():
+                return browser
+
+            if browser:
+                self.stats["relaunches"] += 1
+                logger.warning(f"♻️ Браузер для {key} отвалился, перезапускаем")
+                self._drop_idle(key)
+
+            launch_args = {"headless": True, "args": LAUNCH_ARGS}
+            if proxy:
+                launch_args["proxy"] = {
+                    "server": proxy["server"],
+                    "username": proxy.get("username"),
+                    "password": proxy.get("password"),
+                }
+
+            started = time.monotonic()
+            with span("browser_launch", proxy=key):
+                browser = await self._playwright.chromium.launch(**launch_args)
+            launched = time.monotonic() - started
+            self._browsers[key] = browser
+            self.stats["launches"] += 1
+            BROWSER_LAUNCH_SECONDS.observe(launched, proxy=key)
+            logger.info(f"🚀 Chromium для {key} запущен за {launched:.2f} с")
+            return browser
+
+    def _drop_idle(self, key: str):
+        for idle_key in [k for k in self._idle if k[0] == key]:
+            for context, _ in self._idle.pop(idle_key):
+                self._forget(context)
+
+    async def _take_idle(self, key: str, site: str) -> tuple[BrowserContext, Page] | None:
+        idle = self._idle.get((key, site))
+        while idle:
+            context, page = idle.pop()
+            if not page.is_closed():
+                return context, page
+            self._forget(context)
+            await self._close_context(context)
+        return None
+
+    def _forget(self, context: BrowserContext):
+        self._uses.pop(context, None)
+        self._agents.pop(context, None)
+
+    async def _close_context(self, context: BrowserContext):
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Контекст уже закрыт: {e}")
+
+    @asynccontextmanager
+    async def page(self, site: str, proxy: dict | None, user_agent: str | None = None, **context_args):
+        """Выдаёт страницу: переиспользованную для (прокси, сайт) или в новом контексте.
+
+        user_agent применяется только к новому контексту. Новый контекст поднимается
+        из storage_state, сохранённого для (сайт, прокси) в state_cache, — тогда с его
+        user-agent; переданный storage_state остаётся запасным. Если тело блока упало,
+        контекст закрывается и обратно в пул не возвращается.
+        """
+        key = proxy_key(proxy)
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.max_contexts))
+
+        started = time.monotonic()
+        with span("browser_acquire"):
+            await slots.acquire()
+        waited = time.monotonic() - started
+        self.stats["acquires"] += 1
+        self.stats["wait_time_total"] += waited
+        self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited)
+        BROWSER_ACQUIRE_SECONDS.observe(waited, site=site)
+
+        context = page = None
+        healthy = False
+        try:
+            reused = await self._take_idle(key, site)
+            if reused:
+                context, page = reused
+                self.stats["context_reuses"] += 1
+            else:
+                browser = await self._get_browser(proxy)
+                cached = await state_cache.lookup(site, key, user_agent)
+                if cached:
+                    user_agent, context_args["storage_state"] = cached
+                    self.stats["state_restores"] += 1
+                if user_agent:
+                    context_args["user_agent"] = user_agent
+                with span("new_context", restored=bool(cached)):
+                    context = await browser.new_context(**context_args)
+                    self._agents[context] = user_agent
+                    if self.intercept:
+                        await install_interception(context, site)
+                    page = await context.new_page()
+                self.stats["contexts_created"] += 1
+
+            self._uses[context] = self._uses.get(context, 0) + 1
+            yield page
+            healthy = True
+        finally:
+            try:
+                if context is not None:
+                    await self._release(key, site, context, page, healthy)
+            finally:
+                slots.release()
+
+    async def _save_state(self, key: str, site: str, context: BrowserContext):
+        user_agent = self._agents.get(context)
+        if not state_cache.due(site, key, user_agent):
+            return
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            logger.debug(f"Состояние контекста не снято: {e}")
+            return
+        await state_cache.save(site, key, user_agent, state)
+
+    async def _release(self, key: str, site: str, context: BrowserContext, page: Page, healthy: bool):
+        if healthy and not page.is_closed():
+            # Согласия, закрытые попапы и антибот-куки переживут этот контекст
+            await self._save_state(key, site, context)
+
+        idle = self._idle.setdefault((key, site), [])
+        reusable = (
+            healthy
+            and not self._closed
+            and not page.is_closed()
+            and self._uses.get(context, 0) < MAX_CONTEXT_USES
+            and len(idle) < self.max_idle
+        )
+        if reusable:
+            idle.append((context, page))
+            return
+
+        self._forget(context)
+        await self._close_context(context)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["browsers"] = sum(1 for b in self._browsers.values() if b.is_connected())
+        stats["idle_pages"] = sum(len(v) for v in self._idle.values())
+        acquires = stats["acquires"] or 1
+        stats["wait_time_avg"] = stats["wait_time_total"] / acquires
+        return stats
+
+    async def close(self):
+        self._closed = True
+        for idle in self._idle.values():
+            for context, _ in idle:
+                await self._close_context(context)
+        self._idle.clear()
+        self._uses.clear()
+        self._agents.clear()
+
+        for key, browser in self._browsers.items():
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка при закрытии браузера {key}: {e}")
+        self._browsers.clear()
+
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+        logger.info(f"🧩 Пул браузеров остановлен: {self.get_stats()}")
+
+
+browser_pool = BrowserPool()
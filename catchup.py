@@ -0,0 +1,90 @@
+import logging
+import time
+
+logger = logging.getLogger("main.catchup")
+
+# Страниц выдачи на один опрос ключа: первая — всегда, следующие — пока не встретится уже виденное
+MAX_PAGES = {
+    "aukro": 4,
+    "bazos": 3,
+    "sbazar": 3,
+    "vinted": 3,
+}
+DEFAULT_MAX_PAGES = 3
+# Время на догоняющий обход одного ключа, секунды
+TIME_BUDGET = 45
+# Столько виденных подряд — и выдача дочитана (закреплённые TOP-объявления сверху не в счёт)
+SEEN_RUN = 3
+
+stats: dict[str, dict[str, int]] = {}
+
+
+class CatchUp:
+    """Догоняющий обход выдачи «новые сверху»: страницы читаются, пока не встретится уже виденное.
+
+    seen(links) -> [bool] проверяет ссылки по хранилищу дедупликации. В обычном опросе
+    хватает одной страницы; после простоя или на горячем ключе добираются следующие,
+    пока не кончатся лимит страниц или бюджет времени. Без seen читается только первая страница.
+    """
+
+    def __init__(self, site: str, seen=None, max_pages: int | None = None, budget: float = TIME_BUDGET):
+        self.site = site
+        self.seen = seen
+        self.max_pages = (max_pages or MAX_PAGES.get(site, DEFAULT_MAX_PAGES)) if seen else 1
+        self.deadline = time.monotonic() + budget
+        self.pages = 0
+        self.caught_up = False
+        self._links: dict[str, None] = {}
+        self._seen_run = 0
+        self._stats = stats.setdefault(site, {"polls": 0, "extra_pages": 0, "page_cap": 0, "budget": 0})
+
+    @property
+    def links(self) -> list[str]:
+        return list(self._links)
+
+    def add_page(self, links: list[str], last: bool = False) -> bool:
+        """Добавляет страницу выдачи. last — страница неполная, дальше ничего нет. True — читать следующую."""
+        self.pages += 1
+        if self.pages > 1:
+            self._stats["extra_pages"] += 1
+
+        # Объявления между страницами сдвигаются, поэтому повторы отбрасываем
+        fresh = [link for link in dict.fromkeys(links) if link not in self._links]
+        flags = self.seen(fresh) if self.seen and fresh else [False] * len(fresh)
+        for link, seen in zip(fresh, flags):
+            self._links[link] = None
+            if not seen:
+                self._seen_run = 0
+                continue
+            self._seen_run += 1
+            if self._seen_run >= SEEN_RUN:
+                self.caught_up = True
+                break
+
+        if last or not links:
+            self.caught_up = True
+        return self.more()
+
+    def more(self) -> bool:
+        if self.caught_up:
+            return False
+        if self.pages >= self.max_pages:
+            if self.seen:
+                self._stats["page_cap"] += 1
+                logger.info(f"[{self.site}] 📚 Догоняющий обход упёрся в лимит страниц: {self.max_pages}")
+            return False
+        if time.monotonic() >= self.deadline:
+            self._stats["budget"] += 1
+            logger.info(f"[{self.site}] ⌛ Догоняющий обход исчерпал бюджет времени на странице {self.pages}")
+            return False
+        return True
+
+    def finish(self) -> list[str]:
+        self._stats["polls"] += 1
+        if self.pages > 1:
+            logger.info(f"[{self.site}] 📚 Догоняющий обход: страниц {self.pages}, ссылок {len(self._links)}")
+        return self.links
+
+
+def get_stats() -> dict:
+    return {site: dict(values) for site, values in stats.items()}
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from metrics import LIMITER_WAIT_SECONDS
+from tracing import span
+
+logger = logging.getLogger("main.concurrency")
+
+# Во сколько раз латентность может вырасти над базовой, прежде чем лимит снизится
+LATENCY_TOLERANCE = 2.0
+DECREASE_FACTOR = 0.7
+# Короткое и длинное скользящее среднее латентности: их отношение — сигнал деградации
+LATENCY_ALPHA = 0.2
+BASELINE_ALPHA = 0.02
+HISTORY_SIZE = 200
+
+
+class AdaptiveLimiter:
+    """AIMD-лимит параллельности для одного сайта.
+
+    Каждые `limit` успешных запросов подряд лимит растёт на 1. Ошибка или блокировка
+    снижают его в DECREASE_FACTOR раз, как и короткое среднее латентности выше
+    длинного в LATENCY_TOLERANCE раз. Между снижениями должно пройти не меньше
+    `limit` ответов, чтобы одна волна ошибок не обрушила лимит до минимума.
+    """
+
+    def __init__(self, site: str, initial: int, max_limit: int, min_limit: int = 1, politeness: float = 0.0):
+        self.site = site
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial)
+        # Минимальный промежуток между стартами запросов к сайту, секунды
+        self.politeness = politeness
+
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._successes = 0
+        self._since_decrease = initial
+        self._latency_ewma: float | None = None
+        self._baseline: float | None = None
+        self._next_start = 0.0
+
+        self.history: deque[tuple[float, int, str]] = deque(maxlen=HISTORY_SIZE)
+        self.stats = {"ok": 0, "errors": 0, "slow": 0, "wait_time_total": 0.0, "acquires": 0}
+        self._record("start")
+
+    def _record(self, reason: str):
+        self.history.append((time.time(), int(self.limit), reason))
+
+    async def polite_wait(self):
+        # Вне слота: не держим место в лимите, пока выдерживаем паузу
+        if not self.politeness:
+            return
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.politeness * random.uniform(1.0, 1.5)
+        if start > now:
+            with span("polite_wait"):
+                await asyncio.sleep(start - now)
+
+    async def acquire(self):
+        started = time.monotonic()
+        with span("limiter_wait"):
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+                self._in_flight += 1
+        waited = time.monotonic() - started
+        self.stats["acquires"] += 1
+        self.stats["wait_time_total"] += waited
+        LIMITER_WAIT_SECONDS.observe(waited, site=self.site)
+
+    async def release(self, ok: bool, latency: float):
+        self._since_decrease += 1
+        if ok:
+            self.stats["ok"] += 1
+            self._on_success(latency)
+        else:
+            self.stats["errors"] += 1
+            self._decrease("error")
+
+        self._in_flight -= 1
+        # Уведомление не должно потеряться, даже если задачу отменили на выходе из слота
+        await asyncio.shield(self._notify())
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _on_success(self, latency: float):
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = (1 - LATENCY_ALPHA) * self._latency_ewma + LATENCY_ALPHA * latency
+
+        if self._baseline is None:
+            self._baseline = latency
+        else:
+            self._baseline = (1 - BASELINE_ALPHA) * self._baseline + BASELINE_ALPHA * latency
+
+        if self._latency_ewma > self._baseline * LATENCY_TOLERANCE:
+            self.stats["slow"] += 1
+            self._decrease("latency")
+            return
+
+        self._successes += 1
+        if self._successes >= int(self.limit) and self.limit < self.max_limit:
+            self._successes = 0
+            self.limit = min(self.max_limit, self.limit + 1)
+            self._record("increase")
+
+    def _decrease(self, reason: str):
+        self._successes = 0
+        if self._since_decrease < int(self.limit):
+            return
+        self._since_decrease = 0
+        new_limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+        if int(new_limit) < int(self.limit):
+            logger.warning(f"[{self.site}] 📉 Лимит параллельности {int(self.limit)} → {int(new_limit)} ({reason})")
+        self.limit = new_limit
+        self._record(reason)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            await self.release(ok, time.monotonic() - started)
+
+    def get_stats(self) -> dict:
+        acquires = self.stats["acquires"] or 1
+        return {
+            "limit": int(self.limit),
+            "in_flight": self._in_flight,
+            "latency_ewma": self._latency_ewma,
+            "latency_baseline": self._baseline,
+            "wait_time_avg": self.stats["wait_time_total"] / acquires,
+            "ok": self.stats["ok"],
+            "errors": self.stats["errors"],
+            "slow": self.stats["slow"],
+            "history": list(self.history)[-10:],
+        }
@@ -0,0 +1,221 @@
+import asyncio
+import html
+import logging
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config import TELEGRAM_CHAT_ID
+from journal import journal
+from metrics import TELEGRAM_MESSAGES, TELEGRAM_RETRY_AFTER, TELEGRAM_SEND_SECONDS
+from telegram_bot import bot, is_user_active
+from tracing import current_span, resume, span
+
+logger = logging.getLogger("main.delivery")
+
+QUEUE_SIZE = 1000
+# Лимиты Telegram: ~30 сообщений/с на бота, 1/с в личный чат, 20/мин в группу
+GLOBAL_RATE = 25.0
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+MAX_MESSAGE_LEN = 4096
+MAX_ATTEMPTS = 5
+# Склеивать ссылки одного сайта и ключа в одно сообщение
+COALESCE = True
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        # После 429 следующий токен появится не раньше, чем через retry_after секунд
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+        self._updated = time.monotonic()
+
+
+def build_messages(site: str, keyword: str, links: list[str], coalesce: bool = COALESCE) -> list[tuple[str, list[str]]]:
+    header = f"🔍 <b>{site.upper()}</b> | <b>{html.escape(keyword)}</b>"
+    if not coalesce:
+        return [(f"{header}\n{link}", [link]) for link in links]
+
+    messages = []
+    text, chunk = header, []
+    for link in links:
+        if chunk and len(text) + 1 + len(link) > MAX_MESSAGE_LEN:
+            messages.append((text, chunk))
+            text, chunk = header, []
+        text += f"\n{link}"
+        chunk.append(link)
+    if chunk:
+        messages.append((text, chunk))
+    return messages
+
+
+class DeliveryQueue:
+    """Очередь отправки в Telegram: ограничение по токен-бакетам, обработка 429, склейка ссылок."""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE, workers: int = 1):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._workers_count = workers
+        self._workers: list[asyncio.Task] = []
+        self._global = TokenBucket(GLOBAL_RATE, capacity=GLOBAL_RATE)
+        self._chats: dict[int, TokenBucket] = {}
+
+        self.stats = {
+            "enqueued": 0,
+            "jobs_done": 0,
+            "messages_sent": 0,
+            "links_delivered": 0,
+            "links_failed": 0,
+            "retry_after": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = GROUP_CHAT_RATE if chat_id < 0 else PRIVATE_CHAT_RATE
+            bucket = self._chats[chat_id] = TokenBucket(rate)
+        return bucket
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def enqueue(self, site: str, keyword: str, links: list[str], on_done=None, chat_id: int = TELEGRAM_CHAT_ID,
+                      outbox_ids: list[int] | None = None):
+        """Ставит ссылки в очередь. on_done(delivered) вызывается после отправки.
+
+        Ссылки проходят через outbox журнала: pending → sent → acked. outbox_ids —
+        записи прошлого запуска, которые досылаются после перезапуска.
+        Ждёт только при переполненной очереди — парсинг не стоит на отправке.
+        """
+        if outbox_ids is None:
+            outbox_ids = journal.add_pending(site, keyword, chat_id, links)
+        await self._queue.put({
+            "site": site,
+            "keyword": keyword,
+            "links": links,
+            "outbox": dict(zip(links, outbox_ids)),
+            "chat_id": chat_id,
+            "on_done": on_done,
+            "enqueued_at": time.monotonic(),
+            # Отправка продолжает трассу ключа, который нашёл ссылки
+            "trace": current_span(),
+        })
+        self.stats["enqueued"] += 1
+
+    async def _send(self, chat_id: int, text: str) -> bool:
+        with TELEGRAM_SEND_SECONDS.time(), span("telegram_send"):
+            sent = await self._send_with_retries(chat_id, text)
+        TELEGRAM_MESSAGES.inc(result="sent" if sent else "failed")
+        return sent
+
+    async def _send_with_retries(self, chat_id: int, text: str) -> bool:
+        bucket = self._chat_bucket(chat_id)
+        for attempt in range(MAX_ATTEMPTS):
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+                return True
+            except TelegramRetryAfter as e:
+                self.stats["retry_after"] += 1
+                TELEGRAM_RETRY_AFTER.inc()
+                logger.warning(f"⏳ Telegram просит подождать {e.retry_after} с (попытка {attempt + 1}/{MAX_ATTEMPTS})")
+                bucket.pause(e.retry_after)
+                self._global.pause(e.retry_after)
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                # Повтор не поможет: битый текст, удалённый чат или бот заблокирован
+                logger.error(f"❌ Telegram отклонил сообщение: {e}")
+                return False
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    async def _deliver(self, job: dict) -> list[str]:
+        chat_id = job["chat_id"]
+        if not is_user_active(chat_id):
+            logger.info(f"ℹ️ Пользователь {chat_id} отключил сообщения, сообщение не отправлено")
+            return job["links"]
+
+        delivered = []
+        for text, chunk in build_messages(job["site"], job["keyword"], job["links"]):
+            if await self._send(chat_id, text):
+                self.stats["messages_sent"] += 1
+                delivered.extend(chunk)
+                await journal.mark_sent([job["outbox"][link] for link in chunk])
+        return delivered
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                with resume(job["trace"]):
+                    await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: dict):
+        delivered = []
+        try:
+            delivered = await self._deliver(job)
+        except Exception as e:
+            logger.error(f"❌ Ошибка доставки ({job['site']}, '{job['keyword']}'): {e}")
+        finally:
+            latency = time.monotonic() - job["enqueued_at"]
+            self.stats["jobs_done"] += 1
+            self.stats["latency_total"] += latency
+            self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+            self.stats["links_delivered"] += len(delivered)
+            self.stats["links_failed"] += len(job["links"]) - len(delivered)
+            settled = list(job["links"])
+            if job["on_done"]:
+                try:
+                    with span("save_seen"):
+                        await job["on_done"](delivered)
+                except Exception as e:
+                    # Отправленное остаётся в sent: после перезапуска оно попадёт в хранилище без повторной отправки
+                    sent = set(delivered)
+                    settled = [link for link in job["links"] if link not in sent]
+                    logger.error(f"❌ Ошибка в обработчике доставки: {e}")
+            journal.ack([job["outbox"][link] for link in settled])
+
+    async def stop(self, timeout: float = 10.0):
+        # Даём дослать то, что уже в очереди, потом гасим воркеры
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ В очереди отправки осталось {self._queue.qsize()} заданий")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        done = stats["jobs_done"]
+        stats["latency_avg"] = stats["latency_total"] / done if done else 0.0
+        return stats
+
+
+delivery = DeliveryQueue()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+import urllib.parse
+
+logger = logging.getLogger("main.fake_proxy")
+
+# Поведение локальных прокси по кругу: здоровый, медленный, нестабильный, забаненный
+FAKE_PROFILES = [
+    {"delay": 0.0, "fail_rate": 0.0, "ban_rate": 0.0},
+    {"delay": 1.5, "fail_rate": 0.0, "ban_rate": 0.0},
+    {"delay": 0.2, "fail_rate": 0.4, "ban_rate": 0.0},
+    {"delay": 0.0, "fail_rate": 0.0, "ban_rate": 0.8},
+]
+HOST = "127.0.0.1"
+HEAD_LIMIT = 64 * 1024
+DROP_HEADERS = {"proxy-authorization", "proxy-connection", "connection", "keep-alive"}
+
+
+class FakeProxy:
+    """Локальный HTTP-прокси (CONNECT и обычные запросы) с управляемыми задержкой, обрывами и банами.
+
+    Нужен, чтобы проверить пул прокси и предохранители без настоящих прокси.
+    """
+
+    def __init__(self, port: int = 0, delay: float = 0.0, fail_rate: float = 0.0, ban_rate: float = 0.0):
+        self.port = port
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.ban_rate = ban_rate
+        self._server: asyncio.AbstractServer | None = None
+        self.stats = {"requests": 0, "failed": 0, "banned": 0}
+
+    @property
+    def proxy(self) -> dict:
+        return {"server": f"http://{HOST}:{self.port}", "username": "fake", "password": "fake"}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, HOST, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🧪 Тестовый прокси {self.proxy['server']} (задержка {self.delay} с, "
+                    f"обрывы {self.fail_rate:.0%}, баны {self.ban_rate:.0%})")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if len(head) > HEAD_LIMIT:
+                return
+            self.stats["requests"] += 1
+
+            if self.delay:
+                await asyncio.sleep(self.delay * random.uniform(0.5, 1.5))
+            if random.random() < self.fail_rate:
+                self.stats["failed"] += 1
+                return
+            if random.random() < self.ban_rate:
+                self.stats["banned"] += 1
+                writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                return
+
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method, target, version = request_line.split(" ", 2)
+            if method.upper() == "CONNECT":
+                await self._tunnel(target, reader, writer)
+            else:
+                await self._forward(method, target, version, header_lines, reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Тестовый прокси {self.port}: {e}")
+        finally:
+            writer.close()
+
+    async def _tunnel(self, target: str, reader, writer):
+        host, _, port = target.rpartition(":")
+        up_reader, up_writer = await asyncio.open_connection(host, int(port))
+        writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        await writer.drain()
+        await self._pipe_both(reader, writer, up_reader, up_writer)
+
+    async def _forward(self, method, target, version, header_lines, reader, writer):
+        url = urllib.parse.urlsplit(target)
+        path = urllib.parse.urlunsplit(("", "", url.path or "/", url.query, ""))
+        headers = [h for h in header_lines if h and h.split(":", 1)[0].strip().lower() not in DROP_HEADERS]
+        headers.append("Connection: close")
+
+        up_reader, up_writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        lines = [f"{method} {path} {version}", *headers, "", ""]
+        up_writer.write("\r\n".join(lines).encode("latin-1"))
+        await up_writer.drain()
+        await self._pipe_both(reader, writer, up_reader, up_writer)
+
+    @staticmethod
+    async def _pipe(src: asyncio.StreamReader, dst: asyncio.StreamWriter):
+        try:
+            while data := await src.read(65536):
+                dst.write(data)
+                await dst.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            dst.close()
+
+    async def _pipe_both(self, reader, writer, up_reader, up_writer):
+        await asyncio.gather(self._pipe(reader, up_writer), self._pipe(up_reader, writer))
+
+
+_fake_proxies: list[FakeProxy] = []
+
+
+async def start_fake_proxies(count: int) -> list[dict]:
+    """Поднимает count локальных прокси с профилями FAKE_PROFILES и возвращает их в формате PROXIES."""
+    for i in range(count):
+        proxy = FakeProxy(**FAKE_PROFILES[i % len(FAKE_PROFILES)])
+        await proxy.start()
+        _fake_proxies.append(proxy)
+    return [p.proxy for p in _fake_proxies]
+
+
+async def stop_fake_proxies():
+    for proxy in _fake_proxies:
+        await proxy.stop()
+    _fake_proxies.clear()
+
+
+def get_stats() -> dict:
+    return {p.proxy["server"]: dict(p.stats) for p in _fake_proxies}
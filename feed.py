@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+
+from log_setup import log_context
+from matcher import KeywordMatcher, keyword_matcher
+from metrics import FEED_POLL_SECONDS
+from utils import item_key
+
+logger = logging.getLogger("main.feed")
+
+# Как часто перечитывать ленту категории, секунды
+FEED_INTERVAL = 60
+FEED_MAX_PAGES = 5
+# Столько уже виденных объявлений подряд — и лента дочитана (закреплённые «TOP» сверху не в счёт)
+FEED_SEEN_RUN = 3
+# Сколько последних объявлений ленты помнить
+FEED_MEMORY = 20000
+JITTER = 0.1
+
+
+class SiteFeed:
+    """Режим ленты: один обход новых объявлений категории вместо поиска по каждому ключу.
+
+    fetch_page(page_no) отдаёт [(ссылка, заголовок)] новыми сверху; заголовки сверяются
+    со всеми ключами локально, совпадения уходят в report(site, keyword, links).
+    """
+
+    def __init__(self, site: str, fetch_page, report, limiter, interval: float = FEED_INTERVAL,
+                 max_pages: int = FEED_MAX_PAGES, matcher: KeywordMatcher | None = None):
+        self.site = site
+        self.fetch_page = fetch_page
+        self.report = report
+        self.limiter = limiter
+        self.interval = interval
+        self.max_pages = max_pages
+        # Автомат общий для всех лент — собирается один раз на список ключей
+        self.matcher = matcher or keyword_matcher
+
+        self._scanned: OrderedDict[int, None] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.stats = {"polls": 0, "pages": 0, "items": 0, "matches": 0, "errors": 0, "last_pages": 0}
+
+    def _remember(self, key: int):
+        self._scanned[key] = None
+        if len(self._scanned) > FEED_MEMORY:
+            self._scanned.popitem(last=False)
+
+    async def _fetch(self, page_no: int) -> list[tuple[str, str]]:
+        await self.limiter.polite_wait()
+        async with self.limiter.slot():
+            return await self.fetch_page(page_no)
+
+    async def poll(self) -> int:
+        fresh: list[tuple[int, str, str]] = []
+        pages = 0
+        complete = False
+        try:
+            for page_no in range(1, self.max_pages + 1):
+                items = await self._fetch(page_no)
+                pages += 1
+                if not items:
+                    complete = True
+                    break
+
+                seen_run = 0
+                for link, title in items:
+                    key = item_key(self.site, link)
+                    if key in self._scanned:
+                        seen_run += 1
+                        if seen_run >= FEED_SEEN_RUN:
+                            complete = True
+                            break
+                        continue
+                    seen_run = 0
+                    fresh.append((key, link, title))
+                if complete:
+                    break
+            else:
+                complete = True
+                if self._scanned:
+                    logger.warning(f"[{self.site}] ⚠️ Лента не дочитана до знакомых объявлений за {self.max_pages} стр.")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"[{self.site}] ❌ Ошибка ленты на странице {pages + 1}: {e}")
+
+        # Недочитанную ленту не запоминаем: следующий обход пройдёт её заново,
+        # повторы отсечёт общее хранилище просмотренных
+        if complete:
+            for key, _, _ in fresh:
+                self._remember(key)
+
+        hits: dict[str, list[str]] = {}
+        for _, link, title in fresh:
+            for keyword in self.matcher.match(title):
+                hits.setdefault(keyword, []).append(link)
+
+        new_links = 0
+        for keyword, links in hits.items():
+            new_links += await self.report(self.site, keyword, links)
+
+        self.stats["polls"] += 1
+        self.stats["pages"] += pages
+        self.stats["last_pages"] = pages
+        self.stats["items"] += len(fresh)
+        self.stats["matches"] += sum(len(links) for links in hits.values())
+        logger.info(f"[{self.site}] 📰 Лента: страниц {pages}, новых объявлений {len(fresh)}, "
+                    f"совпадений с ключами {len(hits)}")
+        return new_links
+
+    async def _run(self):
+        with log_context(site=self.site):
+            while True:
+                started = time.monotonic()
+                try:
+                    with FEED_POLL_SECONDS.time(site=self.site):
+                        await self.poll()
+                except Exception as e:
+                    logger.error(f"[{self.site}] ❌ Ошибка обхода ленты: {e}")
+                delay = self.interval * random.uniform(1 - JITTER, 1 + JITTER) - (time.monotonic() - started)
+                await asyncio.sleep(max(delay, 0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"[{self.site}] ▶️ Режим ленты: обход раз в {self.interval} с, ключей {len(self.matcher)}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "keywords": len(self.matcher), "remembered": len(self._scanned)}
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+import aiohttp
+
+from browser_pool import proxy_key
+
+logger = logging.getLogger("main.http_client")
+
+# Лимиты соединений одной сессии (одна сессия на прокси)
+CONNECTIONS_PER_PROXY = 20
+CONNECTIONS_PER_HOST = 10
+DEFAULT_TIMEOUT = 15
+
+# Сессии по прокси: (сессия, адрес прокси, авторизация)
+_sessions: dict[str, tuple[aiohttp.ClientSession, str | None, aiohttp.BasicAuth | None]] = {}
+_lock = asyncio.Lock()
+
+
+async def get_session(proxy: dict | None) -> tuple[aiohttp.ClientSession, str | None, aiohttp.BasicAuth | None]:
+    key = proxy_key(proxy)
+    entry = _sessions.get(key)
+    if entry and not entry[0].closed:
+        return entry
+
+    async with _lock:
+        entry = _sessions.get(key)
+        if entry and not entry[0].closed:
+            return entry
+
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTIONS_PER_PROXY,
+            limit_per_host=CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+        )
+        # Куки передаются явно в каждом запросе, чтобы сайты не делили одну банку
+        session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+        )
+
+        proxy_url = proxy["server"] if proxy else None
+        proxy_auth = None
+        if proxy and proxy.get("username"):
+            proxy_auth = aiohttp.BasicAuth(proxy["username"], proxy.get("password") or "")
+
+        entry = (session, proxy_url, proxy_auth)
+        _sessions[key] = entry
+        logger.info(f"🔌 HTTP-сессия для {key} создана")
+        return entry
+
+
+async def fetch_text(url: str, proxy: dict | None, user_agent: str | None = None,
+                     headers: dict | None = None, timeout: float | None = None) -> tuple[int, str]:
+    session, proxy_url, proxy_auth = await get_session(proxy)
+
+    request_headers = {
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "cs-CZ,cs;q=0.9,en;q=0.8",
+    }
+    if user_agent:
+        request_headers["User-Agent"] = user_agent
+    if headers:
+        request_headers.update(headers)
+
+    request_args = {"headers": request_headers, "proxy": proxy_url, "proxy_auth": proxy_auth}
+    if timeout:
+        request_args["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+    async with session.get(url, **request_args) as resp:
+        text = await resp.text(errors="replace")
+        return resp.status, text
+
+
+async def close_sessions():
+    for key, (session, _, _) in list(_sessions.items()):
+        try:
+            await session.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка при закрытии HTTP-сессии {key}: {e}")
+    _sessions.clear()
@@ -6,6 +6,8 @@ admin_choices = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text='Скачать keywords.txt 📂', callback_data='keywords_data')],
     [InlineKeyboardButton(text='Импортировать новый файл📂', callback_data='import_keywords_data'),],
     [InlineKeyboardButton(text='Добавить слово ➕', callback_data='add_one_keyword')],
+    [InlineKeyboardButton(text='Профилировщик ⏱', callback_data='toggle_profiler'),
+     InlineKeyboardButton(text='Медленные трассы 🐢', callback_data='slow_traces')],
 
 ])
 
@@ -0,0 +1,141 @@
+import re
+import urllib.parse
+
+from playwright.async_api import BrowserContext, Route, Request, Response
+
+TRACKER_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "facebook.net",
+    "facebook.com",
+    "connect.facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "tiktok.com",
+    "bing.com",
+    "scorecardresearch.com",
+    "gemius.pl",
+    "imedia.cz",
+    "ssp.seznam.cz",
+    "h.seznam.cz",
+    "onetrust.com",
+    "cookielaw.org",
+]
+
+DEFAULT_PROFILE = {
+    "block_types": {"image", "font", "media"},
+    "block_domains": TRACKER_DOMAINS,
+    "block_patterns": [],
+    # Совпадение с allow_patterns пропускает запрос мимо всех запретов
+    "allow_patterns": [],
+}
+
+# Переопределения по сайтам поверх DEFAULT_PROFILE
+SITE_PROFILES = {
+    "aukro": {
+        "block_patterns": [r"/ads?/", r"\.gif(\?|$)"],
+    },
+    "sbazar": {
+        # Баннер согласия грузится с cmp.seznam.cz — его нельзя резать
+        "allow_patterns": [r"cmp\.seznam\.cz"],
+    },
+    "vinted": {
+        "block_patterns": [r"/advertising/", r"datadome\.co/tags"],
+    },
+    "bazos": {
+        "block_types": {"image", "font", "media", "stylesheet"},
+    },
+}
+
+# Средний размер ответа по типу ресурса, пока не накопилась своя статистика
+DEFAULT_SIZES = {
+    "image": 30_000,
+    "font": 40_000,
+    "media": 200_000,
+    "script": 50_000,
+    "stylesheet": 20_000,
+}
+FALLBACK_SIZE = 10_000
+
+stats = {
+    "blocked_requests": 0,
+    "blocked_bytes_est": 0,
+    "allowed_requests": 0,
+    "allowed_bytes": 0,
+    "blocked_by_type": {},
+    "blocked_by_site": {},
+}
+# [сумма, число] размеров пропущенных ответов по типу — для оценки заблокированных байт
+_observed_sizes: dict[str, list[int]] = {}
+
+
+def get_profile(site: str) -> dict:
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(SITE_PROFILES.get(site, {}))
+    profile["_allow_re"] = [re.compile(p) for p in profile["allow_patterns"]]
+    profile["_block_re"] = [re.compile(p) for p in profile["block_patterns"]]
+    return profile
+
+
+def should_block(profile: dict, url: str, resource_type: str) -> bool:
+    if any(r.search(url) for r in profile["_allow_re"]):
+        return False
+
+    host = urllib.parse.urlsplit(url).hostname or ""
+    if any(host == d or host.endswith("." + d) for d in profile["block_domains"]):
+        return True
+    if any(r.search(url) for r in profile["_block_re"]):
+        return True
+    return resource_type in profile["block_types"]
+
+
+def _estimate_size(resource_type: str) -> int:
+    observed = _observed_sizes.get(resource_type)
+    if observed and observed[1]:
+        return observed[0] // observed[1]
+    return DEFAULT_SIZES.get(resource_type, FALLBACK_SIZE)
+
+
+def _record_response(response: Response):
+    length = response.headers.get("content-length")
+    if not length or not length.isdigit():
+        return
+    size = int(length)
+    stats["allowed_bytes"] += size
+    observed = _observed_sizes.setdefault(response.request.resource_type, [0, 0])
+    observed[0] += size
+    observed[1] += 1
+
+
+async def install_interception(context: BrowserContext, site: str):
+    profile = get_profile(site)
+
+    async def handle(route: Route, request: Request):
+        resource_type = request.resource_type
+        if should_block(profile, request.url, resource_type):
+            stats["blocked_requests"] += 1
+            stats["blocked_bytes_est"] += _estimate_size(resource_type)
+            stats["blocked_by_type"][resource_type] = stats["blocked_by_type"].get(resource_type, 0) + 1
+            stats["blocked_by_site"][site] = stats["blocked_by_site"].get(site, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            stats["allowed_requests"] += 1
+            await route.continue_()
+
+    await context.route("**/*", handle)
+    context.on("response", _record_response)
+
+
+def get_stats() -> dict:
+    return {
+        **stats,
+        "blocked_by_type": dict(stats["blocked_by_type"]),
+        "blocked_by_site": dict(stats["blocked_by_site"]),
+    }
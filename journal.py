@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger("main.journal")
+
+JOURNAL_DB = "parsers/journal.db"
+# Накопленные записи сбрасываются на диск одной транзакцией не реже, чем раз в FLUSH_INTERVAL секунд
+FLUSH_INTERVAL = 1.0
+# Закрытые записи outbox хранятся столько, потом удаляются
+ACKED_TTL = 24 * 3600
+
+PENDING = "pending"
+SENT = "sent"
+ACKED = "acked"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_progress (
+    site TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    hit_rate REAL NOT NULL,
+    runs INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    next_due REAL,
+    PRIMARY KEY (site, keyword)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, updated_at);
+"""
+
+
+class Journal:
+    """Журнал работы и outbox отправки в одной SQLite (WAL) — переживают падение процесса.
+
+    keyword_progress: когда ключ последний раз начат и закончен и когда он следующий
+    по расписанию — после перезапуска планировщик не переопрашивает свежие ключи.
+    outbox: каждая найденная ссылка pending → sent (Telegram принял) → acked (записана
+    в хранилище просмотренных или снята). Записи копятся в памяти и пишутся пачкой
+    с одним fsync; переход в sent пишется сразу — после него ссылку нельзя слать повторно.
+    """
+
+    def __init__(self, db_path: str = JOURNAL_DB, flush_interval: float = FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+        self._progress: dict[tuple[str, str], dict] = {}
+        # Отложенные операции: (sql, [параметры]) в порядке появления
+        self._ops: list[tuple[str, list[tuple]]] = []
+        self._ids = itertools.count(1)
+        self._flusher: asyncio.Task | None = None
+        self.stats = {"flushes": 0, "rows_written": 0, "pending": 0, "sent": 0, "acked": 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # fsync на каждую транзакцию — но транзакция одна на пачку записей
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _open_sync(self):
+        self._conn = self._connect()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM outbox WHERE state = ? AND updated_at < ?", (ACKED, time.time() - ACKED_TTL))
+        rows = self._conn.execute(
+            "SELECT site, keyword, hit_rate, runs, hits, started_at, finished_at, next_due FROM keyword_progress"
+        )
+        for site, keyword, hit_rate, runs, hits, started_at, finished_at, next_due in rows:
+            self._progress[(site, keyword)] = {
+                "hit_rate": hit_rate, "runs": runs, "hits": hits,
+                "started_at": started_at, "finished_at": finished_at, "next_due": next_due,
+            }
+        last_id = self._conn.execute("SELECT MAX(id) FROM outbox").fetchone()[0] or 0
+        self._ids = itertools.count(last_id + 1)
+
+    async def open(self):
+        async with self._lock:
+            if self._conn is None:
+                await asyncio.to_thread(self._open_sync)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f"📓 Журнал открыт: ключей с прогрессом {len(self._progress)}")
+
+    def _defer(self, sql: str, rows: list[tuple]):
+        if rows:
+            self._ops.append((sql, rows))
+
+    def _flush_sync(self, ops: list[tuple[str, list[tuple]]]):
+        with self._conn:
+            self._conn.execute("BEGIN")
+            for sql, rows in ops:
+                self._conn.executemany(sql, rows)
+
+    async def flush(self):
+        async with self._lock:
+            if not self._ops or self._conn is None:
+                return
+            ops, self._ops = self._ops, []
+            try:
+                await asyncio.to_thread(self._flush_sync, ops)
+            except Exception:
+                # Пачка не потеряна: уйдёт со следующей попыткой
+                self._ops = ops + self._ops
+                raise
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += sum(len(rows) for _, rows in ops)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Журнал не записан: {e}")
+
+    # --- прогресс ключей ---
+
+    def progress(self, site: str, keyword: str) -> dict | None:
+        return self._progress.get((site, keyword))
+
+    def _save_progress(self, site: str, keyword: str, entry: dict):
+        self._progress[(site, keyword)] = entry
+        self._defer(
+            "INSERT OR REPLACE INTO keyword_progress "
+            "(site, keyword, hit_rate, runs, hits, started_at, finished_at, next_due) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(site, keyword, entry["hit_rate"], entry["runs"], entry["hits"],
+              entry["started_at"], entry["finished_at"], entry["next_due"])],
+        )
+
+    def keyword_started(self, site: str, keyword: str, hit_rate: float, runs: int, hits: int):
+        entry = dict(self._progress.get((site, keyword)) or {"finished_at": None, "next_due": None})
+        entry.update(hit_rate=hit_rate, runs=runs, hits=hits, started_at=time.time())
+        self._save_progress(site, keyword, entry)
+
+    def keyword_finished(self, site: str, keyword: str, hit_rate: float, runs: int, hits: int, next_due: float):
+        """next_due — время следующего опроса по часам time.time(), а не monotonic."""
+        entry = dict(self._progress.get((site, keyword)) or {"started_at": None})
+        entry.update(hit_rate=hit_rate, runs=runs, hits=hits, finished_at=time.time(), next_due=next_due)
+        self._save_progress(site, keyword, entry)
+
+    # --- outbox ---
+
+    def add_pending(self, site: str, keyword: str, chat_id: int, links: list[str]) -> list[int]:
+        """Регистрирует ссылки к отправке. Потеря этой пачки при падении безопасна: ссылки
+        ещё не в хранилище просмотренных, и следующий опрос найдёт их снова."""
+        now = time.time()
+        ids = [next(self._ids) for _ in links]
+        self._defer(
+            "INSERT INTO outbox (id, site, keyword, chat_id, link, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(item_id, site, keyword, chat_id, link, PENDING, now) for item_id, link in zip(ids, links)],
+        )
+        self.stats["pending"] += len(ids)
+        return ids
+
+    def _set_state(self, ids: list[int], state: str):
+        now = time.time()
+        self._defer("UPDATE outbox SET state = ?, updated_at = ? WHERE id = ?", [(state, now, i) for i in ids])
+        self.stats[state] += len(ids)
+
+    async def mark_sent(self, ids: list[int]):
+        # Граница «ровно один раз»: до возврата отметка уже на диске
+        self._set_state(ids, SENT)
+        try:
+            await self.flush()
+        except Exception as e:
+            # Отметка осталась в очереди записи — отправку не откатываем
+            logger.error(f"❌ Отметка sent не записана, повтор при следующей записи: {e}")
+
+    def ack(self, ids: list[int]):
+        self._set_state(ids, ACKED)
+
+    def _unfinished_sync(self) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT id, site, keyword, chat_id, link, state FROM outbox WHERE state != ? ORDER BY id", (ACKED,)
+        ).fetchall()
+        return [
+            {"id": r[0], "site": r[1], "keyword": r[2], "chat_id": r[3], "link": r[4], "state": r[5]}
+            for r in rows
+        ]
+
+    async def unfinished(self) -> list[dict]:
+        """Записи outbox прошлого запуска, не дошедшие до acked."""
+        await self.flush()
+        async with self._lock:
+            return await asyncio.to_thread(self._unfinished_sync)
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "queued_ops": len(self._ops), "keywords": len(self._progress)}
+
+
+journal = Journal()
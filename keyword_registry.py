@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+
+from utils import load_keywords
+
+logger = logging.getLogger("main.keywords")
+
+# Как часто проверять mtime и размер keywords.txt, секунды
+POLL_INTERVAL = 2.0
+# Файл считается дописанным, если не менялся столько секунд
+SETTLE_DELAY = 0.5
+
+
+class KeywordRegistry:
+    """Ключи из keywords.txt в памяти: файл читается один раз на изменение, а не на каждый сайт.
+
+    Изменения файла (от бота или руками) замечаются по mtime/размеру. Подписчики
+    получают разницу listener(added, removed); полный список — в registry.keywords.
+    """
+
+    def __init__(self):
+        self.path: str | None = None
+        self.keywords: list[str] = []
+        # На время замены файла через бота: поиск пропускает ключи, перечитывание ждёт
+        self.paused = False
+
+        self._listeners = []
+        self._signature: tuple[int, int] | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.stats = {"reloads": 0, "added": 0, "removed": 0}
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    async def reload(self) -> tuple[list[str], list[str]]:
+        """Перечитывает файл и рассылает разницу. Возвращает (добавленные, удалённые)."""
+        if self.path is None:
+            # Реестр не запущен (например, бот работает отдельно от парсеров) — перечитывать некому
+            return [], []
+        async with self._lock:
+            self._signature = self._stat()
+            if self._signature is None:
+                logger.warning(f"⚠️ Файл ключей {self.path} не найден, оставляем текущие: {len(self.keywords)}")
+                return [], []
+            keywords = list(dict.fromkeys(await asyncio.to_thread(load_keywords, self.path)))
+            old = set(self.keywords)
+            new = set(keywords)
+            added = [k for k in keywords if k not in old]
+            removed = [k for k in self.keywords if k not in new]
+            self.keywords = keywords
+            if not added and not removed:
+                return [], []
+
+            self.stats["reloads"] += 1
+            self.stats["added"] += len(added)
+            self.stats["removed"] += len(removed)
+            logger.info(f"🔤 Ключи обновлены: +{len(added)} / -{len(removed)}, всего {len(keywords)}")
+            for listener in self._listeners:
+                try:
+                    listener(added, removed)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка применения ключевых слов: {e}")
+            return added, removed
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            if self.paused:
+                continue
+            signature = self._stat()
+            if signature == self._signature or signature is None:
+                continue
+            # Ждём, пока файл допишут, чтобы не разослать обрезанный список
+            await asyncio.sleep(SETTLE_DELAY)
+            if self._stat() != signature:
+                continue
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"❌ Не удалось перечитать {self.path}: {e}")
+
+    async def start(self, path: str):
+        self.path = path
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def pause(self):
+        self.paused = True
+
+    async def resume(self):
+        self.paused = False
+        await self.reload()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "keywords": len(self.keywords), "paused": self.paused}
+
+
+keyword_registry = KeywordRegistry()
@@ -0,0 +1,166 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+LOG_DIR = "logs"
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+# Верхние логгеры и их файлы; main.* (модули сервиса) пишут в main.log
+LOG_FILES = {
+    "main": "main.log",
+    "tg_bot": "tg_bot.log",
+    "bazos": "bazos.log",
+    "sbazar": "sbazar.log",
+    "vinted": "vinted.log",
+    "aukro": "aukro.log",
+}
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+# Записи этого уровня и ниже ограничиваются по месту вызова: RATE_LIMIT_BURST за RATE_LIMIT_WINDOW секунд
+RATE_LIMIT_LEVEL = logging.DEBUG
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_WINDOW = 10.0
+# Поля контекста, которые попадают в JSON
+CONTEXT_FIELDS = ("site", "keyword", "duration", "worker")
+
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.handlers.QueueHandler | None = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Добавляет поля (site, keyword, ...) ко всем записям внутри блока, включая вложенные задачи."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше burst отладочных записей за окно с одного места вызова.
+
+    Первая запись после окна сообщает, сколько похожих было отброшено.
+    """
+
+    def __init__(self, level: int = RATE_LIMIT_LEVEL, burst: int = RATE_LIMIT_BURST, window: float = RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.level = level
+        self.burst = burst
+        self.window = window
+        # место вызова → [начало окна, записей в окне, отброшено]
+        self._sites: dict[tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        state = self._sites.get(key)
+        if state is None or now - state[0] >= self.window:
+            dropped = state[2] if state else 0
+            self._sites[key] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.getMessage()} (ещё {dropped} похожих пропущено)"
+                record.args = None
+            return True
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение и поля контекста.
+
+    Трейсбек QueueHandler уже дописал в сообщение.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _file_handler(filename: str, formatter: logging.Formatter, max_bytes: int, backup_count: int):
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, filename), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+def setup_logging(json_format: bool = False, level: int | str = logging.INFO, process_name: str | None = None,
+                  max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT):
+    """Общая настройка логов: логгеры только кладут записи в очередь, файлы и консоль пишет отдельный поток.
+
+    json_format — файлы в JSON построчно (консоль остаётся текстовой).
+    process_name — писать всё в один файл <process_name>.log, например для воркеров,
+    чтобы несколько процессов не ротировали одни и те же файлы.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    file_formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+    handlers: list[logging.Handler] = [logging.StreamHandler()]
+    if process_name:
+        handlers.append(_file_handler(f"{process_name}.log", file_formatter, max_bytes, backup_count))
+    else:
+        for name, filename in LOG_FILES.items():
+            handler = _file_handler(filename, file_formatter, max_bytes, backup_count)
+            handler.addFilter(logging.Filter(name))
+            handlers.append(handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Фильтры работают в потоке цикла событий, до постановки в очередь
+    _queue_handler.addFilter(ContextFilter())
+    _queue_handler.addFilter(RateLimitFilter())
+    for name in LOG_FILES:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописывает очередь и закрывает файлы."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    for name in LOG_FILES:
+        logging.getLogger(name).removeHandler(_queue_handler)
+    _listener = _queue_handler = None
@@ -1,43 +1,90 @@
+import argparse
 import asyncio
 import logging
 import os
-import random
+import sys
+import time
 
 from utils import (
-    load_keywords,
-    load_seen_links,
-    save_seen_links,
     normalize_link,
 )
-from config import KEYWORDS_FILE, SEEN_LINKS_FILE
-from parsers.bazos_cz import search_bazos
-from parsers.vinted_cz import search_vinted
-from parsers.sbazar_cz import search_sbazar
-from parsers.aukro_cz import search_aukro
-from telegram_bot import send_to_telegram, run_bot, stop_parsing
-
-# 👇 Семафоры по сайтам
-SEMAPHORES = {
-    "aukro": asyncio.Semaphore(7),
-    "bazos": asyncio.Semaphore(5),
-    "sbazar": asyncio.Semaphore(7),
-    "vinted": asyncio.Semaphore(7),
+from config import KEYWORDS_FILE, SEEN_LINKS_FILE, PROXIES
+from browser_pool import browser_pool
+from proxy_pool import proxy_pool
+from fake_proxy import start_fake_proxies, stop_fake_proxies
+from http_client import close_sessions
+from interception import get_stats as get_interception_stats
+from catchup import get_stats as get_catchup_stats
+from state_cache import state_cache
+from seen_store import open_stores, close_stores, stores as seen_links_store
+from parsers.bazos_cz import search_bazos, fetch_bazos_feed
+from parsers.vinted_cz import search_vinted, fetch_vinted_feed
+from parsers.sbazar_cz import search_sbazar, fetch_sbazar_feed
+from parsers.aukro_cz import search_aukro, fetch_aukro_feed
+from telegram_bot import run_bot
+from keyword_registry import keyword_registry
+from delivery import delivery
+from journal import journal, SENT
+from scheduler import SiteScheduler, SKIPPED
+from feed import SiteFeed
+from matcher import keyword_matcher
+from sharding import Coordinator, run_worker
+from metrics import (
+    REGISTRY, start_metrics_server, FETCH_SECONDS, FETCH_ERRORS, KEYWORDS_PROCESSED, NEW_LINKS,
+    SEEN_STORE_SIZE, DELIVERY_QUEUE_DEPTH, LIMITER_LIMIT, LIMITER_IN_FLIGHT,
+)
+from concurrency import AdaptiveLimiter
+from log_setup import setup_logging, log_context
+import tracing
+from tracing import span
+
+# 👇 Параллельность по сайтам: (стартовый лимит, максимум) для адаптивного лимитера
+CONCURRENCY = {
+    "aukro": (5, 10),
+    "bazos": (10, 30),  # HTTP-путь, браузер только как запасной вариант
+    "sbazar": (5, 12),
+    "vinted": (5, 12),
+}
+# Минимальная пауза между стартами запросов к сайту, секунды (вместо сна внутри слота)
+POLITENESS = {
+    "aukro": 1.0,
+    "bazos": 0.3,
+    "sbazar": 0.6,
+    "vinted": 0.8,
+}
+LIMITERS = {
+    site: AdaptiveLimiter(site, initial, max_limit, politeness=POLITENESS[site])
+    for site, (initial, max_limit) in CONCURRENCY.items()
+}
+
+# 👇 Режим ленты: сайт обходит новые объявления категории один раз и сверяет их со всеми ключами
+FEED_MODE = {
+    "aukro": False,
+    "bazos": False,
+    "sbazar": False,
+    "vinted": False,
 }
 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+# Число локальных тестовых прокси вместо PROXIES (0 — боевой режим), см. fake_proxy.py
+FAKE_PROXIES = int(os.getenv("FAKE_PROXIES", "0"))
 
-logger = logging.getLogger("main")
-logger.setLevel(logging.INFO)
+# Число воркер-процессов для поиска (0 — всё в одном процессе), см. sharding.py
+WORKERS = int(os.getenv("WORKERS", "0"))
+
+# Порт метрик Prometheus на 127.0.0.1 (0 — не поднимать), см. metrics.py
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Как часто писать статистику и чистить хранилища, секунды (keywords.txt отслеживает keyword_registry)
+STATS_INTERVAL = 60
 
-if not logger.hasHandlers():
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "main.log"), encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(fh)
-    logger.addHandler(logging.StreamHandler())
+# Логи: LOG_JSON=1 — файлы построчно в JSON, LOG_LEVEL=DEBUG — подробные шаги парсеров, см. log_setup.py
+LOG_JSON = os.getenv("LOG_JSON", "0") == "1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
-# Хранилище просмотренных ссылок
-seen_links_store: dict[str, set[str]] = {}
+# Трассировка этапов поиска (TRACE=1): медленные трассы пишутся в logs/traces_slowest.*, см. tracing.py
+TRACE = os.getenv("TRACE", "0") == "1"
+
+logger = logging.getLogger("main")
 
 # Карта парсеров
 PARSERS = {
@@ -46,99 +93,266 @@ PARSERS = {
     "sbazar": search_sbazar,
     "aukro": search_aukro,
 }
+FEED_PARSERS = {
+    "bazos": fetch_bazos_feed,
+    "vinted": fetch_vinted_feed,
+    "sbazar": fetch_sbazar_feed,
+    "aukro": fetch_aukro_feed,
+}
 
 
-async def send_links_separately(links: list[str], site: str, keyword: str):
-    for link in links:
-        message = f"🔍 <b>{site.upper()}</b> | <b>{keyword}</b>\n{link}"
-        try:
-            await send_to_telegram(message)
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки в Telegram: {e}")
+async def enqueue_links(site: str, keyword: str, new_links: list[str], **delivery_args):
+    """Ставит зарезервированные ссылки в отправку; доставленное попадает в хранилище просмотренных."""
+    seen_links = seen_links_store[site]
 
+    # Единственная точка записи: в хранилище попадает только доставленное
+    async def on_done(delivered, claimed=new_links):
+        await seen_links.commit(delivered, claimed)
+        logger.info(f"✅ Отправлено {len(delivered)}/{len(claimed)} новых ссылок по ключу '{keyword}' ({site})")
 
-async def process_keyword(site: str, keyword: str, func, sema: asyncio.Semaphore):
     try:
-        if stop_parsing:
+        await delivery.enqueue(site, keyword, new_links, on_done, **delivery_args)
+    except BaseException:
+        await seen_links.commit([], new_links)
+        raise
+
+
+async def recover_outbox():
+    """Доводит outbox прошлого запуска: отправленное — в хранилище, неотправленное — снова в очередь."""
+    rows = await journal.unfinished()
+    if not rows:
+        return
+
+    sent: dict[str, list[dict]] = {}
+    pending: dict[tuple[str, str, int], list[dict]] = {}
+    for row in rows:
+        if row["site"] not in seen_links_store:
+            journal.ack([row["id"]])
+        elif row["state"] == SENT:
+            sent.setdefault(row["site"], []).append(row)
+        else:
+            pending.setdefault((row["site"], row["keyword"], row["chat_id"]), []).append(row)
+
+    for site, site_rows in sent.items():
+        await seen_links_store[site].add_many([row["link"] for row in site_rows])
+        journal.ack([row["id"] for row in site_rows])
+
+    resent = 0
+    for (site, keyword, chat_id), key_rows in pending.items():
+        # Ссылку мог уже доставить другой ключ — такие просто закрываем
+        fresh = set(seen_links_store[site].claim([row["link"] for row in key_rows]))
+        journal.ack([row["id"] for row in key_rows if row["link"] not in fresh])
+        key_rows = [row for row in key_rows if row["link"] in fresh]
+        if key_rows:
+            await enqueue_links(site, keyword, [row["link"] for row in key_rows],
+                                chat_id=chat_id, outbox_ids=[row["id"] for row in key_rows])
+            resent += len(key_rows)
+
+    logger.info(f"📓 Outbox прошлого запуска: отправлено до падения {sum(map(len, sent.values()))}, "
+                f"досылается {resent}")
+
+
+async def report_links(site: str, keyword: str, links: list[str]) -> int:
+    """Отбирает новые ссылки по ключу и ставит их в отправку. Возвращает число новых."""
+    seen_links = seen_links_store[site]
+    normalized_links = [normalize_link(link) for link in links]
+
+    with span("dedup"):
+        new_links = seen_links.claim(normalized_links)
+
+    logger.info(f"[{site}] По ключу '{keyword}': ссылок {len(links)}, новых {len(new_links)}, просмотрено всего {len(seen_links)}")
+    NEW_LINKS.inc(len(new_links), site=site)
+
+    if new_links:
+        with span("enqueue"):
+            await enqueue_links(site, keyword, new_links)
+
+    return len(new_links)
+
+
+async def process_keyword(site: str, keyword: str, func, limiter: AdaptiveLimiter | None) -> int | None:
+    try:
+        if keyword_registry.paused:
             logger.warning(f"[{site}] Пропущен ключ '{keyword}' из-за замены keywords.txt")
-            return
+            # Опроса не было: планировщик повторит ключ через несколько секунд, не считая это ошибкой
+            return SKIPPED
+
+        # site и keyword попадают во все записи парсера по этому ключу
+        with log_context(site=site, keyword=keyword), span("process_keyword", site=site, keyword=keyword):
+            started = time.monotonic()
+            if limiter is None:
+                # Режим воркеров: лимитер сайта работает в воркере, здесь только ждём ссылки
+                with FETCH_SECONDS.time(site=site):
+                    links = await func(keyword, None)
+            else:
+                await limiter.polite_wait()  # ⏱️ антиспам-пауза вне слота
+                async with limiter.slot():
+                    # Догоняющий обход листает выдачу, пока не встретит уже виденное
+                    with FETCH_SECONDS.time(site=site):
+                        links = await func(keyword, seen_links_store[site].seen)
+
+            KEYWORDS_PROCESSED.inc(site=site)
+            with log_context(duration=round(time.monotonic() - started, 3)), span("report_links"):
+                return await report_links(site, keyword, links)
 
-        async with sema:
-            await asyncio.sleep(random.uniform(1.2, 2.8))  # ⏱️ антиспам-задержка
+    except Exception as e:
+        FETCH_ERRORS.inc(site=site)
+        logger.error(f"❌ Ошибка при обработке ключа '{keyword}' на {site}: {e}")
+        # Не «ничего нового»: планировщик не засчитывает сбой как пустой опрос
+        return None
 
-            seen_links = seen_links_store.get(site, set())
-            links = await func(keyword)
-            normalized_links = [normalize_link(link) for link in links]
 
-            new_links = [link for link in normalized_links if link not in seen_links]
+# Координатор воркер-процессов: python main.py --worker <имя> на каждый воркер
+COORDINATOR = Coordinator(WORKERS, [sys.executable, os.path.abspath(__file__), "--worker"]) if WORKERS else None
 
-            logger.info(f"[{site}] По ключу '{keyword}': всего ссылок: {len(links)}")
-            logger.info(f"[{site}] Уже просмотрено: {len(seen_links)}")
-            logger.info(f"[{site}] Новых ссылок: {len(new_links)}")
 
-            if new_links:
-                await send_links_separately(new_links, site, keyword)
-                logger.info(f"✅ Отправлено {len(new_links)} новых ссылок по ключу '{keyword}' ({site})")
-                seen_links.update(new_links)
-                save_seen_links(SEEN_LINKS_FILE[site], seen_links)
+def make_handler(site: str, search_func):
+    async def handler(keyword: str) -> int | None:
+        if COORDINATOR:
+            return await process_keyword(site, keyword, lambda kw, is_seen: COORDINATOR.submit(site, kw), None)
+        return await process_keyword(site, keyword, search_func, LIMITERS[site])
+    return handler
 
-            # Обновляем хранилище в любом случае
-            seen_links_store[site] = seen_links
-
-    except Exception as e:
-        logger.error(f"❌ Ошибка при обработке ключа '{keyword}' на {site}: {e}")
 
+# Планировщики по сайтам: каждый сайт крутится в своём темпе
+SCHEDULERS = {
+    site: SiteScheduler(site, make_handler(site, func), CONCURRENCY[site][1], journal)
+    for site, func in PARSERS.items()
+    if not FEED_MODE.get(site)
+}
+FEEDS = {
+    site: SiteFeed(site, FEED_PARSERS[site], report_links, LIMITERS[site])
+    for site, enabled in FEED_MODE.items()
+    if enabled
+}
 
-async def run_for_site(site, search_func):
-    logger.info(f"▶️ Обработка сайта {site.upper()}")
 
-    seen_links = load_seen_links(SEEN_LINKS_FILE[site])
-    seen_links_store[site] = seen_links
+def log_stats():
+    for site, scheduler in SCHEDULERS.items():
+        logger.info(f"[{site}] 📊 Планировщик: {scheduler.get_stats()}")
+    for site, feed in FEEDS.items():
+        logger.info(f"[{site}] 📰 Лента: {feed.get_stats()}")
+    for site, limiter in LIMITERS.items():
+        logger.info(f"[{site}] 🎚 Лимитер: {limiter.get_stats()}")
+    if COORDINATOR:
+        logger.info(f"🧮 Координатор: {COORDINATOR.get_stats()}")
+    logger.info(f"🌐 Прокси: {proxy_pool.get_stats()}")
+    logger.info(f"🧩 Пул браузеров: {browser_pool.get_stats()}")
+    logger.info(f"🍪 Состояния браузера: {state_cache.get_stats()}")
+    logger.info(f"🚫 Перехват запросов: {get_interception_stats()}")
+    logger.info(f"📨 Очередь отправки: {delivery.get_stats()}")
+    logger.info(f"🔤 Ключи: {keyword_registry.get_stats()}")
+    logger.info(f"📓 Журнал: {journal.get_stats()}")
+    logger.info(f"📚 Догоняющий обход: {get_catchup_stats()}")
 
-    keywords = load_keywords(KEYWORDS_FILE)
-    sema = SEMAPHORES[site]
 
-    batch_size = 30
-    for i in range(0, len(keywords), batch_size):
-        batch = keywords[i:i + batch_size]
-        logger.info(f"[{site}] 🔄 Обработка батча {i // batch_size + 1}/{(len(keywords)-1)//batch_size+1}")
+def apply_keywords(added: list[str], removed: list[str]):
+    # Файл прочитан один раз на все сайты; в планировщики уходит только разница
+    for scheduler in SCHEDULERS.values():
+        scheduler.update_keywords(added, removed)
+    if FEEDS and keyword_matcher.set_keywords(keyword_registry.keywords):
+        logger.info(f"🔤 Автомат ключей обновлён: {len(keyword_matcher)} ключей")
 
-        tasks = [
-            asyncio.create_task(process_keyword(site, kw, search_func, sema))
-            for kw in batch
-        ]
-        await asyncio.gather(*tasks)
-        await asyncio.sleep(3)  # ⏸️ Пауза между батчами
 
-    logger.info(f"[{site}] ✅ Завершена обработка {len(keywords)} ключей")
+keyword_registry.subscribe(apply_keywords)
 
 
-async def start_parsers():
+async def start_parsers_loop():
     logger.info("🚀 Старт парсинга по всем сайтам")
+    # Ключи из файла, дальше — изменения от бота и ручные правки без перезапуска
+    await keyword_registry.start(KEYWORDS_FILE)
+    for scheduler in SCHEDULERS.values():
+        scheduler.start()
+    for feed in FEEDS.values():
+        feed.start()
 
-    await asyncio.gather(*[
-        run_for_site(site, func) for site, func in PARSERS.items()
-    ])
+    while True:
+        for store in seen_links_store.values():
+            await store.expire()
 
-    logger.info("📊 Парсинг завершён по всем сайтам.")
+        await asyncio.sleep(STATS_INTERVAL)
+        log_stats()
+        if tracing.is_enabled():
+            await tracing.write_slowest()
 
 
-async def start_parsers_loop():
-    while True:
-        await start_parsers()
-        logger.info("⏰ Ожидание 60 сек перед следующим циклом...")
-        await asyncio.sleep(60)
+def collect_gauges():
+    for site, store in seen_links_store.items():
+        SEEN_STORE_SIZE.set(len(store), site=site)
+    for site, limiter in LIMITERS.items():
+        LIMITER_LIMIT.set(int(limiter.limit), site=site)
+        LIMITER_IN_FLIGHT.set(limiter.get_stats()["in_flight"], site=site)
+    DELIVERY_QUEUE_DEPTH.set(delivery.get_stats()["queue_depth"])
+
+
+REGISTRY.add_collector(collect_gauges)
+
+
+async def start_fetching() -> list[dict]:
+    proxies = await start_fake_proxies(FAKE_PROXIES) if FAKE_PROXIES else PROXIES
+    proxy_pool.set_proxies(proxies)
+    return proxies
+
+
+async def stop_fetching():
+    await close_sessions()
+    await browser_pool.close()
+    await stop_fake_proxies()
 
 
 async def main():
-    await asyncio.gather(
-        start_parsers_loop(),
-        run_bot(),
-    )
+    # Хранилище просмотренных ссылок открывается один раз; *_seen.json переносятся при первом запуске
+    await open_stores(SEEN_LINKS_FILE)
+    # Журнал — до ключей: планировщики берут из него расписание, отправка — outbox
+    await journal.open()
+    proxies = await start_fetching()
+    # С воркерами браузеры нужны координатору только для лент
+    if not COORDINATOR or FEEDS:
+        await browser_pool.start(proxies)
+    if COORDINATOR:
+        await COORDINATOR.start()
+    delivery.start()
+    await recover_outbox()
+    metrics_server = await start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+    try:
+        await asyncio.gather(
+            start_parsers_loop(),
+            run_bot(),
+        )
+    finally:
+        if metrics_server:
+            await metrics_server.cleanup()
+        await keyword_registry.stop()
+        for scheduler in SCHEDULERS.values():
+            await scheduler.stop()
+        for feed in FEEDS.values():
+            await feed.stop()
+        if COORDINATOR:
+            await COORDINATOR.stop()
+        await delivery.stop()
+        await journal.close()
+        await stop_fetching()
+        await close_stores()
+
+
+async def worker_main(name: str):
+    # Воркер только ищет: без бота, хранилища просмотренных и очереди отправки
+    proxies = await start_fetching()
+    await browser_pool.start(proxies)
+    try:
+        await run_worker(name, PARSERS, LIMITERS)
+    finally:
+        await stop_fetching()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", metavar="NAME", help="запустить воркер поиска для координатора")
+    args = parser.parse_args()
+    # У каждого воркера свой файл логов: ротация одних файлов из нескольких процессов ломает их
+    setup_logging(json_format=LOG_JSON, level=LOG_LEVEL, process_name=f"worker-{args.worker}" if args.worker else None)
+    tracing.enable(TRACE)
     try:
-        asyncio.run(main())
+        asyncio.run(worker_main(args.worker) if args.worker else main())
     except (KeyboardInterrupt, SystemExit):
         logger.info("🛑 Программа остановлена вручную")
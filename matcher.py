@@ -0,0 +1,212 @@
+import re
+import unicodedata
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Регистр и диакритика не важны: «Čapek» и «capek» совпадают."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def normalize(text: str) -> str:
+    """Свёрнутый текст из слов через один пробел — границы слов становятся пробелами."""
+    return " ".join(_WORD_RE.findall(fold(text)))
+
+
+def parse_keyword(keyword: str) -> tuple[tuple[str, bool], ...]:
+    """Ключ → шаблоны (текст, до конца слова).
+
+    `harry potter` — все слова в любом порядке, каждое с начала слова («potter» найдёт «pottera»);
+    `"válka s mloky"` в кавычках — точная фраза целыми словами.
+    """
+    raw = keyword.strip()
+    if len(raw) > 2 and raw[0] == raw[-1] == '"':
+        phrase = normalize(raw[1:-1])
+        return ((phrase, True),) if phrase else ()
+    return tuple((word, False) for word in dict.fromkeys(normalize(raw).split()))
+
+
+class KeywordMatcher:
+    """Все ключи за один проход по заголовку: автомат Ахо — Корасик над свёрнутыми шаблонами.
+
+    set_keywords применяет разницу: новые шаблоны дописываются в бор, удалённые
+    гасятся, ссылки неудач пересчитываются. Бор пересобирается с нуля, только
+    когда погашенного становится больше живого.
+    """
+
+    def __init__(self, keywords: list[str] | None = None):
+        self._reset()
+        self.set_keywords(keywords or [])
+
+    def _reset(self):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._own: list[list[int]] = [[]]
+        self._out: list[tuple[int, ...]] = [()]
+
+        self._pattern_ids: dict[tuple[str, bool], int] = {}
+        self._patterns: dict[int, tuple[str, bool, int]] = {}
+        self._users: dict[int, list[str]] = {}
+        self._next_id = 0
+        self._stale = 0
+        self._live = 0
+
+        self._requires: dict[str, tuple[int, ...]] = {}
+        self._order: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._requires)
+
+    @property
+    def keywords(self) -> list[str]:
+        return list(self._requires)
+
+    def _insert(self, text: str, whole: bool) -> int:
+        key = (text, whole)
+        pattern_id = self._pattern_ids.get(key)
+        if pattern_id is not None:
+            return pattern_id
+
+        node = 0
+        for ch in text:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._out.append(())
+            node = nxt
+
+        pattern_id = self._next_id
+        self._next_id += 1
+        self._pattern_ids[key] = pattern_id
+        self._patterns[pattern_id] = (text, whole, node)
+        self._users[pattern_id] = []
+        self._own[node].append(pattern_id)
+        self._live += len(text)
+        return pattern_id
+
+    def _drop(self, pattern_id: int):
+        text, whole, node = self._patterns.pop(pattern_id)
+        del self._pattern_ids[(text, whole)]
+        del self._users[pattern_id]
+        self._own[node].remove(pattern_id)
+        self._live -= len(text)
+        self._stale += len(text)
+
+    def _link(self):
+        # BFS по бору: ссылка неудачи и объединённые выходы каждой вершины
+        queue = []
+        for ch, child in self._goto[0].items():
+            self._fail[child] = 0
+            queue.append(child)
+        self._out[0] = tuple(self._own[0])
+
+        for node in queue:
+            self._out[node] = tuple(self._own[node]) + self._out[self._fail[node]]
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                queue.append(child)
+
+    def set_keywords(self, keywords: list[str]) -> bool:
+        """Применяет новый список ключей. False — ничего не изменилось."""
+        wanted = {}
+        for keyword in keywords:
+            if keyword not in wanted:
+                patterns = parse_keyword(keyword)
+                if patterns:
+                    wanted[keyword] = patterns
+
+        removed = [k for k in self._requires if k not in wanted]
+        added = [k for k in wanted if k not in self._requires]
+        if not removed and not added:
+            return False
+
+        for keyword in removed:
+            for pattern_id in self._requires.pop(keyword):
+                users = self._users[pattern_id]
+                users.remove(keyword)
+                if not users:
+                    self._drop(pattern_id)
+
+        if self._stale > self._live:
+            # Погашенных вершин больше, чем живых — дешевле собрать бор заново
+            self._reset()
+            added = list(wanted)
+
+        for keyword in added:
+            ids = tuple(dict.fromkeys(self._insert(text, whole) for text, whole in wanted[keyword]))
+            for pattern_id in ids:
+                self._users[pattern_id].append(keyword)
+            self._requires[keyword] = ids
+        self._order = {keyword: i for i, keyword in enumerate(wanted)}
+
+        self._link()
+        return True
+
+    def match(self, text: str) -> list[str]:
+        """Ключи, найденные в тексте, в порядке списка ключей."""
+        s = normalize(text)
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self._patterns
+        last = len(s) - 1
+
+        hits = set()
+        node = 0
+        for i, ch in enumerate(s):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in out[node]:
+                pattern, whole, _ = patterns[pattern_id]
+                start = i - len(pattern) + 1
+                if start and s[start - 1] != " ":
+                    continue
+                if whole and i < last and s[i + 1] != " ":
+                    continue
+                hits.add(pattern_id)
+
+        if not hits:
+            return []
+
+        counts: dict[str, int] = {}
+        for pattern_id in hits:
+            for keyword in self._users[pattern_id]:
+                counts[keyword] = counts.get(keyword, 0) + 1
+        matched = [k for k, c in counts.items() if c == len(self._requires[k])]
+        matched.sort(key=self._order.__getitem__)
+        return matched
+
+
+class NaiveMatcher:
+    """Та же семантика перебором ключей — эталон для проверки и бенчмарков."""
+
+    def __init__(self, keywords: list[str] | None = None):
+        self.set_keywords(keywords or [])
+
+    def set_keywords(self, keywords: list[str]) -> bool:
+        self._keywords = []
+        for keyword in dict.fromkeys(keywords):
+            patterns = parse_keyword(keyword)
+            if patterns:
+                needles = [" " + text + (" " if whole else "") for text, whole in patterns]
+                self._keywords.append((keyword, needles))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def match(self, text: str) -> list[str]:
+        s = f" {normalize(text)} "
+        return [keyword for keyword, needles in self._keywords if all(n in s for n in needles)]
+
+
+# Общий автомат для всех лент: ключи одни на все сайты
+keyword_matcher = KeywordMatcher()
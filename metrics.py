@@ -0,0 +1,179 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger("main.metrics")
+
+METRICS_HOST = "127.0.0.1"
+# Секунды: от быстрых HTTP-ответов до долгих браузерных сессий Aukro
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._values: dict[tuple, object] = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            # [счётчики по корзинам (+Inf последняя), сумма, количество]
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Метрики процесса и колбэки, которые обновляют датчики перед каждым опросом."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors = []
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка сбора метрик: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- поиск ---
+FETCH_SECONDS = Histogram("parser_fetch_seconds", "Время одного поиска по ключу", ("site",))
+FETCH_ERRORS = Counter("parser_fetch_errors_total", "Поиски, завершившиеся ошибкой", ("site",))
+KEYWORDS_PROCESSED = Counter("keywords_processed_total", "Обработанные ключи", ("site",))
+NEW_LINKS = Counter("new_links_total", "Новые ссылки, поставленные в отправку", ("site",))
+CYCLE_SECONDS = Histogram("keyword_cycle_seconds", "Полный цикл ключа: поиск, отбор новых, постановка в отправку", ("site",))
+FEED_POLL_SECONDS = Histogram("feed_poll_seconds", "Один обход ленты категории", ("site",))
+LIMITER_WAIT_SECONDS = Histogram(
+    "limiter_wait_seconds", "Ожидание слота лимитера параллельности", ("site",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60),
+)
+LIMITER_LIMIT = Gauge("limiter_limit", "Текущий лимит параллельности сайта", ("site",))
+LIMITER_IN_FLIGHT = Gauge("limiter_in_flight", "Запросы к сайту в работе", ("site",))
+
+# --- браузеры ---
+BROWSER_LAUNCH_SECONDS = Histogram("browser_launch_seconds", "Запуск Chromium", ("proxy",))
+BROWSER_ACQUIRE_SECONDS = Histogram(
+    "browser_acquire_seconds", "Ожидание страницы из пула браузеров", ("site",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+
+# --- дедупликация и отправка ---
+SEEN_STORE_SIZE = Gauge("seen_store_size", "Объявлений в хранилище просмотренных", ("site",))
+TELEGRAM_SEND_SECONDS = Histogram("telegram_send_seconds", "Отправка одного сообщения в Telegram, с ожиданием лимитов")
+TELEGRAM_MESSAGES = Counter("telegram_messages_total", "Сообщения в Telegram по итогу", ("result",))
+TELEGRAM_RETRY_AFTER = Counter("telegram_retry_after_total", "Ответы 429 (retry_after) от Telegram")
+DELIVERY_QUEUE_DEPTH = Gauge("delivery_queue_depth", "Заданий в очереди отправки")
+
+
+async def start_metrics_server(port: int, host: str = METRICS_HOST, registry: Registry = REGISTRY) -> web.AppRunner:
+    """Отдаёт метрики в текстовом формате Prometheus на http://host:port/metrics."""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
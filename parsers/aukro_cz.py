@@ -1,23 +1,18 @@
-from playwright.async_api import async_playwright, Page
-import asyncio
+from playwright.async_api import Page
 import logging
 import os
-import urllib.parse
 
-from utils import get_random_user_agent, load_seen_links, save_seen_links, get_rotated_proxy
-
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-SEEN_FILE = "parsers/aukro_cz_seen.json"
+from browser_pool import proxy_key
+from proxy_pool import proxy_pool
+from site_spec import SiteSpec
+from tracing import traced
+from utils import get_random_user_agent
+import site_spec
 
 logger = logging.getLogger("aukro")
-logger.setLevel(logging.INFO)
 
-if not logger.hasHandlers():
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "aukro.log"), encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(fh)
-    logger.addHandler(logging.StreamHandler())
+# Переопределяется переменной окружения, например для локального сервера бенчмарков
+BASE_URL = os.getenv("AUKRO_BASE_URL", "https://aukro.cz")
 
 CARD_SELECTORS = [
     "a.item-card-main-container",
@@ -26,128 +21,76 @@ CARD_SELECTORS = [
 ]
 
 
-async def popup_watcher(page: Page, run_flag: asyncio.Event):
-    selector = "a:has(i.material-icons.cursor-pointer.vertical-bottom)"
-    logger.info("👁 Попап-страж запущен")
-
-    while not run_flag.is_set():
-        try:
-            popup = await page.query_selector(selector)
-            if popup:
-                await popup.click()
-                logger.info(f"✅ Попап закрыт: {selector}")
-                await asyncio.sleep(1.0)
-        except Exception as e:
-            logger.warning(f"⚠️ Ошибка при закрытии попапа: {e}")
-        await asyncio.sleep(1.5)
-
-    logger.info("👁 Попап-страж завершён")
-
-
-async def auto_scroll(page: Page):
-    last_count = 0
-    attempts = 0
-    max_scrolls = 30
-
-    for i in range(max_scrolls):
-        logger.info(f"🔀 Скролл {i + 1}/{max_scrolls}")
-        await page.mouse.wheel(0, 1200)
-        await asyncio.sleep(2.5)
-
-        found = []
-        for sel in CARD_SELECTORS:
-            items = await page.query_selector_all(sel)
-            if items:
-                logger.info(f"✅ Селектор сработал: {sel} — найдено {len(items)} карточек")
-                found = items
-                break
-            else:
-                logger.debug(f"❌ Селектор {sel} не дал результатов")
-
-        count = len(found)
-        if count > last_count:
-            last_count = count
-            attempts = 0
-        else:
-            attempts += 1
-
-        if attempts >= 3:
-            logger.info("🚩 3 скролла подряд без новых карточек.")
-            break
-
-    await asyncio.sleep(2.0)
-    return found
-
-
-async def search_aukro(keyword: str):
-    encoded_keyword = urllib.parse.quote(keyword)
-    url = f"https://aukro.cz/vysledky-vyhledavani?text={encoded_keyword}&categoryId=8466"
-    logger.info(f"🔎 Открываем Aukro: {url}")
-    found_links = []
-
-    seen_links_raw = load_seen_links(SEEN_FILE)
-    seen_links = set(link.strip().lower() for link in seen_links_raw)
-
-    async with async_playwright() as p:
-        user_agent = get_random_user_agent()
-        proxy = get_rotated_proxy(keyword)
-        logger.info(f"🌐 Прокси: {proxy['server']}")
-
-        launch_args = {"headless": True}
-        if proxy:
-            launch_args["proxy"] = {
-                "server": proxy["server"],
-                "username": proxy.get("username"),
-                "password": proxy.get("password"),
-            }
-
-        browser = await p.chromium.launch(**launch_args)
-        context = await browser.new_context(user_agent=user_agent)
-        page = await context.new_page()
-
+# Карточек на «страницу»: догоняющий обход докручивает ленту ещё на столько же, пока не встретит виденное
+TARGET_CARDS = 15
+# Лента категории (режим ленты): новые сверху, карточек на страницу
+FEED_URL = f"{BASE_URL}/vysledky-vyhledavani?categoryId=8466&sort=startingTime_DESC"
+FEED_CARDS = 60
+
+POPUP_SELECTOR = "a:has(i.material-icons.cursor-pointer.vertical-bottom)"
+
+# MutationObserver в странице сам закрывает попап, как только он появляется
+_POPUP_OBSERVER_JS = """(selector) => {
+    if (window.__popupObserver) return;
+    window.__popupsClosed = 0;
+    const close = () => {
+        const link = document.querySelector(selector);
+        if (link) { link.click(); window.__popupsClosed++; }
+    };
+    window.__popupObserver = new MutationObserver(close);
+    window.__popupObserver.observe(document.documentElement, {childList: true, subtree: true});
+    close();
+}"""
+
+
+async def install_popup_handler(page: Page):
+    await page.evaluate(_POPUP_OBSERVER_JS, POPUP_SELECTOR)
+    logger.debug("👁 Попап-страж установлен")
+
+
+# Новые сверху — иначе догоняющий обход не может остановиться на первом виденном
+SPEC = SiteSpec(
+    "aukro",
+    BASE_URL,
+    "{base}/vysledky-vyhledavani?text={keyword}&categoryId=8466&sort=startingTime_DESC",
+    card_selectors=CARD_SELECTORS,
+    fields={
+        "link": (None, "href"),
+        "title": [("h2, h3, [class*='title']", "text"), (None, "title"), (None, "text")],
+        "price": ("[class*='price']", "text"),
+    },
+    setup=install_popup_handler,
+    pagination="scroll",
+    page_size=TARGET_CARDS,
+)
+
+
+@traced()
+async def search_aukro(keyword: str, is_seen=None):
+    """Новые объявления по ключу. is_seen(links) -> [bool] включает догоняющую докрутку ленты."""
+    logger.info(f"🔎 Открываем Aukro: {SPEC.url(keyword)}")
+
+    user_agent = get_random_user_agent()
+    async with proxy_pool.lease("aukro") as lease:
+        logger.debug(f"🌐 Прокси: {proxy_key(lease.proxy)}")
         try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=50000)
-            await asyncio.sleep(3.0)
-
-            stop_flag = asyncio.Event()
-            watcher_task = asyncio.create_task(popup_watcher(page, stop_flag))
-
-            # ⬇️ Выполняем полноценный скроллинг с попытками
-            elements = await auto_scroll(page)
-
-            stop_flag.set()
-            await watcher_task
-
-            if not elements:
-                logger.warning("📭 Карточки не найдены после скроллинга.")
-                return []
-
-            top_links = []
-            for el in elements:
-                if len(top_links) >= 15:
-                    break
-
-                href = await el.get_attribute("href")
-                if href and href.startswith("/"):
-                    full_url = f"https://aukro.cz{href.strip()}"
-                    normalized = full_url.strip().lower()
-                    top_links.append(normalized)
-
-            new_links = [link for link in top_links if link not in seen_links]
-
-            if new_links:
-                found_links = new_links
-                seen_links.update(top_links)
-                save_seen_links(SEEN_FILE, seen_links)
-                logger.info(f"✅ Найдено новых ссылок: {len(new_links)}")
-            else:
-                logger.info("📭 Все 15 ссылок уже просмотрены. Новых нет.")
-
+            cards = await site_spec.search(SPEC, keyword, lease.proxy, user_agent, is_seen)
         except Exception as e:
             logger.error(f"❌ Ошибка при обработке Aukro: {e}")
-        finally:
-            await browser.close()
+            # Пусть ошибку увидят лимитер сайта и main
+            raise
 
+    # Отбор новых делает общий сервис дедупликации в main
+    found_links = [card["link"] for card in cards]
+    logger.info(f"✅ Собрано ссылок: {len(found_links)}")
     if found_links:
-        logger.info(f"🧠 Последние новые: {found_links[-3:]}")
+        logger.debug(f"🧠 Последние: {found_links[-3:]}")
     return found_links
+
+
+async def fetch_aukro_feed(page_no: int = 1) -> list[tuple[str, str]]:
+    """Страница новейших объявлений категории: (ссылка, заголовок), новые сверху."""
+    url = FEED_URL if page_no == 1 else f"{FEED_URL}&page={page_no}"
+    async with proxy_pool.lease("aukro") as lease:
+        cards = await site_spec.collect(SPEC, url, lease.proxy, get_random_user_agent(), FEED_CARDS)
+    return [(card["link"], card["title"] or "") for card in cards]
@@ -1,66 +1,159 @@
-from playwright.async_api import async_playwright
-from utils import get_random_user_agent, get_rotated_proxy
+from lxml import html as lxml_html
+
+from browser_pool import proxy_key
+from catchup import CatchUp
+from http_client import fetch_text
+from proxy_pool import proxy_pool, BAN_STATUSES, ProxyBanned, ProxyLease
+from site_spec import SiteSpec
+import site_spec
+from tracing import span, traced
+from utils import get_random_user_agent
 import urllib.parse
 import logging
 import os
 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+# Переопределяется переменной окружения, например для локального сервера бенчмарков
+BASE_URL = os.getenv("BAZOS_BASE_URL", "https://knihy.bazos.cz")
+# Bazos листает категорию и поиск по 20 объявлений: /, /20/, /40/, ...
+FEED_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 20
 
 logger = logging.getLogger("bazos")
-logger.setLevel(logging.INFO)
-
-if not logger.hasHandlers():
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "bazos.log"), encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(fh)
-    logger.addHandler(logging.StreamHandler())
-
-
-async def search_bazos(keyword: str):
-    found_links = set()  # ⚠️ используем set для устранения дублей
-
-    async with async_playwright() as p:
-        user_agent = get_random_user_agent()
-        proxy = get_rotated_proxy(keyword)
-        logger.info(f"🌐 Прокси: {proxy['server']}")
-
-        launch_args = {"headless": True}
-        if proxy:
-            launch_args["proxy"] = {
-                "server": proxy["server"],
-                "username": proxy.get("username"),
-                "password": proxy.get("password"),
-            }
-
-        browser = await p.chromium.launch(**launch_args)
-        context = await browser.new_context(user_agent=user_agent)
-        page = await context.new_page()
-
-        try:
-            encoded_keyword = urllib.parse.quote(keyword)
-            search_url = f"https://knihy.bazos.cz/inzeraty/{encoded_keyword}/"
-            logger.info(f"🔍 Открываем Bazos: {search_url}")
-            await page.goto(search_url, timeout=50000)
-
-            items = await page.query_selector_all("div.inzeratynadpis")
-            if not items:
-                logger.warning(f"⚠️ Не найдено элементов div.inzeratynadpis по ключу '{keyword}'")
-
-            for item in items[:15]:
-                link_handle = await item.query_selector("a")
-                if link_handle:
-                    href = await link_handle.get_attribute("href")
-                    if href:
-                        url = "https://knihy.bazos.cz" + href.strip()
-                        found_links.add(url.lower())
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка при обработке Bazos: {e}")
-
-        finally:
-            await browser.close()
-
-    links = list(found_links)
+
+
+def _search_url(keyword: str, offset: int = 0) -> str:
+    encoded_keyword = urllib.parse.quote(keyword)
+    if offset:
+        return f"{BASE_URL}/inzeraty/{encoded_keyword}/{offset}/"
+    return f"{BASE_URL}/inzeraty/{encoded_keyword}/"
+
+
+# Браузерный запасной путь: карточка — div.inzeraty, все поля одним вызовом в странице
+SPEC = SiteSpec(
+    "bazos",
+    BASE_URL,
+    lambda keyword, page_no: _search_url(keyword, (page_no - 1) * SEARCH_PAGE_SIZE),
+    card_selectors=["div.inzeraty", "div.inzeratynadpis"],
+    fields={
+        "link": ("div.inzeratynadpis a, a", "href"),
+        "title": [("h2", "text"), ("a", "text")],
+        "price": (".inzeratycena", "text"),
+    },
+    pagination="pages",
+    page_size=SEARCH_PAGE_SIZE,
+)
+
+
+def _full_url(href: str) -> str:
+    return urllib.parse.urljoin(BASE_URL, href.strip()).lower()
+
+
+def parse_bazos_listing(page_html: str) -> list[tuple[str, str]] | None:
+    """Пары (ссылка, заголовок) со страницы Bazos. None — страница не похожа на выдачу (бан, капча, заглушка)."""
+    try:
+        doc = lxml_html.fromstring(page_html)
+    except Exception:
+        return None
+
+    items = []
+    for block in doc.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " inzeratynadpis ")]'):
+        hrefs = block.xpath('.//a/@href')
+        if hrefs and hrefs[0].strip():
+            title = " ".join(block.xpath('.//h2//text()')).strip() or block.text_content().strip()
+            items.append((_full_url(hrefs[0]), title))
+
+    # Пустая выдача без поисковой формы Bazos — скорее блок, чем «ничего не найдено»
+    if not items and not doc.xpath('//form[contains(@action, "inzeraty")] | //input[@name="hledat"]'):
+        return None
+    return items
+
+
+def parse_bazos_html(page_html: str) -> list[str] | None:
+    """Ссылки из выдачи Bazos. None — страница не похожа на выдачу."""
+    items = parse_bazos_listing(page_html)
+    if items is None:
+        return None
+    return [link for link, _ in items]
+
+
+async def _fetch_search_page(keyword: str, offset: int, lease: ProxyLease, user_agent: str) -> list[str] | None:
+    try:
+        with span("http_fetch", offset=offset):
+            status, text = await fetch_text(_search_url(keyword, offset), lease.proxy, user_agent)
+    except Exception as e:
+        logger.warning(f"⚠️ HTTP-запрос к Bazos не удался ({keyword}): {e}")
+        return None
+
+    if status in BAN_STATUSES:
+        lease.ban(f"HTTP {status}")
+    if status != 200:
+        logger.warning(f"⚠️ Bazos ответил {status} по ключу '{keyword}', переходим на браузер")
+        return None
+
+    with span("parse"):
+        links = parse_bazos_html(text)
+    if links is None:
+        logger.warning(f"⚠️ Ответ Bazos по ключу '{keyword}' похож на блокировку, переходим на браузер")
+    return links
+
+
+async def _search_bazos_http(keyword: str, lease: ProxyLease, user_agent: str, is_seen=None) -> list[str] | None:
+    catchup = CatchUp("bazos", is_seen)
+    offset = 0
+    while True:
+        links = await _fetch_search_page(keyword, offset, lease, user_agent)
+        if links is None:
+            # Первая страница не пришла — браузер; на следующих отдаём то, что успели собрать
+            return catchup.finish() if offset else None
+        if not catchup.add_page(links, last=len(links) < SEARCH_PAGE_SIZE):
+            return catchup.finish()
+        offset += SEARCH_PAGE_SIZE
+
+
+async def _search_bazos_browser(keyword: str, proxy: dict | None, user_agent: str, is_seen=None) -> list[str]:
+    try:
+        cards = await site_spec.search(SPEC, keyword, proxy, user_agent, is_seen)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при обработке Bazos: {e}")
+        # Пусть ошибку увидят лимитер сайта и main
+        raise
+    return [card["link"] for card in cards]
+
+
+@traced()
+async def search_bazos(keyword: str, is_seen=None):
+    """Новые объявления по ключу. is_seen(links) -> [bool] включает догоняющий обход следующих страниц."""
+    user_agent = get_random_user_agent()
+
+    async with proxy_pool.lease("bazos") as lease:
+        logger.debug(f"🌐 Прокси: {proxy_key(lease.proxy)}")
+        links = await _search_bazos_http(keyword, lease, user_agent, is_seen)
+
+    if links is None:
+        # После бана по HTTP браузер идёт через другой прокси: этот IP сайт уже отсёк
+        exclude = {proxy_key(lease.proxy)} if lease.ban_reason else None
+        async with proxy_pool.lease("bazos", exclude) as lease:
+            logger.debug(f"🌐 Прокси браузера: {proxy_key(lease.proxy)}")
+            links = await _search_bazos_browser(keyword, lease.proxy, user_agent, is_seen)
+
+    links = list(dict.fromkeys(links))
     logger.info(f"✅ [Bazos] По ключу '{keyword}' найдено {len(links)} уникальных ссылок")
     return links
+
+
+async def fetch_bazos_feed(page_no: int = 1) -> list[tuple[str, str]]:
+    """Страница новейших объявлений категории: (ссылка, заголовок), новые сверху."""
+    offset = (page_no - 1) * FEED_PAGE_SIZE
+    url = f"{BASE_URL}/{offset}/" if offset else f"{BASE_URL}/"
+
+    async with proxy_pool.lease("bazos") as lease:
+        status, text = await fetch_text(url, lease.proxy, get_random_user_agent())
+        if status in BAN_STATUSES:
+            raise ProxyBanned(f"HTTP {status}")
+        if status != 200:
+            raise RuntimeError(f"Лента Bazos ответила {status}")
+
+        items = parse_bazos_listing(text)
+        if items is None:
+            raise ProxyBanned("страница ленты похожа на блокировку")
+    return items
@@ -1,99 +1,279 @@
-from playwright.async_api import async_playwright
 import urllib.parse
-import asyncio
+import json
 import os
+import re
 import logging
 
-from utils import get_random_user_agent, load_seen_links, save_seen_links, get_rotated_proxy
+from browser_pool import proxy_key
+from catchup import CatchUp
+from http_client import fetch_text
+from proxy_pool import proxy_pool, BAN_STATUSES, ProxyBanned, ProxyLease
+from site_spec import SiteSpec
+import site_spec
+from tracing import span, traced
+from utils import get_random_user_agent
 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-SEEN_FILE = "parsers/sbazar_cz_seen.json"
+# Состояние браузера после «Souhlasím» — куки согласия переиспользуются всеми запросами
+CONSENT_STATE_FILE = "parsers/sbazar_cz_state.json"
+
+# Переопределяется переменной окружения, например для локального сервера бенчмарков
+BASE_URL = os.getenv("SBAZAR_BASE_URL", "https://www.sbazar.cz")
+CATEGORY_ID = 31
+CATEGORY_SLUG = "31-knihy-literatura"
+MAX_ITEMS = 15
+# Объявлений на страницу API поиска (догоняющий обход листает по offset)
+SEARCH_PAGE_SIZE = 30
+# Объявлений на страницу ленты категории (режим ленты)
+FEED_PAGE_SIZE = 60
+LINK_SELECTOR = 'a[href*="/inzerat/"], a[href*="/rozbalena-nabidka/"]'
 
 logger = logging.getLogger("sbazar")
-logger.setLevel(logging.INFO)
-logger.propagate = False
 
-if not logger.hasHandlers():
-    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "sbazar.log"), encoding="utf-8")
-    fh.setFormatter(formatter)
-    sh = logging.StreamHandler()
-    sh.setFormatter(formatter)
-    logger.addHandler(fh)
-    logger.addHandler(sh)
+_STATE_RE = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>'
+    r'|window\.__(?:INITIAL|PRELOADED)_STATE__\s*=\s*(\{.*?\})\s*;?\s*</script>',
+    re.S,
+)
+_LINK_RE = re.compile(r'href="((?:https://www\.sbazar\.cz)?/(?:inzerat|rozbalena-nabidka)/[^"?#]+)')
 
 
-async def search_sbazar(keyword: str):
+def _search_url(keyword: str) -> str:
     encoded_keyword = urllib.parse.quote(keyword)
-    base_url = f"https://www.sbazar.cz/hledej/{encoded_keyword}/31-knihy-literatura"
-    logger.info(f"🔍 Открываем Sbazar: {base_url}")
-
-    found_links = []
-    seen_links_raw = load_seen_links(SEEN_FILE)
-    seen_links = set(link.strip().lower() for link in seen_links_raw)
-
-    async with async_playwright() as p:
-        user_agent = get_random_user_agent()
-        proxy = get_rotated_proxy(keyword)
-        logger.info(f"🌐 Прокси: {proxy['server']}")
-
-        launch_args = {"headless": True}
-        if proxy:
-            launch_args["proxy"] = {
-                "server": proxy["server"],
-                "username": proxy["username"],
-                "password": proxy["password"]
-            }
-
-        browser = await p.chromium.launch(**launch_args)
-        context = await browser.new_context(user_agent=user_agent)
-        page = await context.new_page()
+    return f"{BASE_URL}/hledej/{encoded_keyword}/{CATEGORY_SLUG}"
+
+
+# Браузерный запасной путь: согласие «Souhlasím» сохраняется и переиспользуется, выдача — одна страница
+SPEC = SiteSpec(
+    "sbazar",
+    BASE_URL,
+    lambda keyword, page_no: _search_url(keyword),
+    card_selectors=[LINK_SELECTOR],
+    fields={
+        "link": (None, "href"),
+        "title": [("h2, h3, [class*='title']", "text"), (None, "title")],
+        "price": ("[class*='price']", "text"),
+    },
+    consent="button:has-text('Souhlasím')",
+    consent_state=CONSENT_STATE_FILE,
+)
+
+
+def _full_url(href: str) -> str:
+    href = href.strip()
+    full_url = f"{BASE_URL}{href}" if href.startswith("/") else href
+    return full_url.lower()
+
+
+# Куки согласия в памяти: файл перечитывается, только когда браузер сохранил его заново (сменился mtime)
+_consent_cookies: dict[str, str] = {}
+_consent_mtime: int | None = None
+
+
+def _load_consent_cookies() -> dict[str, str]:
+    global _consent_cookies, _consent_mtime
+    try:
+        mtime = os.stat(CONSENT_STATE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime == _consent_mtime:
+        return _consent_cookies
+
+    _consent_mtime, _consent_cookies = mtime, {}
+    if mtime is None:
+        return _consent_cookies
+    try:
+        with open(CONSENT_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        # Предупреждение — один раз на версию файла, а не на каждый запрос
+        logger.warning(f"⚠️ Не удалось прочитать {CONSENT_STATE_FILE}: {e}")
+        return _consent_cookies
+    _consent_cookies = {
+        c["name"]: c["value"]
+        for c in state.get("cookies", [])
+        if "sbazar.cz" in c.get("domain", "") or "seznam.cz" in c.get("domain", "")
+    }
+    return _consent_cookies
+
+
+def _consent_headers() -> dict[str, str]:
+    cookies = _load_consent_cookies()
+    return {"Cookie": "; ".join(f"{k}={v}" for k, v in cookies.items())} if cookies else {}
+
+
+def _item_url(item: dict) -> str | None:
+    # У категорий тоже есть id и seo_name, но нет цены
+    item_id, seo_name = item.get("id"), item.get("seo_name")
+    if not item_id or not seo_name or "price" not in item:
+        return None
+    return f"{BASE_URL}/inzerat/{item_id}-{seo_name}".lower()
+
+
+def _collect_items(node, out: list[dict]):
+    # Ищем в JSON любые объекты вида {"id": ..., "seo_name": ...}
+    if isinstance(node, dict):
+        if _item_url(node):
+            out.append(node)
+        else:
+            for value in node.values():
+                _collect_items(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_items(value, out)
+
+
+def parse_sbazar_api(data: dict) -> list[str]:
+    items = []
+    _collect_items(data.get("results", data), items)
+    return list(dict.fromkeys(_item_url(item) for item in items))
+
+
+def parse_sbazar_feed(data: dict) -> list[tuple[str, str]]:
+    """Пары (ссылка, заголовок) из ответа API в порядке выдачи."""
+    items = []
+    _collect_items(data.get("results", data), items)
+    feed = {}
+    for item in items:
+        feed.setdefault(_item_url(item), item.get("name") or "")
+    return list(feed.items())
 
+
+def parse_sbazar_html(page_html: str) -> list[str] | None:
+    """Ссылки из встроенного состояния страницы или разметки. None — не похоже на выдачу."""
+    links = []
+    match = _STATE_RE.search(page_html)
+    if match:
         try:
-            await page.goto(base_url, timeout=50000)
-            await page.wait_for_load_state("networkidle")
-            await asyncio.sleep(2.0)
-
-            try:
-                await page.click("button:has-text('Souhlasím')", timeout=5000)
-                logger.info("✅ Cookie popup закрыт")
-                await asyncio.sleep(1.0)
-            except:
-                logger.info("ℹ️ Cookie popup не найден")
-
-            await page.wait_for_selector('a[href*="/inzerat/"], a[href*="/rozbalena-nabidka/"]', timeout=15000)
-
-            # Получаем первые 15 карточек
-            elements = await page.query_selector_all('a[href*="/inzerat/"], a[href*="/rozbalena-nabidka/"]')
-            collected = []
-
-            for el in elements:
-                if len(collected) >= 15:
-                    break
-
-                href = await el.get_attribute("href")
-                if href:
-                    full_url = f"https://www.sbazar.cz{href.strip()}" if href.startswith("/") else href.strip()
-                    normalized = full_url.lower()
-                    collected.append(normalized)
-
-            # Проверяем, есть ли среди них новые
-            new_links = [link for link in collected if link not in seen_links]
-
-            if new_links:
-                found_links = new_links
-                seen_links.update(new_links)
-                save_seen_links(SEEN_FILE, seen_links)
-                logger.info(f"✅ Найдено новых ссылок: {len(new_links)}")
-            else:
-                logger.info("📭 Все 15 ссылок уже просмотрены. Новых нет.")
+            items = []
+            _collect_items(json.loads(match.group(1) or match.group(2)), items)
+            links = [_item_url(item) for item in items]
+        except ValueError:
+            links = []
+
+    if not links:
+        links = [_full_url(href) for href in _LINK_RE.findall(page_html)]
+
+    # Без ссылок и с баннером согласия или чужой страницей — отдаём браузеру
+    lowered = page_html.lower()
+    if not links and ("sbazar" not in lowered or "souhlasím" in lowered or "cmp.seznam.cz" in lowered):
+        return None
+    return list(dict.fromkeys(links))[:MAX_ITEMS]
 
+
+async def _search_sbazar_api(keyword: str, lease: ProxyLease, user_agent: str, headers: dict, is_seen) -> list[str] | None:
+    catchup = CatchUp("sbazar", is_seen)
+    offset = 0
+    while True:
+        params = urllib.parse.urlencode({
+            "phrase": keyword,
+            "category_id": CATEGORY_ID,
+            "offset": offset,
+            "limit": SEARCH_PAGE_SIZE,
+            "sort": "-create_date",
+        })
+        try:
+            with span("http_fetch", source="api", offset=offset):
+                status, text = await fetch_text(
+                    f"{BASE_URL}/api/v1/items/search?{params}", lease.proxy, user_agent,
+                    headers={**headers, "Accept": "application/json"},
+                )
+            if status in BAN_STATUSES:
+                # С этого прокси HTML тоже не отдадут — вызывающий уйдёт на браузер через другой
+                lease.ban(f"API HTTP {status}")
+                logger.warning(f"⚠️ JSON API Sbazar ответил {status} по ключу '{keyword}'")
+                return catchup.finish() if offset else None
+            if status != 200:
+                logger.info(f"ℹ️ JSON API Sbazar ответил {status}, пробуем HTML")
+                return catchup.finish() if offset else None
+            with span("parse"):
+                links = parse_sbazar_api(json.loads(text))
         except Exception as e:
-            logger.error(f"❌ Ошибка при поиске Sbazar по ключу '{keyword}': {e}")
-        finally:
-            await browser.close()
+            logger.info(f"ℹ️ JSON API Sbazar недоступен ({e}), пробуем HTML")
+            return catchup.finish() if offset else None
+
+        last = len(links) < SEARCH_PAGE_SIZE
+        if not is_seen:
+            # Без догоняющего обхода — одна страница и столько же ссылок, сколько отдают HTML и браузер
+            links = links[:MAX_ITEMS]
+        if not catchup.add_page(links, last=last):
+            return catchup.finish()
+        offset += SEARCH_PAGE_SIZE
+
+
+async def _search_sbazar_http(keyword: str, lease: ProxyLease, user_agent: str, is_seen=None) -> list[str] | None:
+    proxy = lease.proxy
+    headers = _consent_headers()
+
+    links = await _search_sbazar_api(keyword, lease, user_agent, headers, is_seen)
+    if links is not None or lease.ban_reason:
+        return links
+
+    try:
+        with span("http_fetch", source="html"):
+            status, text = await fetch_text(_search_url(keyword), proxy, user_agent, headers=headers)
+    except Exception as e:
+        logger.warning(f"⚠️ HTTP-запрос к Sbazar не удался ({keyword}): {e}")
+        return None
+    if status in BAN_STATUSES:
+        lease.ban(f"HTTP {status}")
+    if status != 200:
+        logger.warning(f"⚠️ Sbazar ответил {status} по ключу '{keyword}', переходим на браузер")
+        return None
+    with span("parse"):
+        return parse_sbazar_html(text)
 
+
+async def _search_sbazar_browser(keyword: str, proxy: dict | None, user_agent: str, is_seen=None) -> list[str]:
+    try:
+        cards = await site_spec.search(SPEC, keyword, proxy, user_agent, is_seen)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при поиске Sbazar по ключу '{keyword}': {e}")
+        # Пусть ошибку увидят лимитер сайта и main
+        raise
+    return [card["link"] for card in cards][:MAX_ITEMS]
+
+
+@traced()
+async def search_sbazar(keyword: str, is_seen=None):
+    """Новые объявления по ключу. is_seen(links) -> [bool] включает догоняющий обход следующих страниц API."""
+    logger.info(f"🔍 Открываем Sbazar: {_search_url(keyword)}")
+
+    user_agent = get_random_user_agent()
+
+    async with proxy_pool.lease("sbazar") as lease:
+        logger.debug(f"🌐 Прокси: {proxy_key(lease.proxy)}")
+        found_links = await _search_sbazar_http(keyword, lease, user_agent, is_seen)
+
+    if found_links is None:
+        # После бана по HTTP браузер идёт через другой прокси: этот IP сайт уже отсёк
+        exclude = {proxy_key(lease.proxy)} if lease.ban_reason else None
+        async with proxy_pool.lease("sbazar", exclude) as lease:
+            logger.debug(f"🌐 Прокси браузера: {proxy_key(lease.proxy)}")
+            found_links = await _search_sbazar_browser(keyword, lease.proxy, user_agent, is_seen)
+
+    # Отбор новых делает общий сервис дедупликации в main
+    logger.info(f"✅ Собрано ссылок: {len(found_links)}")
     if found_links:
-        logger.info(f"🧠 Последние сохранённые: {found_links[-3:]}")
+        logger.debug(f"🧠 Последние: {found_links[-3:]}")
     return found_links
+
+
+async def fetch_sbazar_feed(page_no: int = 1) -> list[tuple[str, str]]:
+    """Страница новейших объявлений категории: (ссылка, заголовок), новые сверху."""
+    params = urllib.parse.urlencode({
+        "category_id": CATEGORY_ID,
+        "offset": (page_no - 1) * FEED_PAGE_SIZE,
+        "limit": FEED_PAGE_SIZE,
+        "sort": "-create_date",
+    })
+    async with proxy_pool.lease("sbazar") as lease:
+        status, text = await fetch_text(
+            f"{BASE_URL}/api/v1/items/search?{params}", lease.proxy, get_random_user_agent(),
+            headers={**_consent_headers(), "Accept": "application/json"},
+        )
+        if status in BAN_STATUSES:
+            raise ProxyBanned(f"HTTP {status}")
+        if status != 200:
+            raise RuntimeError(f"Лента Sbazar ответила {status}")
+
+    return parse_sbazar_feed(json.loads(text))
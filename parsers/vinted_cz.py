@@ -1,106 +1,211 @@
-from playwright.async_api import async_playwright
-from utils import get_random_user_agent, load_seen_links, save_seen_links, get_rotated_proxy
+from browser_pool import browser_pool, proxy_key
+from catchup import CatchUp
+from http_client import fetch_text
+from proxy_pool import proxy_pool, ProxyBanned, ProxyLease
+from tracing import span, traced
+from utils import get_random_user_agent
 import urllib.parse
+import json
 import time
 import logging
 import os
 import asyncio
 
-SEEN_FILE = "parsers/vinted_cz_seen.json"
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+# Переопределяется переменной окружения, например для локального сервера бенчмарков
+BASE_URL = os.getenv("VINTED_BASE_URL", "https://www.vinted.cz")
+CATALOG_ID = 2312
+MAX_ITEMS = 15
+# Объявлений на страницу поиска при догоняющем обходе
+SEARCH_PAGE_SIZE = 48
+# Объявлений на страницу ленты каталога (режим ленты)
+FEED_PAGE_SIZE = 96
+# Куки сессии живут дольше, но обновляем их не реже, чем раз в COOKIE_TTL секунд
+COOKIE_TTL = 30 * 60
+SESSION_COOKIE = "access_token_web"
 
 logger = logging.getLogger("vinted")
-logger.setLevel(logging.INFO)
-if not logger.hasHandlers():
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "vinted.log"), encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(fh)
-    logger.addHandler(logging.StreamHandler())
 
 
-async def search_vinted(keyword: str):
+class VintedAuthError(Exception):
+    pass
+
+
+# Сессионные куки по прокси: {"cookies": {...}, "user_agent": str, "expires": float}
+_sessions: dict[str, dict] = {}
+_session_locks: dict[str, asyncio.Lock] = {}
+
+
+@traced("session_refresh")
+async def _refresh_session(proxy: dict | None) -> dict:
+    user_agent = get_random_user_agent()
+    logger.info(f"🍪 Получаем куки Vinted через браузер ({proxy_key(proxy)})")
+
+    async with browser_pool.page("vinted", proxy, user_agent) as page:
+        with span("goto"):
+            await page.goto(f"{BASE_URL}/", wait_until="domcontentloaded", timeout=60000)
+        cookies = await page.context.cookies(BASE_URL)
+        if not any(c["name"] == SESSION_COOKIE for c in cookies):
+            # Токен иногда ставится после первого XHR — даём странице догрузиться
+            await page.wait_for_load_state("networkidle", timeout=15000)
+            cookies = await page.context.cookies(BASE_URL)
+        user_agent = await page.evaluate("navigator.userAgent")
+
+    jar = {c["name"]: c["value"] for c in cookies}
+    if SESSION_COOKIE not in jar:
+        raise VintedAuthError("Vinted не выдал сессионную куку")
+
+    expires = time.time() + COOKIE_TTL
+    for c in cookies:
+        if c["name"] == SESSION_COOKIE and c.get("expires", -1) > 0:
+            expires = min(expires, c["expires"] - 60)
+
+    session = {"cookies": jar, "user_agent": user_agent, "expires": expires}
+    _sessions[proxy_key(proxy)] = session
+    return session
+
+
+async def _get_session(proxy: dict | None, force: bool = False) -> dict:
+    key = proxy_key(proxy)
+    lock = _session_locks.setdefault(key, asyncio.Lock())
+
+    async with lock:
+        session = _sessions.get(key)
+        if session and not force and session["expires"] > time.time():
+            return session
+        return await _refresh_session(proxy)
+
+
+def _parse_price(item: dict) -> str | None:
+    price = item.get("price")
+    if isinstance(price, dict):
+        amount, currency = price.get("amount"), price.get("currency_code")
+    else:
+        amount, currency = price, item.get("currency")
+    if amount is None:
+        return None
+    return f"{amount} {currency}" if currency else str(amount)
+
+
+def _parse_items(data: dict) -> list[dict]:
+    items = []
+    for raw in data.get("items") or []:
+        item_id = raw.get("id")
+        if not item_id:
+            continue
+        url = raw.get("url") or f"{BASE_URL}/items/{item_id}"
+        items.append({
+            "id": int(item_id),
+            "url": url.strip().lower(),
+            "title": raw.get("title") or "",
+            "price": _parse_price(raw),
+        })
+    return items
+
+
+async def _request_catalog(keyword: str, proxy: dict | None, session: dict, per_page: int, page_no: int) -> list[dict]:
+    params = urllib.parse.urlencode({
+        "search_text": keyword,
+        "catalog_ids": CATALOG_ID,
+        "order": "newest_first",
+        "per_page": per_page,
+        "page": page_no,
+    })
+    url = f"{BASE_URL}/api/v2/catalog/items?{params}"
+    headers = {
+        "Accept": "application/json, text/plain, */*",
+        "Cookie": "; ".join(f"{k}={v}" for k, v in session["cookies"].items()),
+        "Referer": f"{BASE_URL}/catalog",
+    }
+
+    with span("http_fetch"):
+        status, text = await fetch_text(url, proxy, session["user_agent"], headers=headers)
+    if status in (401, 403):
+        raise VintedAuthError(f"Vinted API ответил {status}")
+    if status == 429:
+        raise ProxyBanned(f"Vinted API ответил {status}")
+    if status != 200:
+        raise RuntimeError(f"Vinted API ответил {status}")
+
+    with span("parse"):
+        return _parse_items(json.loads(text))
+
+
+async def fetch_vinted_items(keyword: str, proxy: dict | None, per_page: int = MAX_ITEMS, page_no: int = 1) -> list[dict]:
+    """Новейшие объявления по ключу из JSON API каталога: id, url, title, price."""
+    session = await _get_session(proxy)
+    try:
+        return await _request_catalog(keyword, proxy, session, per_page, page_no)
+    except VintedAuthError as e:
+        logger.info(f"🍪 Куки Vinted устарели ({e}), обновляем")
+        session = await _get_session(proxy, force=True)
+        try:
+            return await _request_catalog(keyword, proxy, session, per_page, page_no)
+        except VintedAuthError as e:
+            # Свежие куки не помогли — отказывают прокси, а не сессии
+            raise ProxyBanned(str(e)) from e
+
+
+async def _search_pages(keyword: str, lease: ProxyLease, is_seen) -> list[str]:
+    proxy = lease.proxy
+    # Без is_seen — как раньше, одна короткая страница
+    if not is_seen:
+        items = await fetch_vinted_items(keyword, proxy)
+        logger.debug(f"📦 Найдено объявлений: {len(items)}")
+        return [item["url"] for item in items[:MAX_ITEMS]]
+
+    catchup = CatchUp("vinted", is_seen)
+    page_no = 1
+    while True:
+        try:
+            items = await fetch_vinted_items(keyword, proxy, per_page=SEARCH_PAGE_SIZE, page_no=page_no)
+        except Exception as e:
+            if page_no == 1:
+                raise
+            if isinstance(e, ProxyBanned):
+                lease.ban(str(e))
+            logger.warning(f"⚠️ Страница {page_no} по ключу '{keyword}' не получена, отдаём собранное")
+            return catchup.finish()
+        logger.debug(f"📦 Страница {page_no}: объявлений {len(items)}")
+        if not catchup.add_page([item["url"] for item in items], last=len(items) < SEARCH_PAGE_SIZE):
+            return catchup.finish()
+        page_no += 1
+
+
+@traced()
+async def search_vinted(keyword: str, is_seen=None):
+    """Новые объявления по ключу. is_seen(links) -> [bool] включает догоняющий обход следующих страниц."""
     found_links = []
-    encoded_keyword = urllib.parse.quote(keyword)
-    current_timestamp = int(time.time())
-
-    url = (
-        f"https://www.vinted.cz/catalog?"
-        f"search_text={encoded_keyword}&catalog[]=2312&page=1&time={current_timestamp}"
-    )
-    logger.info(f"🔍 Открываем Vinted: {url}")
-
-    seen_links_raw = load_seen_links(SEEN_FILE)
-    seen_links = set(link.strip().lower() for link in seen_links_raw)
+    logger.info(f"🔍 Vinted API по ключу '{keyword}'")
 
+    # Каждая повторная попытка идёт через другой прокси
+    tried = set()
     for attempt in range(3):
         try:
-            async with async_playwright() as p:
-                user_agent = get_random_user_agent()
-                proxy = get_rotated_proxy(keyword)
-                logger.info(f"🌐 Попытка {attempt+1}/3 | Прокси: {proxy['server']}")
-
-                launch_args = {
-                    "headless": True,
-                    "args": [
-                        "--disable-blink-features=AutomationControlled",
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage"
-                    ]
-                }
-                if proxy:
-                    launch_args["proxy"] = {
-                        "server": proxy["server"],
-                        "username": proxy["username"],
-                        "password": proxy["password"]
-                    }
-
-                browser = await p.chromium.launch(**launch_args)
-                context = await browser.new_context(user_agent=user_agent)
-                page = await context.new_page()
-
-                await page.goto(url, timeout=60000)
-                await page.wait_for_load_state("domcontentloaded")
-                await asyncio.sleep(3.5)
-
-                items = await page.query_selector_all("div.new-item-box__image-container a[href*='/items/']")
-                if not items:
-                    logger.warning("⚠️ Карточки не найдены на странице.")
-                    await browser.close()
-                    continue
-
-                logger.info(f"📦 Найдено карточек: {len(items)}")
-
-                top_15_links = []
-                for item in items:
-                    if len(top_15_links) >= 15:
-                        break
-                    href = await item.get_attribute("href")
-                    if href and "/items/" in href:
-                        full_url = "https://www.vinted.cz" + href.strip() if href.startswith("/") else href.strip()
-                        normalized = full_url.lower()
-                        top_15_links.append(normalized)
-
-                new_links = [link for link in top_15_links if link not in seen_links]
-
-                if new_links:
-                    logger.info(f"🚨 Новых ссылок среди первых 15: {len(new_links)}")
-                    found_links = new_links
-
-                if top_15_links:
-                    seen_links.update(top_15_links)
-                    save_seen_links(SEEN_FILE, seen_links)
-
-                await browser.close()
-                break
+            async with proxy_pool.lease("vinted", exclude=tried) as lease:
+                proxy = lease.proxy
+                tried.add(proxy_key(proxy))
+                logger.debug(f"🌐 Попытка {attempt+1}/3 | Прокси: {proxy_key(proxy)}")
+
+                # Отбор новых делает общий сервис дедупликации в main
+                found_links = await _search_pages(keyword, lease, is_seen)
+
+            break
 
         except Exception as e:
             logger.warning(f"⚠️ Попытка {attempt+1}/3 завершилась ошибкой: {e}")
             if attempt == 2:
                 logger.error("❌ Все попытки неудачны. Пропускаем.")
+                raise
             await asyncio.sleep(3.0)
 
-    logger.info(f"✅ [Vinted] По ключу '{keyword}' новых ссылок: {len(found_links)}")
+    logger.info(f"✅ [Vinted] По ключу '{keyword}' собрано ссылок: {len(found_links)}")
     if found_links:
-        logger.info(f"🧠 Последние новые: {found_links[-3:]}")
+        logger.debug(f"🧠 Последние: {found_links[-3:]}")
     return found_links
+
+
+async def fetch_vinted_feed(page_no: int = 1) -> list[tuple[str, str]]:
+    """Страница новейших объявлений каталога: (ссылка, заголовок), новые сверху."""
+    async with proxy_pool.lease("vinted") as lease:
+        items = await fetch_vinted_items("", lease.proxy, per_page=FEED_PAGE_SIZE, page_no=page_no)
+    return [(item["url"], item["title"]) for item in items]
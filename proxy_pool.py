@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+
+from browser_pool import proxy_key
+from state_cache import state_cache
+
+logger = logging.getLogger("main.proxy_pool")
+
+# "weighted" — случайный выбор с весом по здоровью, "least_loaded" — меньше всего запросов в работе
+STRATEGY = "weighted"
+# Сайты, которым нужна привязка к одному прокси (куки сессии живут на прокси)
+STICKY_SITES = {"vinted"}
+# Ответы, по которым прокси считается забаненным на сайте
+BAN_STATUSES = {403, 429}
+
+# Предохранитель: после стольких ошибок подряд прокси отдыхает на этом сайте
+FAILURE_THRESHOLD = 3
+COOL_DOWN = 60
+MAX_COOL_DOWN = 15 * 60
+BAN_COOL_DOWN = 10 * 60
+
+HEALTH_ALPHA = 0.2
+# Латентность по умолчанию для прокси без истории, секунды
+INITIAL_LATENCY = 2.0
+
+
+class ProxyBanned(Exception):
+    """Сайт явно отказал прокси (403, 429, капча)."""
+
+
+class ProxyHealth:
+    """Здоровье пары (прокси, сайт) и её предохранитель: closed → open → half-open."""
+
+    __slots__ = ("success_rate", "latency", "in_flight", "failures", "open_until", "cool_down",
+                 "trial", "ok", "errors", "bans", "trips")
+
+    def __init__(self):
+        self.success_rate = 1.0
+        self.latency = INITIAL_LATENCY
+        self.in_flight = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.cool_down = COOL_DOWN
+        # В half-open пропускаем ровно один пробный запрос
+        self.trial = False
+        self.ok = 0
+        self.errors = 0
+        self.bans = 0
+        self.trips = 0
+
+    def state(self, now: float) -> str:
+        if self.open_until > now:
+            return "open"
+        return "half-open" if self.open_until else "closed"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        if state == "open":
+            return False
+        return state == "closed" or not self.trial
+
+    def weight(self) -> float:
+        return self.success_rate ** 2 / (self.latency + 0.5) / (1 + self.in_flight)
+
+
+class ProxyLease:
+    def __init__(self, proxy: dict | None):
+        self.proxy = proxy
+        self.ban_reason: str | None = None
+
+    def ban(self, reason: str):
+        """Отметить сигнал бана; предохранитель откроется при возврате прокси."""
+        self.ban_reason = reason
+
+
+class ProxyPool:
+    """Выбор прокси по здоровью на каждом сайте вместо жёсткой привязки ключа к прокси.
+
+    Парсер берёт прокси через lease(site): успех, ошибка или бан и время запроса
+    записываются автоматически при выходе из блока.
+    """
+
+    def __init__(self, proxies: list[dict] | None = None, strategy: str = STRATEGY):
+        self.strategy = strategy
+        self._proxies: list[dict] = []
+        self._health: dict[tuple[str, str], ProxyHealth] = {}
+        self._sticky: dict[str, str] = {}
+        self.set_proxies(proxies or [])
+
+    def set_proxies(self, proxies: list[dict]):
+        self._proxies = list(proxies)
+        keys = {proxy_key(p) for p in self._proxies}
+        self._health = {k: h for k, h in self._health.items() if k[0] in keys}
+        self._sticky = {site: key for site, key in self._sticky.items() if key in keys}
+
+    @property
+    def proxies(self) -> list[dict]:
+        return self._proxies
+
+    def health(self, site: str, proxy: dict | None) -> ProxyHealth:
+        key = (proxy_key(proxy), site)
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = ProxyHealth()
+        return health
+
+    def choose(self, site: str, exclude: set[str] | None = None) -> dict | None:
+        if not self._proxies:
+            return None
+
+        now = time.monotonic()
+        healthy = [p for p in self._proxies if self.health(site, p).available(now)]
+        # Исключения (уже пробованные прокси) соблюдаем, пока есть из чего выбирать
+        candidates = [p for p in healthy if proxy_key(p) not in (exclude or ())] or healthy
+
+        if site in STICKY_SITES:
+            sticky = self._sticky.get(site)
+            for proxy in candidates:
+                if proxy_key(proxy) == sticky:
+                    return proxy
+
+        if not candidates:
+            # Все прокси на отдыхе — берём того, кто выйдет раньше, лучше чем стоять
+            proxy = min(self._proxies, key=lambda p: self.health(site, p).open_until)
+            logger.warning(f"[{site}] ⚠️ Все прокси на паузе, используем {proxy_key(proxy)}")
+        elif self.strategy == "least_loaded":
+            proxy = min(candidates, key=lambda p: (self.health(site, p).in_flight, -self.health(site, p).weight()))
+        else:
+            weights = [self.health(site, p).weight() for p in candidates]
+            proxy = random.choices(candidates, weights=weights)[0]
+
+        if site in STICKY_SITES:
+            self._sticky[site] = proxy_key(proxy)
+        return proxy
+
+    def report(self, site: str, proxy: dict | None, ok: bool, latency: float | None = None,
+               ban_reason: str | None = None):
+        if proxy is None:
+            return
+        health = self.health(site, proxy)
+        now = time.monotonic()
+        half_open = health.state(now) == "half-open"
+        health.trial = False
+        ok = ok and not ban_reason
+        health.success_rate = (1 - HEALTH_ALPHA) * health.success_rate + HEALTH_ALPHA * (1.0 if ok else 0.0)
+
+        if ok:
+            health.ok += 1
+            health.failures = 0
+            if latency is not None:
+                health.latency = (1 - HEALTH_ALPHA) * health.latency + HEALTH_ALPHA * latency
+            if half_open:
+                logger.info(f"[{site}] ✅ Прокси {proxy_key(proxy)} снова в работе")
+            health.open_until = 0.0
+            health.cool_down = COOL_DOWN
+            return
+
+        health.errors += 1
+        health.failures += 1
+        if ban_reason:
+            health.bans += 1
+            self._trip(site, proxy, health, max(BAN_COOL_DOWN, health.cool_down), f"бан: {ban_reason}")
+        elif half_open or health.failures >= FAILURE_THRESHOLD:
+            self._trip(site, proxy, health, health.cool_down, f"ошибок подряд: {health.failures}")
+
+    def _trip(self, site: str, proxy: dict, health: ProxyHealth, cool_down: float, reason: str):
+        health.open_until = time.monotonic() + cool_down
+        health.trips += 1
+        # Следующее срабатывание — с удвоенной паузой, пока прокси не поработает успешно
+        health.cool_down = min(MAX_COOL_DOWN, cool_down * 2)
+        if self._sticky.get(site) == proxy_key(proxy):
+            del self._sticky[site]
+        logger.warning(f"[{site}] 🔌 Прокси {proxy_key(proxy)} на паузе {int(cool_down)} с ({reason})")
+
+    @asynccontextmanager
+    async def lease(self, site: str, exclude: set[str] | None = None):
+        proxy = self.choose(site, exclude)
+        lease = ProxyLease(proxy)
+        health = self.health(site, proxy) if proxy else None
+        if health:
+            if health.state(time.monotonic()) == "half-open":
+                health.trial = True
+            health.in_flight += 1
+
+        started = time.monotonic()
+        ok = False
+        try:
+            yield lease
+            ok = True
+        except ProxyBanned as e:
+            lease.ban(str(e) or "ProxyBanned")
+            raise
+        except asyncio.CancelledError:
+            # Остановка — не вина прокси
+            lease.proxy = None
+            raise
+        finally:
+            if health:
+                health.in_flight -= 1
+                health.trial = False
+            if lease.ban_reason:
+                state_cache.invalidate(site, proxy_key(lease.proxy))
+            self.report(site, lease.proxy, ok, time.monotonic() - started, lease.ban_reason)
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        stats = {}
+        for (key, site), h in self._health.items():
+            stats.setdefault(site, {})[key] = {
+                "state": h.state(now),
+                "success_rate": round(h.success_rate, 2),
+                "latency": round(h.latency, 2),
+                "in_flight": h.in_flight,
+                "ok": h.ok,
+                "errors": h.errors,
+                "bans": h.bans,
+                "trips": h.trips,
+            }
+        return stats
+
+
+proxy_pool = ProxyPool()
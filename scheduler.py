@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from metrics import CYCLE_SECONDS
+
+logger = logging.getLogger("main.scheduler")
+
+# Интервалы опроса одного ключа, секунды: горячие ключи тянутся к MIN, мёртвые — к MAX
+MIN_INTERVAL = 60
+MAX_INTERVAL = 30 * 60
+SITE_INTERVALS = {
+    "aukro": (3 * 60, 45 * 60),
+}
+# Вес последнего результата в скользящей доле «опрос нашёл новое»
+HIT_RATE_ALPHA = 0.3
+INITIAL_HIT_RATE = 0.5
+JITTER = 0.1
+# Ключ пропущен (например, идёт замена keywords.txt) — повтор через столько секунд
+SKIP_RETRY = 5
+# Первый повтор после ошибки; дальше пауза удваивается, но не длиннее обычного интервала ключа
+FAILURE_RETRY = 15
+
+# Результат handler: опрос не проводился и не считается ни попаданием, ни ошибкой
+SKIPPED = object()
+
+
+class KeywordState:
+    __slots__ = ("keyword", "hit_rate", "next_due", "generation", "running", "task", "runs", "hits", "failures")
+
+    def __init__(self, keyword: str, generation: int):
+        self.keyword = keyword
+        self.hit_rate = INITIAL_HIT_RATE
+        self.next_due = time.monotonic()
+        self.generation = generation
+        self.running = False
+        self.task: asyncio.Task | None = None
+        self.runs = 0
+        self.hits = 0
+        # Ошибок подряд — для короткой паузы перед повтором
+        self.failures = 0
+
+
+class SiteScheduler:
+    """Непрерывный опрос ключей одного сайта: очередь по времени next_due и пул воркеров.
+
+    handler(keyword) возвращает число новых ссылок — по нему подстраивается интервал ключа.
+    None или исключение — опрос не удался: hit_rate не трогаем, повтор через короткую паузу.
+    SKIPPED — опрос пропущен: без статистики, повтор через SKIP_RETRY секунд.
+    С journal расписание переживает перезапуск: ключ продолжает со своим hit_rate и
+    временем следующего опроса, а прерванный на середине — опрашивается сразу.
+    """
+
+    def __init__(self, site: str, handler, workers: int, journal=None):
+        self.site = site
+        self.handler = handler
+        self.workers = workers
+        self.journal = journal
+        self.min_interval, self.max_interval = SITE_INTERVALS.get(site, (MIN_INTERVAL, MAX_INTERVAL))
+
+        self._states: dict[str, KeywordState] = {}
+        self._heap: list[tuple[float, int, str, int]] = []
+        self._seq = itertools.count()
+        self._generation = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+        self.stats = {"runs": 0, "hits": 0, "failed": 0, "busy_time": 0.0, "started_at": time.monotonic()}
+
+    def _push(self, state: KeywordState):
+        heapq.heappush(self._heap, (state.next_due, next(self._seq), state.keyword, state.generation))
+        self._wakeup.set()
+
+    def _restore(self, state: KeywordState) -> bool:
+        saved = self.journal.progress(self.site, state.keyword) if self.journal else None
+        if not saved:
+            return False
+        state.hit_rate, state.runs, state.hits = saved["hit_rate"], saved["runs"], saved["hits"]
+        interrupted = saved["started_at"] and (saved["finished_at"] or 0) < saved["started_at"]
+        if saved["next_due"] and not interrupted:
+            left = min(saved["next_due"] - time.time(), self.max_interval)
+            state.next_due = time.monotonic() + max(0.0, left)
+        return True
+
+    def update_keywords(self, added: list[str], removed: list[str]):
+        """Применяет разницу ключей: новые встают в очередь сразу, удалённые снимаются даже посреди поиска.
+
+        Остальные ключи сохраняют hit_rate и время следующего опроса.
+        """
+        cancelled = 0
+        for keyword in removed:
+            # Запись в куче станет «протухшей» и будет пропущена воркером
+            state = self._states.pop(keyword, None)
+            if state and state.task and not state.task.done():
+                state.task.cancel()
+                cancelled += 1
+
+        new = restored = 0
+        for keyword in added:
+            if keyword not in self._states:
+                state = KeywordState(keyword, next(self._generation))
+                restored += self._restore(state)
+                self._states[keyword] = state
+                self._push(state)
+                new += 1
+
+        if new or removed:
+            logger.info(f"[{self.site}] 🔁 Расписание: +{new} / -{len(removed)} (прервано {cancelled}), "
+                        f"из журнала: {restored}, всего: {len(self._states)}")
+
+    def interval_for(self, state: KeywordState) -> float:
+        idle = (1 - state.hit_rate) ** 2
+        interval = self.min_interval + (self.max_interval - self.min_interval) * idle
+        return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    async def _next_keyword(self) -> KeywordState:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, _, keyword, generation = self._heap[0]
+            state = self._states.get(keyword)
+            if state is None or state.generation != generation or state.running:
+                heapq.heappop(self._heap)
+                continue
+
+            delay = due - time.monotonic()
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                state.running = True
+                return state
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, state: KeywordState, hits: int | None) -> float:
+        """Учитывает результат опроса и возвращает паузу до следующего."""
+        if hits is None:
+            # Ошибка — не «пусто»: иначе сбои сайта растягивают интервал ключа
+            self.stats["failed"] += 1
+            state.failures += 1
+            return min(FAILURE_RETRY * 2 ** (state.failures - 1), self.interval_for(state))
+
+        state.failures = 0
+        self.stats["hits"] += 1 if hits else 0
+        state.runs += 1
+        state.hits += 1 if hits else 0
+        state.hit_rate = (1 - HIT_RATE_ALPHA) * state.hit_rate + HIT_RATE_ALPHA * (1.0 if hits else 0.0)
+        return self.interval_for(state)
+
+    async def _worker(self):
+        while True:
+            state = await self._next_keyword()
+            started = time.monotonic()
+            hits = None
+            if self.journal:
+                self.journal.keyword_started(self.site, state.keyword, state.hit_rate, state.runs, state.hits)
+            # Отдельная задача, чтобы удалённый ключ можно было прервать, не трогая воркер
+            state.task = asyncio.create_task(self.handler(state.keyword))
+            try:
+                hits = await state.task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.info(f"[{self.site}] ✂️ Ключ '{state.keyword}' удалён, поиск прерван")
+                hits = SKIPPED
+            except Exception as e:
+                logger.error(f"[{self.site}] ❌ Ошибка ключа '{state.keyword}': {e}")
+            finally:
+                state.running = False
+                state.task = None
+
+            if hits is SKIPPED:
+                # Опроса не было — ни статистики, ни изменения hit_rate
+                interval = SKIP_RETRY
+            else:
+                elapsed = time.monotonic() - started
+                CYCLE_SECONDS.observe(elapsed, site=self.site)
+                self.stats["runs"] += 1
+                self.stats["busy_time"] += elapsed
+                interval = self._record(state, hits)
+
+            # Ключ могли удалить, пока он обрабатывался
+            if self._states.get(state.keyword) is state:
+                state.next_due = time.monotonic() + interval
+                self._push(state)
+                if self.journal:
+                    self.journal.keyword_finished(
+                        self.site, state.keyword, state.hit_rate, state.runs, state.hits, time.time() + interval
+                    )
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"[{self.site}] ▶️ Планировщик запущен: воркеров {self.workers}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_stats(self) -> dict:
+        uptime = max(time.monotonic() - self.stats["started_at"], 1e-9)
+        now = time.monotonic()
+        overdue = sum(1 for s in self._states.values() if not s.running and s.next_due < now)
+        return {
+            "keywords": len(self._states),
+            "runs": self.stats["runs"],
+            "hits": self.stats["hits"],
+            "failed": self.stats["failed"],
+            "runs_per_min": self.stats["runs"] * 60 / uptime,
+            "utilization": self.stats["busy_time"] / (uptime * self.workers),
+            "overdue": overdue,
+        }
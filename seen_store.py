@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import time
+from array import array
+from bisect import bisect_left
+
+from utils import item_key
+
+logger = logging.getLogger("main.seen_store")
+
+SEEN_DB = "parsers/seen.db"
+# Объявления старше этого срока удаляются; None — хранить вечно
+SEEN_TTL_DAYS = None
+# Старые JSON-файлы, которые парсеры вели сами до общего сервиса дедупликации
+LEGACY_SEEN_FILES = {
+    "bazos": "parsers/bazos_cz_seen.json",
+    "sbazar": "parsers/sbazar_cz_seen.json",
+    "aukro": "parsers/aukro_cz_seen.json",
+    "vinted": "parsers/vinted_cz_seen.json",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_ids (
+    site TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (site, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_ids_site_time ON seen_ids (site, seen_at);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    done_at REAL NOT NULL
+);
+"""
+
+
+class IdSet:
+    """Множество 64-битных ID: отсортированный array('Q') + небольшой буфер свежих.
+
+    8 байт на ID вместо ~100 байт на строку ссылки в set; буфер сливается
+    с основным массивом за O(n), когда набирает MERGE_AT элементов.
+    """
+
+    MERGE_AT = 4096
+
+    def __init__(self, ids=()):
+        self._base = array("Q", sorted(set(ids)))
+        self._recent: set[int] = set()
+
+    def __contains__(self, item_id: int) -> bool:
+        if item_id in self._recent:
+            return True
+        i = bisect_left(self._base, item_id)
+        return i < len(self._base) and self._base[i] == item_id
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._recent)
+
+    def add(self, item_id: int):
+        if item_id in self:
+            return
+        self._recent.add(item_id)
+        if len(self._recent) >= self.MERGE_AT:
+            self._merge()
+
+    def _merge(self):
+        self._base = array("Q", heapq.merge(self._base, sorted(self._recent)))
+        self._recent.clear()
+
+    def discard_many(self, ids):
+        drop = set(ids)
+        if not drop:
+            return
+        self._recent.difference_update(drop)
+        self._base = array("Q", (i for i in self._base if i not in drop))
+
+
+class SeenStore:
+    """Просмотренные объявления одного сайта: IdSet в памяти + SQLite (WAL) на диске.
+
+    Единый сервис дедупликации: открывается один раз при старте, парсеры отдают
+    сырые кандидаты, а main записывает сюда только доставленные ссылки. Снаружи
+    работает со ссылками, внутри хранит канонический ID объявления (utils.item_key).
+    """
+
+    def __init__(self, site: str, db_path: str = SEEN_DB, ttl_days: float | None = SEEN_TTL_DAYS):
+        self.site = site
+        self.db_path = db_path
+        self.ttl_days = ttl_days
+        self._ids = IdSet()
+        # ID, которые сейчас доставляются другим ключевым словом
+        self._claimed: set[int] = set()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+
+    def key(self, link: str) -> int:
+        return item_key(self.site, link)
+
+    def __contains__(self, link: str) -> bool:
+        return self.key(link) in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _open_sync(self, legacy_json: list[str]):
+        self._conn = self._connect()
+        self._migrate_link_table()
+        for path in dict.fromkeys(legacy_json):
+            self._migrate_json(path)
+        if self.ttl_days:
+            self._expire_sync(self.ttl_days)
+        rows = self._conn.execute("SELECT item_id FROM seen_ids WHERE site = ?", (self.site,))
+        self._ids = IdSet(row[0] for row in rows)
+
+    def _migration_done(self, name: str) -> bool:
+        return bool(self._conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone())
+
+    def _import_links(self, name: str, links: list[str], seen_at: list[float] | None = None,
+                      cleanup: str | None = None):
+        """Переносит ссылки в seen_ids и отмечает миграцию; cleanup — SQL удаления источника в той же транзакции."""
+        now = time.time()
+        rows = [
+            (self.site, self.key(link), seen_at[i] if seen_at else now)
+            for i, link in enumerate(links)
+        ]
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_ids (site, item_id, seen_at) VALUES (?, ?, ?)", rows
+            )
+            if cleanup:
+                self._conn.execute(cleanup, (self.site,))
+            self._conn.execute("INSERT INTO migrations (name, done_at) VALUES (?, ?)", (name, now))
+
+    def _migrate_link_table(self):
+        # Первая версия хранилища держала полные ссылки в таблице seen
+        name = f"seen_links:{self.site}"
+        if self._migration_done(name):
+            return
+        has_table = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seen'"
+        ).fetchone()
+        if not has_table:
+            self._import_links(name, [])
+            return
+        rows = self._conn.execute("SELECT key, seen_at FROM seen WHERE site = ?", (self.site,)).fetchall()
+        self._import_links(name, [r[0] for r in rows], [r[1] for r in rows], cleanup="DELETE FROM seen WHERE site = ?")
+        if rows:
+            logger.info(f"📦 [{self.site}] Ссылки из таблицы seen переведены в ID: {len(rows)}")
+
+        # Последний перенесённый сайт убирает таблицу и возвращает место на диске
+        if not self._conn.execute("SELECT 1 FROM seen LIMIT 1").fetchone():
+            self._conn.execute("DROP TABLE seen")
+            # VACUUM не работает внутри транзакции — соединение в autocommit
+            self._conn.execute("VACUUM")
+            logger.info(f"🧹 Старая таблица seen удалена, {self.db_path} сжата")
+
+    def _migrate_json(self, path: str):
+        name = f"json:{self.site}:{os.path.basename(path)}"
+        if self._migration_done(name):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                links = json.load(f).get("seen", [])
+        except FileNotFoundError:
+            links = []
+        except Exception as e:
+            logger.error(f"❌ [{self.site}] Не удалось перенести {path}: {e}")
+            return
+
+        self._import_links(name, links)
+        logger.info(f"📦 [{self.site}] Перенесено {len(links)} ссылок из {path} в {self.db_path}")
+
+    def _add_sync(self, ids: list[int]):
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_ids (site, item_id, seen_at) VALUES (?, ?, ?)",
+                ((self.site, item_id, now) for item_id in ids),
+            )
+
+    def _expire_sync(self, ttl_days: float) -> list[int]:
+        cutoff = time.time() - ttl_days * 86400
+        with self._conn:
+            self._conn.execute("BEGIN")
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT item_id FROM seen_ids WHERE site = ? AND seen_at < ?", (self.site, cutoff)
+            )]
+            self._conn.execute("DELETE FROM seen_ids WHERE site = ? AND seen_at < ?", (self.site, cutoff))
+        return expired
+
+    async def open(self, legacy_json: list[str] | None = None):
+        async with self._lock:
+            await asyncio.to_thread(self._open_sync, legacy_json or [])
+        logger.info(f"📂 [{self.site}] Загружено {len(self._ids)} просмотренных объявлений")
+
+    async def add_many(self, links: list[str]):
+        # Память обновляем сразу, диск — одной транзакцией в фоне от event loop
+        fresh = [i for i in dict.fromkeys(self.key(link) for link in links) if i not in self._ids]
+        if not fresh:
+            return
+        for item_id in fresh:
+            self._ids.add(item_id)
+        async with self._lock:
+            await asyncio.to_thread(self._add_sync, fresh)
+
+    def seen(self, links: list[str]) -> list[bool]:
+        """Для каждой ссылки: уже в хранилище или сейчас доставляется. Нужно догоняющему обходу выдачи."""
+        flags = []
+        for link in links:
+            item_id = self.key(link)
+            flags.append(item_id in self._ids or item_id in self._claimed)
+        return flags
+
+    def claim(self, links: list[str]) -> list[str]:
+        """Отбирает новые ссылки и резервирует их ID, чтобы параллельный поиск не отправил их повторно."""
+        fresh = []
+        for link in links:
+            item_id = self.key(link)
+            if item_id in self._ids or item_id in self._claimed:
+                continue
+            self._claimed.add(item_id)
+            fresh.append(link)
+        return fresh
+
+    async def commit(self, delivered: list[str], claimed: list[str]):
+        # Доставленное — в хранилище, остальное снова доступно следующему циклу
+        self._claimed.difference_update(self.key(link) for link in claimed)
+        await self.add_many(delivered)
+
+    async def expire(self) -> int:
+        if not self.ttl_days:
+            return 0
+        async with self._lock:
+            expired = await asyncio.to_thread(self._expire_sync, self.ttl_days)
+        self._ids.discard_many(expired)
+        if expired:
+            logger.info(f"🧹 [{self.site}] Удалено устаревших объявлений: {len(expired)}")
+        return len(expired)
+
+    async def close(self):
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+
+class SeenLookup:
+    """Проверка «уже видели» для воркер-процессов: только чтение seen.db, без загрузки всех ID в память.
+
+    Пишет в хранилище только координатор, поэтому воркер видит доставленное с задержкой
+    не больше одной транзакции. Одна страница выдачи — один запрос IN (...).
+    """
+
+    def __init__(self, site: str, db_path: str = SEEN_DB):
+        self.site = site
+        self.db_path = db_path
+        self._conn: sqlite3.Connection | None = None
+
+    def __call__(self, links: list[str]) -> list[bool]:
+        ids = [item_key(self.site, link) for link in links]
+        if not ids:
+            return []
+        try:
+            if self._conn is None:
+                self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            placeholders = ",".join("?" * len(ids))
+            found = {row[0] for row in self._conn.execute(
+                f"SELECT item_id FROM seen_ids WHERE site = ? AND item_id IN ({placeholders})", (self.site, *ids)
+            )}
+        except sqlite3.Error as e:
+            # Без хранилища обход ограничится лимитом страниц, а лишнее отсеет координатор
+            logger.warning(f"⚠️ [{self.site}] seen.db недоступна для чтения: {e}")
+            self.close()
+            return [False] * len(ids)
+        return [item_id in found for item_id in ids]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+stores: dict[str, SeenStore] = {}
+
+
+async def open_stores(legacy_files: dict[str, str]) -> dict[str, SeenStore]:
+    for site, path in legacy_files.items():
+        if site not in stores:
+            store = SeenStore(site)
+            await store.open(legacy_json=[path, LEGACY_SEEN_FILES.get(site, path)])
+            stores[site] = store
+    return stores
+
+
+async def close_stores():
+    for store in stores.values():
+        await store.close()
+    stores.clear()
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import random
+import socket
+
+from log_setup import log_context
+from seen_store import SeenLookup
+from work_queue import WorkQueue
+
+logger = logging.getLogger("main.sharding")
+
+HEARTBEAT_INTERVAL = 5
+POLL_INTERVAL = 0.5
+REAP_INTERVAL = 5
+# Сколько координатор ждёт результата одного задания
+JOB_TIMEOUT = 15 * 60
+RESPAWN_DELAY = 5
+STOP_TIMEOUT = 10
+
+
+class Coordinator:
+    """Раздаёт поиск (сайт, ключ) воркер-процессам через WorkQueue.
+
+    Планировщики, дедупликация и отправка в Telegram остаются в процессе
+    координатора: воркер только ищет и возвращает ссылки. Локальные воркеры
+    запускаются командой worker_cmd + [имя] и перезапускаются, если упали.
+    """
+
+    def __init__(self, workers: int, worker_cmd: list[str], queue: WorkQueue | None = None):
+        self.workers = workers
+        self.worker_cmd = worker_cmd
+        self.queue = queue or WorkQueue()
+
+        self._pending: dict[int, asyncio.Future] = {}
+        self._processes: dict[str, asyncio.subprocess.Process] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self._queue_stats: dict = {}
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "requeued": 0, "worker_deaths": 0}
+
+    async def start(self):
+        await self.queue.reset()
+        self._tasks = [asyncio.create_task(self._collect()), asyncio.create_task(self._reap())]
+        host = socket.gethostname()
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._supervise(f"{host}-w{i}")))
+        logger.info(f"🧮 Координатор запущен: воркеров {self.workers}, очередь {self.queue.db_path}")
+
+    async def submit(self, site: str, keyword: str) -> list[str]:
+        """Ставит поиск в очередь и ждёт ссылки от воркера."""
+        job_id = await self.queue.put(site, keyword)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = future
+        self.stats["submitted"] += 1
+        try:
+            result = await asyncio.wait_for(future, JOB_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await asyncio.shield(self.queue.cancel(job_id))
+            raise
+        finally:
+            self._pending.pop(job_id, None)
+
+        if result["error"]:
+            self.stats["failed"] += 1
+            raise RuntimeError(f"воркер {result['worker']}: {result['error']}")
+        self.stats["completed"] += 1
+        return result["links"]
+
+    async def _collect(self):
+        while True:
+            try:
+                results = await self.queue.take_results()
+            except Exception as e:
+                logger.error(f"❌ Не удалось забрать результаты воркеров: {e}")
+                results = []
+            for result in results:
+                future = self._pending.get(result["job_id"])
+                if future and not future.done():
+                    future.set_result(result)
+            if not results:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            try:
+                dead, requeued = await self.queue.reap()
+                self._queue_stats = await self.queue.get_stats()
+            except Exception as e:
+                logger.error(f"❌ Ошибка проверки воркеров: {e}")
+                continue
+            for name in dead:
+                self.stats["worker_deaths"] += 1
+                logger.warning(f"💀 Воркер {name} перестал присылать пульс")
+            if requeued:
+                self.stats["requeued"] += len(requeued)
+                logger.warning(f"♻️ Заданий возвращено в очередь: {len(requeued)}")
+
+    async def _supervise(self, name: str):
+        while not self._closing:
+            process = await asyncio.create_subprocess_exec(*self.worker_cmd, name)
+            self._processes[name] = process
+            logger.info(f"👷 Воркер {name} запущен (pid {process.pid})")
+            code = await process.wait()
+            self._processes.pop(name, None)
+            if self._closing:
+                break
+
+            self.stats["worker_deaths"] += 1
+            requeued = await self.queue.release_worker(name)
+            self.stats["requeued"] += len(requeued)
+            logger.warning(f"💀 Воркер {name} завершился с кодом {code}, заданий возвращено: {len(requeued)}")
+            await asyncio.sleep(RESPAWN_DELAY)
+
+    async def stop(self):
+        self._closing = True
+        for process in list(self._processes.values()):
+            if process.returncode is None:
+                process.terminate()
+        for process in list(self._processes.values()):
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        await self.queue.close()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "alive": len(self._processes),
+            "queue": self._queue_stats,
+        }
+
+
+async def run_worker(name: str, parsers: dict, limiters: dict, queue: WorkQueue | None = None):
+    """Цикл воркера: арендует задания, ищет через лимитер сайта и пишет ссылки в очередь."""
+    queue = queue or WorkQueue()
+    await queue.register(name)
+    # Сколько заданий каждого сайта сейчас в работе у этого воркера
+    busy = {site: 0 for site in parsers}
+    # Догоняющему обходу нужна проверка «уже видели»: воркер читает seen.db координатора
+    lookups = {site: SeenLookup(site) for site in parsers}
+    tasks: set[asyncio.Task] = set()
+    wakeup = asyncio.Event()
+
+    async def heartbeat():
+        while True:
+            try:
+                await queue.heartbeat(name)
+            except Exception as e:
+                logger.error(f"[{name}] ❌ Пульс не отправлен: {e}")
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def process(job: dict):
+        site, keyword = job["site"], job["keyword"]
+        limiter = limiters[site]
+        try:
+            with log_context(worker=name, site=site, keyword=keyword):
+                await limiter.polite_wait()
+                async with limiter.slot():
+                    links = await parsers[site](keyword, lookups[site])
+            await queue.complete(job, name, links=links)
+        except Exception as e:
+            logger.error(f"[{name}] ❌ Ошибка задания '{keyword}' ({site}): {e}")
+            await queue.complete(job, name, error=str(e) or type(e).__name__)
+        finally:
+            busy[site] -= 1
+            wakeup.set()
+
+    beat = asyncio.create_task(heartbeat())
+    logger.info(f"👷 Воркер {name} готов к заданиям")
+    try:
+        while True:
+            # Берём только сайты, где лимитер ещё не заполнен: лишнее достанется другим воркерам
+            sites = [site for site in parsers if busy[site] < int(limiters[site].limit)]
+            job = await queue.lease(name, sites) if sites else None
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), POLL_INTERVAL * random.uniform(1, 2))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            busy[job["site"]] += 1
+            task = asyncio.create_task(process(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        beat.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(beat, *tasks, return_exceptions=True)
+        for lookup in lookups.values():
+            lookup.close()
+        try:
+            await queue.unregister(name)
+        finally:
+            await queue.close()
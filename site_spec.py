@@ -0,0 +1,257 @@
+import logging
+import os
+import urllib.parse
+
+from playwright.async_api import Page
+
+from browser_pool import browser_pool
+from catchup import CatchUp
+from tracing import span
+from utils import extract_item_id
+
+GOTO_TIMEOUT = 50000
+# Сколько ждать первых карточек (или баннера согласия) после перехода, мс
+READY_TIMEOUT_MS = 15000
+CONSENT_CLICK_TIMEOUT = 3000
+MAX_SCROLLS = 30
+MAX_IDLE_SCROLLS = 3
+# Сколько ждать появления новых карточек после одного скролла, мс
+SCROLL_WAIT_MS = 2500
+SCROLL_STEP = 1200
+
+# Какой селектор из каскада сработал для хоста — каскад не перебирается повторно
+_matched_selectors: dict[str, str] = {}
+
+# Промис в странице резолвится по MutationObserver, когда появился первый подходящий
+# селектор, либо по таймауту — без поллинга из Python
+_FIRST_MATCH_JS = """([sels, timeoutMs]) => new Promise(resolve => {
+    const find = () => sels.find(s => document.querySelector(s)) || null;
+    const done = (value) => { observer.disconnect(); clearTimeout(timer); resolve(value); };
+    const observer = new MutationObserver(() => { const s = find(); if (s) done(s); });
+    const timer = setTimeout(() => done(find()), timeoutMs);
+    observer.observe(document.documentElement, {childList: true, subtree: true});
+    const s = find(); if (s) done(s);
+})"""
+
+_WAIT_MORE_CARDS_JS = """([sel, prev, target, timeoutMs]) => new Promise(resolve => {
+    const count = () => document.querySelectorAll(sel).length;
+    const done = (value) => { observer.disconnect(); clearTimeout(timer); resolve(value); };
+    const check = () => { const n = count(); if (n > prev || n >= target) done(n); };
+    const observer = new MutationObserver(check);
+    const timer = setTimeout(() => done(count()), timeoutMs);
+    observer.observe(document.documentElement, {childList: true, subtree: true});
+    check();
+})"""
+
+# Все поля всех карточек за один вызов: для каждого поля — варианты [селектор внутри карточки, атрибут],
+# берётся первый непустой. Селектор null — сама карточка, атрибут "text" — textContent
+_EXTRACT_JS = """(els, fields) => els.map(el => {
+    const card = {};
+    for (const [name, options] of Object.entries(fields)) {
+        card[name] = null;
+        for (const [sel, attr] of options) {
+            const node = sel ? el.querySelector(sel) : el;
+            const value = node && (attr === 'text' ? node.textContent : node.getAttribute(attr));
+            if (value && value.trim()) { card[name] = value; break; }
+        }
+    }
+    return card;
+})"""
+
+
+class SiteSpec:
+    """Декларативное описание браузерного поиска по сайту.
+
+    search_url — шаблон со {base}, {keyword}, {page}, {offset} или функция (keyword, page_no) -> url.
+    Готовность страницы — появление карточек из каскада card_selectors. fields — откуда брать
+    link, title, price: (селектор, атрибут) или список таких вариантов. pagination: "pages" —
+    следующая страница по search_url, "scroll" — докрутка ленты на page_size карточек, None — одна страница.
+    """
+
+    __slots__ = (
+        "site", "base_url", "search_url", "card_selectors", "fields", "consent", "consent_state",
+        "setup", "pagination", "page_size", "logger",
+    )
+
+    def __init__(self, site: str, base_url: str, search_url, card_selectors: list[str], fields: dict,
+                 consent: str | None = None, consent_state: str | None = None, setup=None,
+                 pagination: str | None = None, page_size: int = 20):
+        self.site = site
+        self.base_url = base_url
+        self.search_url = search_url
+        self.card_selectors = card_selectors
+        self.fields = {
+            name: [list(option) for option in (options if isinstance(options, list) else [options])]
+            for name, options in fields.items()
+        }
+        self.consent = consent
+        self.consent_state = consent_state
+        self.setup = setup
+        self.pagination = pagination
+        self.page_size = page_size
+        self.logger = logging.getLogger(site)
+
+    def url(self, keyword: str, page_no: int = 1) -> str:
+        if callable(self.search_url):
+            return self.search_url(keyword, page_no)
+        return self.search_url.format(
+            base=self.base_url,
+            keyword=urllib.parse.quote(keyword),
+            page=page_no,
+            offset=(page_no - 1) * self.page_size,
+        )
+
+    def link(self, href: str | None) -> str | None:
+        """Абсолютная ссылка в нижнем регистре; ссылки на чужие хосты (реклама, партнёры) отбрасываются."""
+        if not href or not href.strip():
+            return None
+        url = urllib.parse.urljoin(self.base_url + "/", href.strip())
+        if urllib.parse.urlsplit(url).netloc != urllib.parse.urlsplit(self.base_url).netloc:
+            return None
+        return url.lower()
+
+
+def _clean(value: str | None) -> str | None:
+    return " ".join(value.split()) if value else value
+
+
+async def resolve_selector(page: Page, spec: SiteSpec) -> str | None:
+    host = urllib.parse.urlsplit(page.url).netloc
+    remembered = _matched_selectors.get(host)
+    # Запомненный селектор идёт первым, остальные из каскада ждём вместе с ним в одном
+    # ожидании: смена вёрстки не стоит второго таймаута
+    candidates = spec.card_selectors
+    if remembered:
+        candidates = [remembered, *(s for s in spec.card_selectors if s != remembered)]
+
+    selector = await page.evaluate(_FIRST_MATCH_JS, [candidates, READY_TIMEOUT_MS])
+
+    # Ничего не нашлось — скорее пустая выдача, чем сломанный селектор: запомненный не сбрасываем
+    if selector and selector != remembered:
+        if remembered:
+            spec.logger.info(f"♻️ Селектор {remembered} перестал работать на {host}, теперь {selector}")
+        else:
+            spec.logger.debug(f"✅ Селектор сработал: {selector}")
+        _matched_selectors[host] = selector
+    return selector
+
+
+async def extract_cards(page: Page, spec: SiteSpec, selector: str) -> list[dict]:
+    """Карточки страницы одним eval_on_selector_all: link, id, title, price и прочие поля spec.fields."""
+    with span("extract"):
+        raw = await page.eval_on_selector_all(selector, _EXTRACT_JS, spec.fields)
+
+    cards = {}
+    for card in raw:
+        link = spec.link(card.pop("link", None))
+        if not link or link in cards:
+            continue
+        cards[link] = {
+            **{name: _clean(value) for name, value in card.items()},
+            "link": link,
+            "id": extract_item_id(spec.site, link),
+        }
+    return list(cards.values())
+
+
+async def auto_scroll(page: Page, spec: SiteSpec, selector: str, target: int) -> int:
+    """Крутит ленту, пока карточек меньше target. Возвращает число карточек на странице."""
+    count = await page.eval_on_selector_all(selector, "els => els.length")
+    idle = 0
+    scrolls = 0
+
+    while count < target and scrolls < MAX_SCROLLS:
+        scrolls += 1
+        spec.logger.debug(f"🔀 Скролл {scrolls}/{MAX_SCROLLS}")
+        await page.mouse.wheel(0, SCROLL_STEP)
+
+        # Ждём, пока MutationObserver увидит новые карточки, а не фиксированную паузу
+        new_count = await page.evaluate(_WAIT_MORE_CARDS_JS, [selector, count, target, SCROLL_WAIT_MS])
+        if new_count > count:
+            count = new_count
+            idle = 0
+        else:
+            idle += 1
+            if idle >= MAX_IDLE_SCROLLS:
+                spec.logger.info(f"🚩 {MAX_IDLE_SCROLLS} скролла подряд без новых карточек.")
+                break
+
+    spec.logger.info(f"📦 Карточек на странице: {count} (скроллов: {scrolls})")
+    return count
+
+
+async def _accept_consent(page: Page, spec: SiteSpec):
+    with span("consent"):
+        try:
+            await page.wait_for_selector(", ".join([*spec.card_selectors, spec.consent]), timeout=READY_TIMEOUT_MS)
+            button = page.locator(spec.consent)
+            if await button.count():
+                await button.first.click(timeout=CONSENT_CLICK_TIMEOUT)
+                if spec.consent_state:
+                    await page.context.storage_state(path=spec.consent_state)
+                spec.logger.info("✅ Cookie popup закрыт, согласие сохранено")
+        except Exception:
+            spec.logger.info("ℹ️ Cookie popup не найден")
+
+
+async def open_listing(page: Page, spec: SiteSpec, url: str) -> str | None:
+    """Переход на выдачу, установка стражей, согласие. Возвращает сработавший селектор карточек."""
+    spec.logger.debug(f"🔍 Открываем {url}")
+    with span("goto"):
+        await page.goto(url, wait_until="domcontentloaded", timeout=GOTO_TIMEOUT)
+    if spec.setup:
+        await spec.setup(page)
+    if spec.consent:
+        await _accept_consent(page, spec)
+    return await resolve_selector(page, spec)
+
+
+def _context_args(spec: SiteSpec) -> dict:
+    if spec.consent_state and os.path.exists(spec.consent_state):
+        return {"storage_state": spec.consent_state}
+    return {}
+
+
+async def search(spec: SiteSpec, keyword: str, proxy: dict | None, user_agent: str, is_seen=None) -> list[dict]:
+    """Карточки по ключу, новые сверху. is_seen(links) -> [bool] включает догоняющий обход по spec.pagination."""
+    catchup = CatchUp(spec.site, is_seen)
+    cards: dict[str, dict] = {}
+
+    async with browser_pool.page(spec.site, proxy, user_agent, **_context_args(spec)) as page:
+        selector = await open_listing(page, spec, spec.url(keyword))
+        page_no = 1
+        while selector:
+            if spec.pagination == "scroll":
+                target = spec.page_size * page_no
+                with span("scroll", target=target):
+                    count = await auto_scroll(page, spec, selector, target)
+                batch = (await extract_cards(page, spec, selector))[:target]
+                last = count < target
+            else:
+                batch = await extract_cards(page, spec, selector)
+                last = spec.pagination is None or len(batch) < spec.page_size
+
+            fresh = [card for card in batch if card["link"] not in cards]
+            cards.update((card["link"], card) for card in fresh)
+            if not catchup.add_page([card["link"] for card in fresh], last=last):
+                break
+
+            page_no += 1
+            if spec.pagination == "pages":
+                selector = await open_listing(page, spec, spec.url(keyword, page_no))
+
+    if not cards:
+        spec.logger.warning(f"📭 Карточки не найдены по ключу '{keyword}'")
+    return [cards[link] for link in catchup.finish()]
+
+
+async def collect(spec: SiteSpec, url: str, proxy: dict | None, user_agent: str, target: int | None = None) -> list[dict]:
+    """Карточки одной страницы по готовому адресу (лента категории); при target — докрутка до него."""
+    async with browser_pool.page(spec.site, proxy, user_agent, **_context_args(spec)) as page:
+        selector = await open_listing(page, spec, url)
+        if not selector:
+            return []
+        if target:
+            with span("scroll", target=target):
+                await auto_scroll(page, spec, selector, target)
+        return await extract_cards(page, spec, selector)
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("main.state_cache")
+
+STATE_DIR = "parsers/browser_states"
+# Сколько живёт сохранённое состояние браузера (куки, localStorage), секунды
+STATE_TTL = {
+    "aukro": 24 * 3600,
+    "bazos": 24 * 3600,
+    "sbazar": 7 * 24 * 3600,  # согласие с куки держится долго
+    "vinted": 2 * 3600,  # антибот-куки короткие
+}
+DEFAULT_TTL = 12 * 3600
+# Состояние одного ключа перезаписывается не чаще, чем раз в SAVE_INTERVAL секунд
+SAVE_INTERVAL = 5 * 60
+
+
+class StateCache:
+    """storage_state браузерных контекстов по (сайт, прокси, user-agent) в памяти и на диске.
+
+    Новый контекст стартует с сохранённым состоянием: согласие с куки, закрытые попапы
+    и антибот-куки первого визита не проходятся на каждом ключе заново. Запись живёт
+    STATE_TTL сайта и сбрасывается, как только прокси получает бан на этом сайте.
+    """
+
+    def __init__(self, directory: str = STATE_DIR):
+        self.directory = directory
+        # (сайт, прокси, user-agent) -> {"state": dict, "saved_at": float}
+        self._entries: dict[tuple[str, str, str], dict] = {}
+        # (сайт, прокси) -> время последнего бана: всё сохранённое раньше уже недействительно
+        self._banned_at: dict[tuple[str, str], float] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "saves": 0, "expired": 0, "invalidated": 0}
+
+    def _path(self, site: str, proxy: str, user_agent: str) -> str:
+        digest = hashlib.sha1(f"{proxy}|{user_agent}".encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{site}-{digest}.json")
+
+    def _fresh(self, site: str, entry: dict) -> bool:
+        return time.time() - entry["saved_at"] < STATE_TTL.get(site, DEFAULT_TTL)
+
+    def _unlink(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось удалить состояние браузера {path}: {e}")
+
+    def _remove(self, key: tuple[str, str, str]):
+        self._entries.pop(key, None)
+        self._unlink(self._path(*key))
+
+    def _load_sync(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # Подкаталоги и недописанные .tmp не трогаем
+            if not name.endswith(".json") or not os.path.isfile(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                key = (data["site"], data["proxy"], data["user_agent"])
+                entry = {"state": data["state"], "saved_at": data["saved_at"]}
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ Повреждённое состояние браузера {path}: {e}")
+                self._unlink(path)
+                continue
+            if self._fresh(key[0], entry):
+                self._entries[key] = entry
+            else:
+                self.stats["expired"] += 1
+                self._unlink(path)
+
+    def _write_sync(self, key: tuple[str, str, str], entry: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(*key)
+        site, proxy, user_agent = key
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"site": site, "proxy": proxy, "user_agent": user_agent, **entry}, f)
+        os.replace(tmp, path)
+
+    async def load(self):
+        async with self._load_lock:
+            if self._loaded:
+                return
+            await asyncio.to_thread(self._load_sync)
+            self._loaded = True
+        if self._entries:
+            logger.info(f"🍪 Загружено состояний браузера: {len(self._entries)}")
+
+    async def lookup(self, site: str, proxy: str, user_agent: str | None) -> tuple[str, dict] | None:
+        """Свежее состояние для (сайт, прокси): под этот user-agent, иначе самое свежее под свой.
+
+        Возвращает (user-agent, storage_state) — куки привязаны к отпечатку, поэтому
+        контекст создаётся с тем user-agent, под которым состояние сохранено.
+        """
+        await self.load()
+        candidates = []
+        for key, entry in list(self._entries.items()):
+            if key[0] != site or key[1] != proxy:
+                continue
+            if entry["saved_at"] <= self._banned_at.get((site, proxy), 0.0):
+                self.stats["invalidated"] += 1
+                self._remove(key)
+                continue
+            if not self._fresh(site, entry):
+                self.stats["expired"] += 1
+                self._remove(key)
+                continue
+            candidates.append((key[2] == (user_agent or ""), entry["saved_at"], key))
+
+        if not candidates:
+            self.stats["misses"] += 1
+            return None
+        _, _, key = max(candidates)
+        self.stats["hits"] += 1
+        return key[2] or None, self._entries[key]["state"]
+
+    def due(self, site: str, proxy: str, user_agent: str | None) -> bool:
+        entry = self._entries.get((site, proxy, user_agent or ""))
+        return entry is None or time.time() - entry["saved_at"] >= SAVE_INTERVAL
+
+    async def save(self, site: str, proxy: str, user_agent: str | None, state: dict):
+        key = (site, proxy, user_agent or "")
+        entry = {"state": state, "saved_at": time.time()}
+        self._entries[key] = entry
+        self.stats["saves"] += 1
+        try:
+            await asyncio.to_thread(self._write_sync, key, entry)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить состояние браузера {site}/{proxy}: {e}")
+
+    def invalidate(self, site: str, proxy: str):
+        """Сбрасывает все состояния (сайт, прокси): после бана куки скорее вредят, чем помогают."""
+        # Ещё не загруженные с диска записи отсеет lookup по времени бана
+        self._banned_at[(site, proxy)] = time.time()
+        keys = [key for key in self._entries if key[0] == site and key[1] == proxy]
+        for key in keys:
+            self._remove(key)
+        if keys:
+            self.stats["invalidated"] += len(keys)
+            logger.info(f"[{site}] 🍪 Состояние браузера для {proxy} сброшено после бана")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+
+state_cache = StateCache()
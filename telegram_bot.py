@@ -17,24 +17,19 @@ from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 
 from inline_kbd import admin_choices
 
+from log_setup import setup_logging
+from keyword_registry import keyword_registry
+import tracing
+from tracing import profiler
+
 from user_control import set_user_status
 
 
 bot = Bot(token=TELEGRAM_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 
-# Конфигурация логера 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-
+# Файлы и консоль настраивает log_setup.setup_logging при запуске
 logger = logging.getLogger("tg_bot")
-logger.setLevel(logging.INFO)
-
-if not logger.hasHandlers():
-    fh = logging.FileHandler(os.path.join(LOG_DIR, "tg_bot.log"), encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(fh)
-    logger.addHandler(logging.StreamHandler())
 
 # Временное хранилище статусов
 user_message_status = {}
@@ -45,17 +40,6 @@ def set_user_status(user_id: int, status: bool):
 def is_user_active(user_id: int) -> bool:
     return user_message_status.get(user_id, True)  # По умолчанию True
 
-# ========= Отправка сообщений в чат =========
-async def send_to_telegram(message: str, chat_id: int = TELEGRAM_CHAT_ID):
-    if not is_user_active(chat_id):
-        logger.info(f"ℹ️ Пользователь {chat_id} отключил сообщения, сообщение не отправлено")
-        return
-    try:
-        await bot.send_message(chat_id=chat_id, text=message)
-    except Exception as e:
-        logger.error(f"❌ Ошибка отправки: {e}")
-
-
 # ========= Команды бота =========
 @dp.message(CommandStart())
 async def start_cmd(message: Message):
@@ -67,7 +51,16 @@ async def id_cmd(message: Message):
 
 @dp.message(Command("help"))
 async def help_cmd(message: Message):
-    await message.answer("📌 Команды:\n/start — начать\n/id — узнать chat_id\n/help — помощь")
+    await message.answer("📌 Команды:\n/start — начать\n/id — узнать chat_id\n/cancel — отменить ввод\n/help — помощь")
+
+# Регистрируется раньше обработчиков состояний, иначе /cancel примут за ключевое слово
+@dp.message(Command("cancel"))
+async def cancel_cmd(message: Message, state: FSMContext):
+    if await state.get_state() is None:
+        await message.answer("ℹ️ Отменять нечего.")
+        return
+    await state.clear()
+    await message.answer("↩️ Ввод отменён.")
 
 # Функция для открытия админ панели админу - по TELEGRAM_CHAT_ID
 @dp.message(Command('admin'))
@@ -109,6 +102,45 @@ async def get_keywords_data(callback: types.CallbackQuery):
         await callback.answer("❌ Не удалось отправить файл", show_alert=True)
 
 
+# Сэмплирующий профилировщик: первое нажатие запускает, второе — останавливает и присылает профиль
+@dp.callback_query(lambda c: c.data == 'toggle_profiler')
+async def toggle_profiler(callback: types.CallbackQuery):
+    if not profiler.running:
+        profiler.start()
+        await callback.answer("⏱ Профилировщик запущен. Нажмите ещё раз, чтобы остановить", show_alert=True)
+        return
+
+    path = await asyncio.to_thread(profiler.stop)
+    if path is None:
+        await callback.answer("ℹ️ Сэмплов не набралось", show_alert=True)
+        return
+    try:
+        await bot.send_document(chat_id=callback.from_user.id, document=FSInputFile(path),
+                                caption="Свёрнутые стеки: flamegraph.pl или speedscope.app")
+        await callback.answer("📤 Профиль отправлен")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при отправке профиля: {e}")
+        await callback.answer(f"❌ Профиль сохранён в {path}, отправить не удалось", show_alert=True)
+
+
+# Самые медленные трассы ключей в формате Chrome trace (chrome://tracing, ui.perfetto.dev)
+@dp.callback_query(lambda c: c.data == 'slow_traces')
+async def send_slow_traces(callback: types.CallbackQuery):
+    if not tracing.is_enabled():
+        await callback.answer("ℹ️ Трассировка выключена, запустите с TRACE=1", show_alert=True)
+        return
+    path = await tracing.write_slowest()
+    if path is None:
+        await callback.answer("ℹ️ Трасс пока нет", show_alert=True)
+        return
+    try:
+        await bot.send_document(chat_id=callback.from_user.id, document=FSInputFile(path))
+        await callback.answer("📤 Трассы отправлены")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при отправке трасс: {e}")
+        await callback.answer("❌ Не удалось отправить файл", show_alert=True)
+
+
 # FSM-состояния
 class AddKeywordState(StatesGroup):
     waiting_for_keyword = State()
@@ -116,7 +148,7 @@ class AddKeywordState(StatesGroup):
 # Обработка кнопки "Добавить слово"
 @dp.callback_query(lambda c: c.data == 'add_one_keyword')
 async def prompt_for_keyword(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.answer("📝 Введите новое ключевое слово:")
+    await callback.message.answer("📝 Введите новое ключевое слово или /cancel для отмены:")
     logger.info("Пользователь вводит ключевое слово для добавления в файл")
     await state.set_state(AddKeywordState.waiting_for_keyword)
     await callback.answer()
@@ -150,41 +182,50 @@ async def save_new_keyword(message: types.Message, state: FSMContext):
         await message.answer(f"✅ Ключевое слово <b>{keyword}</b> добавлено.")
 
     await state.clear()
+    if keyword not in existing_keywords:
+        # Парсеры подхватывают ключ сразу, не дожидаясь проверки файла
+        await keyword_registry.reload()
 
 
 # Путь к файлу ключевых слов
 KEYWORDS_FILE_PATH = "parsers/keywords.txt"
 
-# Флаг остановки парсинга
-stop_parsing = False
-
 class ImportKeywordState(StatesGroup):
     waiting_for_file = State()
 
 @dp.callback_query(lambda c: c.data == 'import_keywords_data')
 async def prompt_import_keywords(callback: types.CallbackQuery, state: FSMContext):
-    global stop_parsing
-    stop_parsing = True  # Остановить все рассылки
-    await callback.message.answer("📎 Пожалуйста, отправьте .txt файл с ключевыми словами.")
+    await callback.message.answer("📎 Пожалуйста, отправьте .txt файл с ключевыми словами или /cancel для отмены.")
     await state.set_state(ImportKeywordState.waiting_for_file)
 
 @dp.message(ImportKeywordState.waiting_for_file)
 async def handle_imported_file(message: types.Message, state: FSMContext):
-    global stop_parsing
     document = message.document
 
     if not document or not document.file_name.endswith(".txt"):
-        await message.answer("❌ Пожалуйста, отправьте .txt файл.")
+        await message.answer("❌ Пожалуйста, отправьте .txt файл или /cancel для отмены.")
         return
 
     os.makedirs("parsers", exist_ok=True)
+    await state.clear()
 
-    file = await message.bot.get_file(document.file_id)
-    await message.bot.download_file(file.file_path, destination=KEYWORDS_FILE_PATH)
+    # Поиск стоит только на время замены файла, а не пока ждём файл от пользователя
+    keyword_registry.pause()
+    try:
+        file = await message.bot.get_file(document.file_id)
+        # Качаем рядом и подменяем целиком: оборванная загрузка не портит текущий файл
+        tmp_path = f"{KEYWORDS_FILE_PATH}.tmp"
+        await message.bot.download_file(file.file_path, destination=tmp_path)
+        os.replace(tmp_path, KEYWORDS_FILE_PATH)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при загрузке файла ключевых слов: {e}")
+        await message.answer("❌ Не удалось загрузить файл, ключевые слова не изменены.")
+        return
+    finally:
+        # Снова можно начинать парсинг: ключи применяются разницей, остальные сохраняют расписание
+        await keyword_registry.resume()
 
     await message.answer("✅ Файл успешно загружен и заменён.")
-    stop_parsing = False  # Снова можно начинать парсинг
-    await state.clear()
 
 
 
@@ -196,6 +237,7 @@ async def run_bot():
 
 # ========= Возможность запуска как скрипт =========
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(run_bot())
     except (KeyboardInterrupt, SystemExit):
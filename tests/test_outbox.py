@@ -0,0 +1,82 @@
+import asyncio
+
+import delivery as delivery_module
+import main
+from delivery import DeliveryQueue
+from journal import ACKED, Journal
+from seen_store import SeenStore
+
+CHAT_ID = 42
+A = "https://auto.bazos.cz/inzerat/101/kniha.php"
+B = "https://auto.bazos.cz/inzerat/102/atlas.php"
+C = "https://auto.bazos.cz/inzerat/103/komiks.php"
+D = "https://auto.bazos.cz/inzerat/104/basne.php"
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str):
+        self.messages.append((chat_id, text))
+
+
+def _crashed_run(db_path: str):
+    """Прошлый запуск: A, B ждали отправки, C уже ушла в Telegram, D доведена до конца."""
+    async def run():
+        journal = Journal(str(db_path))
+        await journal.open()
+        pending = journal.add_pending("bazos", "kniha", CHAT_ID, [A, B, C])
+        done = journal.add_pending("bazos", "kniha", CHAT_ID, [D])
+        await journal.mark_sent([pending[2]])
+        journal.ack(done)
+        # Падение: без close, на диске только то, что успело записаться
+        await journal.flush()
+        journal._flusher.cancel()
+        journal._conn.close()
+    asyncio.run(run())
+
+
+def test_recover_outbox_resends_unacked_links_once(tmp_path, monkeypatch):
+    journal_db = tmp_path / "journal.db"
+    _crashed_run(journal_db)
+
+    bot = FakeBot()
+    journal = Journal(str(journal_db))
+    queue = DeliveryQueue()
+    store = SeenStore("bazos", db_path=str(tmp_path / "seen.db"))
+    monkeypatch.setattr(delivery_module, "bot", bot)
+    monkeypatch.setattr(delivery_module, "journal", journal)
+    monkeypatch.setattr(main, "journal", journal)
+    monkeypatch.setattr(main, "delivery", queue)
+    monkeypatch.setitem(main.seen_links_store, "bazos", store)
+
+    async def restart():
+        await journal.open()
+        await store.open()
+        queue.start()
+        await main.recover_outbox()
+        await queue.stop()
+        # Повторный подъём после доставки ничего не досылает
+        queue.start()
+        await main.recover_outbox()
+        await queue.stop()
+        unfinished = await journal.unfinished()
+        states = dict(journal._conn.execute("SELECT link, state FROM outbox").fetchall())
+        await journal.close()
+        await store.close()
+        return unfinished, states
+
+    unfinished, states = asyncio.run(restart())
+
+    assert len(bot.messages) == 1
+    chat_id, text = bot.messages[0]
+    assert chat_id == CHAT_ID
+    assert A in text and B in text
+    # C дошла до Telegram до падения, D закрыта — их не шлём повторно
+    assert C not in text and D not in text
+
+    assert all(link in store for link in (A, B, C))
+    assert D not in store
+    assert unfinished == []
+    assert states == {A: ACKED, B: ACKED, C: ACKED, D: ACKED}
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from seen_store import IdSet, SeenStore
+from utils import item_key
+
+A = "https://auto.bazos.cz/inzerat/101/kniha.php"
+B = "https://auto.bazos.cz/inzerat/102/atlas.php"
+C = "https://auto.bazos.cz/inzerat/103/komiks.php"
+
+
+def _open(db_path, **kwargs) -> SeenStore:
+    store = SeenStore("bazos", db_path=str(db_path), **kwargs)
+    asyncio.run(store.open())
+    return store
+
+
+def _close(store: SeenStore):
+    asyncio.run(store.close())
+
+
+def test_claim_commit_round_trip(tmp_path):
+    db = tmp_path / "seen.db"
+    store = _open(db)
+
+    assert store.claim([A, B]) == [A, B]
+    # Зарезервированное не отдаётся второму ключу, пока идёт доставка
+    assert store.claim([A, B, C]) == [C]
+    assert store.seen([A, B, C]) == [True, True, True]
+
+    asyncio.run(store.commit([A], [A, B, C]))
+    assert A in store
+    assert B not in store and C not in store
+    # Недоставленное снова доступно следующему циклу
+    assert store.seen([A, B, C]) == [True, False, False]
+    assert store.claim([A, B]) == [B]
+    _close(store)
+
+    reopened = _open(db)
+    assert A in reopened and B not in reopened
+    assert len(reopened) == 1
+    _close(reopened)
+
+
+def test_same_listing_under_another_link_is_one_id(tmp_path):
+    store = _open(tmp_path / "seen.db")
+    asyncio.run(store.add_many([A]))
+
+    assert "https://AUTO.bazos.cz/inzerat/101/jiny-nadpis.php?ref=1" in store
+    assert store.claim(["https://www.bazos.cz/inzerat/101/"]) == []
+    _close(store)
+
+
+def test_expire_removes_old_ids_from_disk_and_memory(tmp_path):
+    db = tmp_path / "seen.db"
+    store = _open(db, ttl_days=1)
+    asyncio.run(store.add_many([A, B]))
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE seen_ids SET seen_at = ? WHERE item_id = 101", (time.time() - 2 * 86400,))
+
+    assert asyncio.run(store.expire()) == 1
+    assert A not in store and B in store
+    assert store.claim([A]) == [A]
+    _close(store)
+
+    reopened = _open(db, ttl_days=1)
+    assert A not in reopened and B in reopened
+    _close(reopened)
+
+
+def test_id_set_merge_and_discard():
+    ids = IdSet([5, 1, 3])
+    ids.MERGE_AT = 2
+    ids.add(4)
+    ids.add(2)  # буфер сливается с основным массивом
+    ids.add(9)  # остаётся в буфере
+    assert list(ids._base) == [1, 2, 3, 4, 5]
+    assert len(ids) == 6
+
+    ids.discard_many([2, 9, 42])
+    assert len(ids) == 4
+    assert all(i in ids for i in (1, 3, 4, 5))
+    assert 2 not in ids and 9 not in ids
+
+
+# --- миграции старых форматов ---
+
+V = "https://www.vinted.cz/items/555-kniha"
+
+
+def _legacy_db(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE seen (site TEXT NOT NULL, key TEXT NOT NULL, seen_at REAL NOT NULL, "
+            "PRIMARY KEY (site, key)) WITHOUT ROWID"
+        )
+        conn.executemany("INSERT INTO seen (site, key, seen_at) VALUES (?, ?, ?)", rows)
+
+
+def _seen_ids(db_path, site):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT item_id, seen_at FROM seen_ids WHERE site = ?", (site,)))
+
+
+def _has_seen_table(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return bool(conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seen'").fetchone())
+
+
+def _open_site(db_path, site, legacy_json=()):
+    store = SeenStore(site, db_path=str(db_path))
+    asyncio.run(store.open(legacy_json=list(legacy_json)))
+    return store
+
+
+def test_link_table_and_json_migrate_to_ids(tmp_path):
+    db = tmp_path / "seen.db"
+    _legacy_db(db, [("bazos", A, 100.0), ("bazos", B, 200.0), ("vinted", V, 300.0)])
+    legacy = tmp_path / "bazos_cz_seen.json"
+    legacy.write_text(json.dumps({"seen": [B, C]}), encoding="utf-8")
+
+    bazos = _open_site(db, "bazos", [str(legacy)])
+    assert A in bazos and B in bazos and C in bazos
+    ids = _seen_ids(db, "bazos")
+    assert set(ids) == {item_key("bazos", A), item_key("bazos", B), item_key("bazos", C)}
+    # Время из таблицы seen сохраняется, повтор из JSON его не перетирает
+    assert ids[101] == 100.0 and ids[102] == 200.0
+    # Перенесённые строки удалены, чужие на месте — таблица ещё нужна vinted
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT site FROM seen").fetchall() == [("vinted",)]
+    _close(bazos)
+
+    vinted = _open_site(db, "vinted")
+    assert V in vinted
+    assert _seen_ids(db, "vinted") == {555: 300.0}
+    # Последний сайт убирает опустевшую таблицу
+    assert not _has_seen_table(db)
+    _close(vinted)
+
+
+def test_second_open_does_not_repeat_migrations(tmp_path):
+    db = tmp_path / "seen.db"
+    _legacy_db(db, [("bazos", A, 100.0)])
+    legacy = tmp_path / "bazos_cz_seen.json"
+    legacy.write_text(json.dumps({"seen": [B]}), encoding="utf-8")
+    _close(_open_site(db, "bazos", [str(legacy)]))
+
+    with sqlite3.connect(db) as conn:
+        names = {row[0] for row in conn.execute("SELECT name FROM migrations")}
+        # Удалённое TTL или руками не должно вернуться из старого файла
+        conn.execute("DELETE FROM seen_ids WHERE item_id = 102")
+    assert names == {"seen_links:bazos", "json:bazos:bazos_cz_seen.json"}
+    legacy.write_text(json.dumps({"seen": [B, C]}), encoding="utf-8")
+
+    store = _open_site(db, "bazos", [str(legacy)])
+    assert set(_seen_ids(db, "bazos")) == {101}
+    assert A in store and B not in store and C not in store
+    _close(store)
+
+
+def test_missing_legacy_sources_are_marked_done(tmp_path):
+    db = tmp_path / "seen.db"
+    _close(_open_site(db, "bazos", [str(tmp_path / "absent.json")]))
+
+    with sqlite3.connect(db) as conn:
+        names = {row[0] for row in conn.execute("SELECT name FROM migrations")}
+    assert names == {"seen_links:bazos", "json:bazos:absent.json"}
+    assert _seen_ids(db, "bazos") == {}
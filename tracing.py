@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+logger = logging.getLogger("main.tracing")
+
+TRACE_DIR = "logs"
+# Сколько самых медленных трасс держать для выгрузки
+KEEP_SLOWEST = 20
+# Шаг сэмплирующего профилировщика, секунды
+SAMPLE_INTERVAL = 0.01
+MAX_STACK_DEPTH = 80
+
+_enabled = False
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("trace_span", default=None)
+_NOOP = nullcontext()
+# Мин-куча (длительность, порядковый номер, корневой спан)
+_slowest: list[tuple[float, int, "Span"]] = []
+_seq = itertools.count()
+stats = {"traces": 0}
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.children: list[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+def enable(flag: bool = True):
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attrs):
+    """Спан этапа: with span("goto"): ... Без включённой трассировки — пустой контекст."""
+    if not _enabled:
+        return _NOOP
+    return _span(name, attrs)
+
+
+@contextmanager
+def _span(name: str, attrs: dict):
+    parent = _current.get()
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+        if parent is None:
+            _finish(current)
+
+
+def traced(name: str | None = None):
+    """Декоратор корутины: весь вызов — один спан."""
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not _enabled:
+                return await func(*args, **kwargs)
+            with _span(span_name, {}):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_span() -> Span | None:
+    """Текущий спан, чтобы продолжить трассу в другой задаче (например, в очереди отправки)."""
+    return _current.get() if _enabled else None
+
+
+def resume(parent: Span | None):
+    """Спаны внутри блока станут детьми parent, даже если трасса уже закончилась."""
+    if parent is None:
+        return _NOOP
+    return _resume(parent)
+
+
+@contextmanager
+def _resume(parent: Span):
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _finish(root: Span):
+    stats["traces"] += 1
+    entry = (root.duration, next(_seq), root)
+    if len(_slowest) < KEEP_SLOWEST:
+        heapq.heappush(_slowest, entry)
+    elif entry[0] > _slowest[0][0]:
+        heapq.heapreplace(_slowest, entry)
+
+
+def _roots() -> list[Span]:
+    return [root for _, _, root in sorted(_slowest, reverse=True)]
+
+
+def chrome_trace() -> dict:
+    """Самые медленные трассы в формате Chrome trace-event (chrome://tracing, Perfetto): трасса — отдельная строка."""
+    roots = _roots()
+    if not roots:
+        return {"traceEvents": []}
+    base = min(root.start for root in roots)
+    pid = os.getpid()
+    events = []
+    for tid, root in enumerate(roots, 1):
+        label = " ".join(f"{k}={v}" for k, v in root.attrs.items())
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                       "args": {"name": f"{root.duration:.2f} s {root.name} {label}".strip()}})
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            events.append({
+                "name": current.name, "cat": root.name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": round((current.start - base) * 1e6), "dur": round(current.duration * 1e6),
+                "args": current.attrs,
+            })
+            stack.extend(current.children)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def collapsed_stacks() -> list[str]:
+    """Те же трассы в свёрнутом виде для flamegraph.pl/speedscope: «a;b;c микросекунды собственного времени»."""
+    totals: Counter[str] = Counter()
+    stack = [(root, root.name) for root in _roots()]
+    while stack:
+        current, path = stack.pop()
+        own = current.duration - sum(child.duration for child in current.children)
+        totals[path] += max(0, round(own * 1e6))
+        stack.extend((child, f"{path};{child.name}") for child in current.children)
+    return [f"{path} {value}" for path, value in totals.items() if value]
+
+
+def _write(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+async def write_slowest(directory: str = TRACE_DIR) -> str | None:
+    """Пишет медленные трассы в traces_slowest.json и traces_slowest.folded. Возвращает путь к JSON."""
+    if not _slowest:
+        return None
+    # Снимок делаем в потоке цикла: спаны дописываются из задач
+    trace = json.dumps(chrome_trace(), ensure_ascii=False)
+    folded = "\n".join(collapsed_stacks()) + "\n"
+    path = os.path.join(directory, "traces_slowest.json")
+    await asyncio.to_thread(_write, path, trace)
+    await asyncio.to_thread(_write, os.path.join(directory, "traces_slowest.folded"), folded)
+    return path
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потока цикла событий: раз в interval снимает стек и копит свёрнутые стеки.
+
+    Показывает, что именно занимает цикл синхронно (разбор HTML, регулярки, JSON).
+    Включается и выключается из админ-панели бота.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._samples: Counter[str] = Counter()
+        self._target: int | None = None
+        self.started_at: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: int | None = None):
+        """Начинает сэмплировать поток thread_id (по умолчанию — вызывающий, то есть цикл событий)."""
+        if self.running:
+            return
+        self._target = thread_id or threading.get_ident()
+        self._samples = Counter()
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"⏱ Профилировщик запущен, шаг {self.interval * 1000:.0f} мс")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self._samples[";".join(reversed(stack))] += 1
+
+    def stop(self, directory: str = TRACE_DIR) -> str | None:
+        """Останавливает сэмплирование и пишет profile-<время>.folded. None — сэмплов нет.
+
+        Блокирует до остановки потока: из цикла событий вызывать через asyncio.to_thread.
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return None
+        self._stop.set()
+        thread.join()
+        samples, self._samples = self._samples, Counter()
+        total = sum(samples.values())
+        logger.info(f"⏱ Профилировщик остановлен: {total} сэмплов за {time.time() - self.started_at:.0f} с")
+        if not total:
+            return None
+        path = os.path.join(directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        _write(path, "".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+        return path
+
+
+profiler = SamplingProfiler()
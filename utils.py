@@ -1,12 +1,7 @@
 import random
-import json
+import re
 import hashlib
-from config import HEADERS, PROXIES
-
-
-def get_rotated_proxy(key: str):
-    key_hash = int(hashlib.md5(key.encode()).hexdigest(), 16)
-    return PROXIES[key_hash % len(PROXIES)]
+from config import HEADERS
 
 
 def get_random_user_agent():
@@ -17,29 +12,44 @@ def normalize_link(link: str) -> str:
     return link.strip().lower()
 
 
-def load_seen_links(filename: str) -> set[str]:
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            seen = {normalize_link(link) for link in data.get("seen", [])}
-            return seen
-    except FileNotFoundError:
-        return set()
-    except Exception as e:
-        print(f"❌ Ошибка загрузки файла {filename}: {e}")
-        return set()
-
-
-def save_seen_links(filename: str, seen_links: set[str]):
-    try:
-        normalized = sorted({normalize_link(link) for link in seen_links})
-        data = {
-            "seen": normalized
-        }
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"❌ Ошибка сохранения файла {filename}: {e}")
+# Стабильный идентификатор объявления в ссылке каждого сайта
+ITEM_ID_PATTERNS = {
+    "bazos": [re.compile(r"/inzerat/(\d+)")],
+    "vinted": [re.compile(r"/items/(\d+)")],
+    "sbazar": [
+        re.compile(r"/(?:inzerat|rozbalena-nabidka)/(\d+)"),
+        # Распакованные предложения: slug-<40 hex>, slug может меняться
+        re.compile(r"/rozbalena-nabidka/(?:.*-)?([0-9a-f]{32,})$"),
+    ],
+    "aukro": [re.compile(r"-(\d{6,})$")],
+}
+
+# Ключи-хеши лежат выше 2**62 и не пересекаются с числовыми ID
+HASH_KEY_FLAG = 1 << 62
+
+
+def _hash_key(value: str) -> int:
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return HASH_KEY_FLAG | (int.from_bytes(digest, "big") & (HASH_KEY_FLAG - 1))
+
+
+def extract_item_id(site: str, link: str) -> str | None:
+    path = normalize_link(link).split("?", 1)[0].split("#", 1)[0].rstrip("/")
+    for pattern in ITEM_ID_PATTERNS.get(site, []):
+        match = pattern.search(path)
+        if match:
+            return match.group(1)
+    return None
+
+
+def item_key(site: str, link: str) -> int:
+    """Целочисленный ключ дедупликации: номер объявления, иначе 62-битный хеш ID или ссылки."""
+    item_id = extract_item_id(site, link)
+    if item_id is None:
+        return _hash_key(normalize_link(link))
+    if item_id.isdigit():
+        return int(item_id)
+    return _hash_key(f"{site}:{item_id}")
 
 
 def load_keywords(filepath: str) -> list[str]:
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+logger = logging.getLogger("main.work_queue")
+
+WORK_DB = "parsers/work.db"
+# Аренда задания без продления истекает через LEASE_TTL секунд
+LEASE_TTL = 60
+# Воркер без пульса дольше WORKER_TIMEOUT считается мёртвым
+WORKER_TIMEOUT = 30
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_worker ON jobs (worker);
+CREATE TABLE IF NOT EXISTS results (
+    job_id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    links TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """Очередь заданий (сайт, ключ) между координатором и воркерами на SQLite.
+
+    Воркеры арендуют задания и продлевают аренду пульсом; результат пишется
+    в results, откуда его забирает координатор. Файл базы — транспорт-заглушка:
+    воркеры на других хостах работают с тем же API поверх общей базы.
+    """
+
+    def __init__(self, db_path: str = WORK_DB):
+        self.db_path = db_path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    async def _run(self, func, *args):
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            return await asyncio.to_thread(func, *args)
+
+    # --- координатор ---
+
+    def _reset_sync(self):
+        # Задания прошлого запуска никто не ждёт
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.execute("DELETE FROM results")
+
+    async def reset(self):
+        await self._run(self._reset_sync)
+
+    def _put_sync(self, site: str, keyword: str) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO jobs (site, keyword, created_at) VALUES (?, ?, ?)", (site, keyword, time.time())
+        )
+        return cur.lastrowid
+
+    async def put(self, site: str, keyword: str) -> int:
+        return await self._run(self._put_sync, site, keyword)
+
+    def _cancel_sync(self, job_id: int):
+        self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def cancel(self, job_id: int):
+        await self._run(self._cancel_sync, job_id)
+
+    def _take_results_sync(self, limit: int) -> list[dict]:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT job_id, site, keyword, links, error, worker FROM results ORDER BY job_id LIMIT ?", (limit,)
+            ).fetchall()
+            if rows:
+                self._conn.executemany("DELETE FROM results WHERE job_id = ?", [(r[0],) for r in rows])
+        return [
+            {"job_id": r[0], "site": r[1], "keyword": r[2],
+             "links": json.loads(r[3]) if r[3] is not None else None, "error": r[4], "worker": r[5]}
+            for r in rows
+        ]
+
+    async def take_results(self, limit: int = 500) -> list[dict]:
+        return await self._run(self._take_results_sync, limit)
+
+    def _requeue_sync(self, where: str, args: tuple) -> list[tuple[int, str]]:
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                f"SELECT id, site, keyword, attempts, worker FROM jobs WHERE state = 'leased' AND {where}", args
+            ).fetchall()
+            requeued = []
+            for job_id, site, keyword, attempts, worker in rows:
+                if attempts >= MAX_ATTEMPTS:
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO results (job_id, site, keyword, error, worker, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (job_id, site, keyword, f"задание потеряно {attempts} раз", worker, now),
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'queued', worker = NULL, lease_until = NULL WHERE id = ?", (job_id,)
+                    )
+                requeued.append((job_id, worker))
+        return requeued
+
+    def _reap_sync(self) -> tuple[list[str], list[tuple[int, str]]]:
+        now = time.time()
+        dead = [r[0] for r in self._conn.execute(
+            "SELECT name FROM workers WHERE heartbeat_at < ?", (now - WORKER_TIMEOUT,)
+        )]
+        requeued = []
+        for name in dead:
+            requeued += self._requeue_sync("worker = ?", (name,))
+            self._conn.execute("DELETE FROM workers WHERE name = ?", (name,))
+        requeued += self._requeue_sync("lease_until < ?", (now,))
+        return dead, requeued
+
+    async def reap(self) -> tuple[list[str], list[tuple[int, str]]]:
+        """Возвращает в очередь задания мёртвых воркеров и просроченные аренды."""
+        return await self._run(self._reap_sync)
+
+    async def release_worker(self, name: str) -> list[tuple[int, str]]:
+        return await self._run(self._requeue_sync, "worker = ?", (name,))
+
+    def _stats_sync(self) -> dict:
+        states = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        workers = self._conn.execute("SELECT name, heartbeat_at FROM workers").fetchall()
+        now = time.time()
+        return {
+            "queued": states.get("queued", 0),
+            "leased": states.get("leased", 0),
+            "results": self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0],
+            "workers": {name: round(now - beat, 1) for name, beat in workers},
+        }
+
+    async def get_stats(self) -> dict:
+        return await self._run(self._stats_sync)
+
+    # --- воркер ---
+
+    def _register_sync(self, name: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO workers (name, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+            (name, socket.gethostname(), os.getpid(), now, now),
+        )
+
+    async def register(self, name: str):
+        await self._run(self._register_sync, name)
+
+    def _lease_sync(self, worker: str, sites: list[str] | None) -> dict | None:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            query = "SELECT id, site, keyword FROM jobs WHERE state = 'queued'"
+            args: tuple = ()
+            if sites:
+                query += f" AND site IN ({','.join('?' * len(sites))})"
+                args = tuple(sites)
+            row = self._conn.execute(query + " ORDER BY id LIMIT 1", args).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, time.time() + LEASE_TTL, row[0]),
+            )
+        return {"job_id": row[0], "site": row[1], "keyword": row[2]}
+
+    async def lease(self, worker: str, sites: list[str] | None = None) -> dict | None:
+        return await self._run(self._lease_sync, worker, sites)
+
+    def _heartbeat_sync(self, worker: str) -> int:
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            beat = self._conn.execute("UPDATE workers SET heartbeat_at = ? WHERE name = ?", (now, worker))
+            if not beat.rowcount:
+                # Координатор уже счёл воркер мёртвым — регистрируемся заново
+                self._register_sync(worker)
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE worker = ? AND state = 'leased'", (now + LEASE_TTL, worker)
+            )
+        return cur.rowcount
+
+    async def heartbeat(self, worker: str) -> int:
+        return await self._run(self._heartbeat_sync, worker)
+
+    def _complete_sync(self, job: dict, worker: str, links: list[str] | None, error: str | None) -> bool:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cur = self._conn.execute(
+                "DELETE FROM jobs WHERE id = ? AND worker = ? AND state = 'leased'", (job["job_id"], worker)
+            )
+            if not cur.rowcount:
+                # Аренду уже передали другому воркеру — результат опоздал
+                return False
+            self._conn.execute(
+                "INSERT OR IGNORE INTO results (job_id, site, keyword, links, error, worker, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], job["site"], job["keyword"], json.dumps(links) if links is not None else None,
+                 error, worker, time.time()),
+            )
+        return True
+
+    async def complete(self, job: dict, worker: str, links: list[str] | None = None, error: str | None = None) -> bool:
+        return await self._run(self._complete_sync, job, worker, links, error)
+
+    def _unregister_sync(self, name: str):
+        self._conn.execute("DELETE FROM workers WHERE name = ?", (name,))
+
+    async def unregister(self, name: str):
+        await self._run(self._unregister_sync, name)
+
+    async def close(self):
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None